@@ -0,0 +1,152 @@
+from collections import deque
+import numpy as np
+import cv2 as cv
+
+
+class CamshiftTracker:
+    # Follows a colored object frame by frame with CamShift on a hue histogram of the object
+    # Has the same run/getPosition/getDirection calls as OpticalFlowSparse, start it with init or let the first run
+    # call start from initial_box
+    # Only a padded area around the last track window is thresholded, converted and back projected, the whole frame
+    # is only searched after the object was lost
+
+    def __init__(self, initial_box=(200, 60, 200, 200), padding=0.5, threshold=180, min_score=20):
+        # x, y, width, height of the object on the first frame when init isn't called, the window main.py started from
+        self.__initial_box = initial_box
+        # The search area reaches this part of the window's width and height past every side of the window
+        self.__padding = padding
+        # Pixels brighter than this are zeroed before converting to HSV like main.py did, None to skip the threshold
+        self.__threshold = threshold
+        # Mean back projection inside the new window, 0 to 255, below which the object counts as lost
+        self.__min_score = min_score
+
+        # Stop after 10 iterations or when the window moves by less than a pixel
+        self.__term_crit = (cv.TERM_CRITERIA_EPS | cv.TERM_CRITERIA_COUNT, 10, 1)
+
+        self.__roi_hist = None
+        # x, y, width, height in frame pixels, None after a loss so the next frame searches the whole frame
+        self.__track_window = None
+        # Width and height of the last window, what the whole frame search looks for after a loss
+        self.__window_size = None
+        self.__rotated_box = None
+        self.__search_box = None
+
+        # Centers of the last few frames, direction is how far the center moved over them
+        self.__centers = deque(maxlen=5)
+        self.__tracked_position = ()
+        self.__tracked_direction = ()
+
+    def init(self, frame, box):
+        # Learns the object's hue from box, x, y, width, height in frame pixels, and starts tracking it there
+        x, y, width, height = self.__clipBox(box, frame.shape)
+        if width == 0 or height == 0:
+            raise ValueError(f"Box {box} is outside the {frame.shape[1]}x{frame.shape[0]} frame")
+
+        hsv_roi = cv.cvtColor(frame[y:y + height, x:x + width], cv.COLOR_BGR2HSV)
+        self.__roi_hist = cv.calcHist([hsv_roi], [0], None, [180], [0, 180])
+        cv.normalize(self.__roi_hist, self.__roi_hist, 0, 255, cv.NORM_MINMAX)
+
+        self.__track_window = (x, y, width, height)
+        self.__window_size = (width, height)
+        self.__rotated_box = ((x + width / 2, y + height / 2), (width, height), 0.0)
+        self.__centers.clear()
+        self.__setPosition(x + width / 2, y + height / 2)
+
+    def run(self, frame):
+
+        if frame is None:
+            return
+
+        if self.__roi_hist is None:
+            self.init(frame, self.__initial_box)
+            return
+
+        # Search around the last window, or the whole frame when there is no window to start from
+        frame_height, frame_width = frame.shape[:2]
+        if self.__track_window is None:
+            search_box = (0, 0, frame_width, frame_height)
+            local_window = None
+        else:
+            x, y, width, height = self.__track_window
+            pad_x = int(width * self.__padding)
+            pad_y = int(height * self.__padding)
+            search_box = self.__clipBox((x - pad_x, y - pad_y, width + 2 * pad_x, height + 2 * pad_y), frame.shape)
+            local_window = (x - search_box[0], y - search_box[1], width, height)
+        self.__search_box = search_box
+
+        sx, sy, search_width, search_height = search_box
+        region = frame[sy:sy + search_height, sx:sx + search_width]
+        if self.__threshold is not None:
+            _, region = cv.threshold(region, self.__threshold, 155, cv.THRESH_TOZERO_INV)
+        hsv = cv.cvtColor(region, cv.COLOR_BGR2HSV)
+        back_projection = cv.calcBackProject([hsv], [0], self.__roi_hist, [0, 180], 1)
+
+        # Starting CamShift from the whole frame ends on the middle of everything that looks a bit like the object,
+        # start it from the window sized area with the most object colored pixels instead
+        if local_window is None:
+            local_window = self.__findDensestWindow(back_projection)
+
+        rotated_box, (wx, wy, window_width, window_height) = cv.CamShift(back_projection, local_window, self.__term_crit)
+
+        # A collapsed window or one over pixels that don't look like the object means it was lost
+        score = back_projection[wy:wy + window_height, wx:wx + window_width].mean() if window_width > 0 and window_height > 0 else 0
+        if score < self.__min_score:
+            self.__track_window = None
+            self.__rotated_box = None
+            self.__centers.clear()
+            self.__tracked_position = (0, 0)
+            self.__tracked_direction = (0, 0)
+            return
+
+        # Back from search area to frame pixels
+        self.__track_window = (wx + sx, wy + sy, window_width, window_height)
+        self.__window_size = (window_width, window_height)
+        (center_x, center_y), size, angle = rotated_box
+        self.__rotated_box = ((center_x + sx, center_y + sy), size, angle)
+        self.__setPosition(center_x + sx, center_y + sy)
+
+    def __setPosition(self, center_x, center_y):
+        self.__centers.append((center_x, center_y))
+        self.__tracked_position = (int(center_x), int(center_y))
+        oldest_x, oldest_y = self.__centers[0]
+        self.__tracked_direction = (int(center_x - oldest_x), int(center_y - oldest_y))
+
+    def __findDensestWindow(self, back_projection):
+        # A box filter the size of the last window gives the mean back projection of the window around every pixel
+        height, width = back_projection.shape[:2]
+        window_width = min(self.__window_size[0], width)
+        window_height = min(self.__window_size[1], height)
+        window_means = cv.boxFilter(back_projection, cv.CV_32F, (window_width, window_height))
+        _, _, _, (center_x, center_y) = cv.minMaxLoc(window_means)
+        return self.__clipBox((center_x - window_width // 2, center_y - window_height // 2, window_width, window_height),
+                              back_projection.shape)
+
+    @staticmethod
+    def __clipBox(box, frame_shape):
+        x, y, width, height = [int(value) for value in box]
+        x0 = min(max(x, 0), frame_shape[1])
+        y0 = min(max(y, 0), frame_shape[0])
+        x1 = min(max(x + width, 0), frame_shape[1])
+        y1 = min(max(y + height, 0), frame_shape[0])
+        return x0, y0, x1 - x0, y1 - y0
+
+    def getPosition(self):
+        return self.__tracked_position
+
+    def getDirection(self):
+        return self.__tracked_direction
+
+    def isTracking(self):
+        return self.__track_window is not None
+
+    def getTrackWindow(self):
+        # x, y, width, height in frame pixels, None while the object is lost
+        return self.__track_window
+
+    def getRotatedBox(self):
+        # ((center x, center y), (width, height), angle) as returned by cv.CamShift, in frame pixels
+        return self.__rotated_box
+
+    def getSearchBox(self):
+        # x, y, width, height of the area searched on the last frame
+        return self.__search_box
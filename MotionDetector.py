@@ -0,0 +1,167 @@
+import cv2
+import numpy as np
+
+class MotionDetector:
+    # Finds moving blobs frame by frame, the motion detection from "Video track.py" as a class that can be imported
+    # Every image it works with is allocated once and reused, frames are shrunk first so all the work is done small
+
+    # Difference with the previous frame, what "Video track.py" does
+    MODEL_DIFFERENCE = "difference"
+    # Difference with a running average of past frames, still objects fade into the background
+    MODEL_AVERAGE = "average"
+    # OpenCV's Gaussian mixture background model, copes best with flickering light and swaying background
+    MODEL_MOG2 = "mog2"
+
+    def __init__(self, model=MODEL_AVERAGE, scale=0.5, min_area=900, threshold=20, learning_rate=0.05,
+                 blur_size=5, dilate_iterations=3):
+        if model not in (self.MODEL_DIFFERENCE, self.MODEL_AVERAGE, self.MODEL_MOG2):
+            raise ValueError(f"Unknown background model {model}")
+        self.__model = model
+
+        # Frames are shrunk by this factor before anything else happens, 1 works on the full frame
+        self.__scale = scale
+        # Smallest blob that counts as movement, in input frame pixels like the 900 of "Video track.py"
+        self.__min_area = min_area
+        # Gray level change a pixel needs to count as moving, not used by MOG2 which decides that itself
+        self.__threshold = threshold
+        # How fast the running average and MOG2 take in the current frame, 0 to 1
+        self.__learning_rate = learning_rate
+        self.__blur_size = blur_size
+        self.__dilate_iterations = dilate_iterations
+        self.__dilate_kernel = np.ones((3, 3), dtype=np.uint8)
+
+        self.__background_subtractor = None
+        if model == self.MODEL_MOG2:
+            self.__background_subtractor = cv2.createBackgroundSubtractorMOG2(detectShadows=False)
+
+        # Work images, allocated on the first frame and whenever the frame size changes
+        self.__frame_size = None
+        self.__small_frame = None
+        self.__gray_frame = None
+        self.__blurred_frame = None
+        self.__prev_blurred_frame = None
+        self.__background = None
+        self.__background_gray = None
+        self.__difference = None
+        self.__motion_mask = None
+        self.__dilated_mask = None
+
+        # The last frame's blobs in input frame pixels, boxes are x, y, width, height rows
+        self.__boxes = np.zeros((0, 4), dtype=np.int32)
+        self.__centroids = np.zeros((0, 2), dtype=np.float64)
+        self.__areas = np.zeros(0, dtype=np.int32)
+
+    def __allocate(self, video_frame):
+        height, width = video_frame.shape[:2]
+        self.__frame_size = (width, height)
+        small_width = max(int(round(width * self.__scale)), 1)
+        small_height = max(int(round(height * self.__scale)), 1)
+
+        self.__small_frame = np.empty((small_height, small_width, 3), dtype=np.uint8)
+        self.__gray_frame = np.empty((small_height, small_width), dtype=np.uint8)
+        self.__blurred_frame = np.empty((small_height, small_width), dtype=np.uint8)
+        self.__prev_blurred_frame = None
+        self.__background = None
+        self.__background_gray = np.empty((small_height, small_width), dtype=np.uint8)
+        self.__difference = np.empty((small_height, small_width), dtype=np.uint8)
+        self.__motion_mask = np.empty((small_height, small_width), dtype=np.uint8)
+        self.__dilated_mask = np.zeros((small_height, small_width), dtype=np.uint8)
+
+    def detect(self, video_frame):
+        # Returns (boxes, centroids) of the blobs moving in this frame, both empty on the first frame
+        if self.__frame_size != (video_frame.shape[1], video_frame.shape[0]):
+            self.__allocate(video_frame)
+
+        # Shrink, gray and blur into the preallocated images
+        if self.__scale == 1:
+            cv2.cvtColor(video_frame, cv2.COLOR_BGR2GRAY, dst=self.__gray_frame)
+        else:
+            cv2.resize(video_frame, (self.__small_frame.shape[1], self.__small_frame.shape[0]), dst=self.__small_frame,
+                       interpolation=cv2.INTER_AREA)
+            cv2.cvtColor(self.__small_frame, cv2.COLOR_BGR2GRAY, dst=self.__gray_frame)
+        cv2.GaussianBlur(self.__gray_frame, (self.__blur_size, self.__blur_size), 0, dst=self.__blurred_frame)
+
+        if not self.__findMotion():
+            self.__setBlobs(0, None, None)
+            return self.__boxes, self.__centroids
+
+        cv2.dilate(self.__motion_mask, self.__dilate_kernel, dst=self.__dilated_mask, iterations=self.__dilate_iterations)
+
+        # Labelled areas instead of a contour tree, the area filter only needs the pixel count of every blob
+        # Collecting the stats costs as much as a pass over the whole image, so only the box around the moving pixels
+        # is labelled, which is usually a small part of the frame
+        x, y, width, height = cv2.boundingRect(self.__dilated_mask)
+        if width == 0 or height == 0:
+            self.__setBlobs(0, None, None)
+            return self.__boxes, self.__centroids
+        blob_count, _, stats, centroids = cv2.connectedComponentsWithStats(self.__dilated_mask[y:y + height, x:x + width],
+                                                                          connectivity=8, ltype=cv2.CV_32S)
+        stats[:, :2] += (x, y)
+        centroids += (x, y)
+        self.__setBlobs(blob_count, stats, centroids)
+        return self.__boxes, self.__centroids
+
+    def __findMotion(self):
+        # Fills the motion mask with 255 for every moving pixel, returns False while there is nothing to compare with yet
+        if self.__model == self.MODEL_MOG2:
+            self.__background_subtractor.apply(self.__blurred_frame, self.__motion_mask, self.__learning_rate)
+            return True
+
+        if self.__model == self.MODEL_DIFFERENCE:
+            if self.__prev_blurred_frame is None:
+                self.__prev_blurred_frame = self.__blurred_frame.copy()
+                return False
+            cv2.absdiff(self.__blurred_frame, self.__prev_blurred_frame, dst=self.__difference)
+            # Swap instead of copy, the old previous frame is overwritten by the next frame anyway
+            self.__prev_blurred_frame, self.__blurred_frame = self.__blurred_frame, self.__prev_blurred_frame
+        else:
+            if self.__background is None:
+                self.__background = self.__blurred_frame.astype(np.float32)
+                return False
+            cv2.convertScaleAbs(self.__background, dst=self.__background_gray)
+            cv2.absdiff(self.__blurred_frame, self.__background_gray, dst=self.__difference)
+            cv2.accumulateWeighted(self.__blurred_frame, self.__background, self.__learning_rate)
+
+        cv2.threshold(self.__difference, self.__threshold, 255, cv2.THRESH_BINARY, dst=self.__motion_mask)
+        return True
+
+    def __setBlobs(self, blob_count, stats, centroids):
+        if blob_count <= 1:
+            self.__boxes = np.zeros((0, 4), dtype=np.int32)
+            self.__centroids = np.zeros((0, 2), dtype=np.float64)
+            self.__areas = np.zeros(0, dtype=np.int32)
+            return
+
+        # Label 0 is the background, the area limit is scaled down along with the frame
+        scale = self.__scale
+        stats = stats[1:]
+        keep = stats[:, cv2.CC_STAT_AREA] >= self.__min_area * scale * scale
+
+        self.__boxes = np.rint(stats[keep, :4] / scale).astype(np.int32)
+        self.__centroids = centroids[1:][keep] / scale
+        self.__areas = np.rint(stats[keep, cv2.CC_STAT_AREA] / (scale * scale)).astype(np.int32)
+
+    def run(self, video_frame):
+        if video_frame is None:
+            return
+        self.detect(video_frame)
+
+    def getBoxes(self):
+        return self.__boxes
+
+    def getCentroids(self):
+        return self.__centroids
+
+    def getAreas(self):
+        return self.__areas
+
+    def getMask(self):
+        # Moving pixels of the last frame at the reduced size, after dilation
+        return self.__dilated_mask
+
+    def getPosition(self):
+        # Centroid of the biggest moving blob, the same kind of position the trackers give
+        if self.__areas.__len__() == 0:
+            return ()
+        centroid = self.__centroids[np.argmax(self.__areas)]
+        return (int(centroid[0]), int(centroid[1]))
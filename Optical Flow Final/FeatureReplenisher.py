@@ -0,0 +1,122 @@
+import cv2 as cv
+import numpy as np
+
+class FeatureReplenisher:
+    # Finds new corners a few grid cells at a time, only in cells that are short of live points
+    # Spreads the corner search over several frames instead of rescanning the whole frame in one go
+
+    def __init__(self, grid=(8, 6), cells_per_frame=6, exclusion_size=7, max_backoff=32):
+        # Columns and rows the image is split into
+        self.__grid = grid
+        # Most cells searched on one frame, bounds the extra work any single frame does
+        self.__cells_per_frame = cells_per_frame
+        # New corners are kept this far away from live points, the same 7 x 7 area a region change uses
+        self.__exclusion_kernel = np.ones((exclusion_size, exclusion_size), dtype=np.uint8)
+        # Most frames a cell that keeps failing waits before it is searched again
+        self.__max_backoff = max_backoff
+
+        # Strongest corner response of the last full scan, cells are held to the same quality bar as that scan
+        self.__reference_strength = None
+
+        # Calls to findPoints so far, used to time when cells are searched again
+        self.__frame_index = 0
+        # Index of the cell the next search starts at, so every short cell gets its turn
+        self.__next_cell = 0
+
+        # Flat cells, and cells whose new points calcOpticalFlowPyrLK loses straight away, stay short of points
+        # Searching them every frame only finds the same useless corners again, so each failed search doubles the wait
+        cell_count = grid[0] * grid[1]
+        self.__backoff = np.ones(cell_count, dtype=np.int64)
+        self.__retry_frame = np.zeros(cell_count, dtype=np.int64)
+        # Live points each cell should have had after its last search, -1 if it was never searched
+        self.__expected_counts = np.full(cell_count, -1, dtype=np.int64)
+
+    def setReference(self, gray_frame, feature_params):
+        # Call after a full goodFeaturesToTrack scan of gray_frame with the same parameters
+        eigen_values = cv.cornerMinEigenVal(gray_frame, feature_params["blockSize"])
+        self.__reference_strength = float(eigen_values.max())
+
+        # Everything is new after a full scan, give every cell a fresh start
+        self.__backoff[:] = 1
+        self.__retry_frame[:] = 0
+        self.__expected_counts[:] = -1
+
+    def findPoints(self, gray_frame, positions, max_points, feature_params):
+        # positions are the live points in gray_frame coordinates, returns new points shaped N x 1 x 2 or None
+        self.__frame_index += 1
+        missing_count = max_points - positions.__len__()
+        if missing_count <= 0 or self.__reference_strength is None:
+            return None
+
+        columns, rows = self.__grid
+        height, width = gray_frame.shape[:2]
+        cell_width = int(np.ceil(width / columns))
+        cell_height = int(np.ceil(height / rows))
+
+        # Count the live points in every cell
+        cell_x = np.clip((positions[:, 0] // cell_width).astype(np.int32), 0, columns - 1)
+        cell_y = np.clip((positions[:, 1] // cell_height).astype(np.int32), 0, rows - 1)
+        cell_counts = np.bincount(cell_y * columns + cell_x, minlength=columns * rows)
+
+        # Cells below an even share of the point budget are short, search the ones that are due in turn from where
+        # the last frame stopped
+        cell_target = max(max_points // (columns * rows), 1)
+        short_cells = np.flatnonzero((cell_counts < cell_target) & (self.__retry_frame <= self.__frame_index))
+        if short_cells.__len__() == 0:
+            return None
+        short_cells = np.roll(short_cells, -np.searchsorted(short_cells, self.__next_cell))[:self.__cells_per_frame]
+        self.__next_cell = (short_cells[-1] + 1) % (columns * rows)
+
+        quality_bar = feature_params["qualityLevel"] * self.__reference_strength
+        found_points = []
+        for cell in short_cells:
+            if missing_count <= 0:
+                break
+
+            # A cell that lost the points it was given last time is searched less and less often
+            if cell_counts[cell] < self.__expected_counts[cell]:
+                self.__backoff[cell] = min(self.__backoff[cell] * 2, self.__max_backoff)
+            elif self.__expected_counts[cell] >= 0:
+                self.__backoff[cell] = 1
+            self.__retry_frame[cell] = self.__frame_index + self.__backoff[cell]
+            self.__expected_counts[cell] = cell_counts[cell]
+
+            x0 = (cell % columns) * cell_width
+            y0 = (cell // columns) * cell_height
+            cell_frame = gray_frame[y0:y0 + cell_height, x0:x0 + cell_width]
+            if cell_frame.shape[0] < 2 or cell_frame.shape[1] < 2:
+                continue
+
+            # goodFeaturesToTrack only knows quality relative to the best corner it sees, so a flat cell would
+            # still give corners, skip cells with nothing as strong as the full scan would have accepted
+            cell_strength = float(cv.cornerMinEigenVal(cell_frame, feature_params["blockSize"]).max())
+            if cell_strength < quality_bar:
+                self.__backoff[cell] = min(self.__backoff[cell] * 2, self.__max_backoff)
+                continue
+
+            # Keep new corners away from the live points in and around this cell, the mask is padded so points
+            # just across the cell border count as well
+            padding = self.__exclusion_kernel.shape[0] // 2
+            mask = np.full((cell_frame.shape[0] + 2 * padding, cell_frame.shape[1] + 2 * padding), 255, dtype=np.uint8)
+            local_positions = np.rint(positions - (x0 - padding, y0 - padding)).astype(np.int32)
+            inside = (local_positions[:, 0] >= 0) & (local_positions[:, 0] < mask.shape[1]) & \
+                     (local_positions[:, 1] >= 0) & (local_positions[:, 1] < mask.shape[0])
+            if inside.any():
+                mask[local_positions[inside, 1], local_positions[inside, 0]] = 0
+                mask = cv.erode(mask, self.__exclusion_kernel)
+            mask = mask[padding:padding + cell_frame.shape[0], padding:padding + cell_frame.shape[1]]
+
+            cell_params = dict(feature_params, maxCorners=int(min(cell_target - cell_counts[cell], missing_count)),
+                               qualityLevel=min(quality_bar / cell_strength, 1.0))
+            cell_points = cv.goodFeaturesToTrack(cell_frame, mask=mask, **cell_params)
+            if cell_points is None:
+                self.__backoff[cell] = min(self.__backoff[cell] * 2, self.__max_backoff)
+                continue
+
+            found_points.append(cell_points + np.array((x0, y0), dtype=np.float32))
+            missing_count -= cell_points.__len__()
+            self.__expected_counts[cell] += cell_points.__len__()
+
+        if found_points.__len__() == 0:
+            return None
+        return np.concatenate(found_points)
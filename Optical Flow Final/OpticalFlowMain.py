@@ -1,5 +1,8 @@
 from OpticalFlowSparse import OpticalFlowSparse
 from OpticalFlowSparseDataTest import OpticalFlowSparseDataTest
+from TrackingRenderer import NullRenderer, VideoFileRenderer
+from ThreadedCapture import ThreadedCapture
+from FramePreprocessor import FramePreprocessor
 import cv2 as cv
 
 #https://nanonets.com/blog/optical-flow/
@@ -12,12 +15,29 @@ def doOpticalFlow():
     # Alternate test video
     # video_cap = cv.VideoCapture("catwalk.mp4")
 
+    # The data test keeps frames around to show them again at the end, everything else is done with a frame once the
+    # next one is read
     doDataTest = False
+
+    # Decode on a separate thread, every frame of a file should be tracked so nothing is dropped
+    # Frames are decoded into a few reused images unless the data test needs to keep them
+    video_cap = ThreadedCapture(video_cap, ThreadedCapture.POLICY_LOSSLESS, reuse_frames=not doDataTest)
+
+    # Headless skips all drawing, set outputVideo to a file name to record the tracking graphics instead
+    headless = False
+    outputVideo = None
+    renderer = None
+    if outputVideo is not None:
+        renderer = VideoFileRenderer(outputVideo, video_cap.get(cv.CAP_PROP_FPS))
+    elif headless:
+        renderer = NullRenderer()
+
     if not doDataTest:
-        opticalFlow = OpticalFlowSparse()
+        # The preprocessed images are written into the same two buffers every frame instead of new arrays
+        opticalFlow = OpticalFlowSparse(renderer, preprocessor=FramePreprocessor(arena=True))
     else:
         # Data test will allow click input to compare the detected position against the tracked position
-        opticalFlow = OpticalFlowSparseDataTest()
+        opticalFlow = OpticalFlowSparseDataTest(renderer)
 
     while video_cap.isOpened():
         ret, new_frame = video_cap.read()
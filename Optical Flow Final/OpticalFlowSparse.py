@@ -1,11 +1,16 @@
 import cv2 as cv
 import numpy as np
-from TrackingMarker import TrackingMarker
-from TrackingGraphics import TrackingGraphics as Graphics
+from TrackingMarkerStore import TrackingMarkerStore
+from TrackingRenderer import WindowRenderer
+from TrackingStats import NullTrackingStats
+from TrackingRegion import TrackingRegion
+from FramePreprocessor import FramePreprocessor
+from FeatureReplenisher import FeatureReplenisher
+from TargetClusterer import TargetClusterer
 
 class OpticalFlowSparse:
 
-    def __init__(self):
+    def __init__(self, renderer=None, stats=None, use_roi=False, preprocessor=None, top_up=True, multi_target=False):
         # Parameters for Shi-Tomasi corner detection
         # Original parameters maxCorners = 300, qualityLevel = 0.2, minDistance = 2, blockSize = 7
         self.__feature_params = dict(maxCorners=300, qualityLevel=0.1, minDistance=1, blockSize=2)
@@ -20,73 +25,163 @@ class OpticalFlowSparse:
         self.__no_movement_reset_time = 2
         # Number of active markers required to prevent reset, set this value really high to disable lock feature
         self.__moving_markers_lock = 4
+        # Points with a tracking error above this are treated as lost, None only uses the status from calcOpticalFlowPyrLK
+        self.__max_tracking_error = None
 
-        self.__blur_power = 15
+        # Turns frames into the blurred gray images that are tracked, pass a FramePreprocessor to change how
+        # Its scale maps the tracked points back to the input frame, so positions never depend on the preprocessing
+        if preprocessor is None:
+            preprocessor = FramePreprocessor()
+        self.__preprocessor = preprocessor
+
+        # A smaller image needs a smaller search window to cover the same part of the input frame
+        scale = preprocessor.getScale()
+        if scale != 1:
+            win_width, win_height = self.__lk_params["winSize"]
+            self.__lk_params["winSize"] = (max(win_width // scale, 9), max(win_height // scale, 9))
 
         # Stored data from previous frame
         self.__prev_points = None
         self.__prev_gray_frame = None
 
         # Store optical flow markers
-        self.__tracking_markers = []
-        self.__moving_markers = []
+        self.__tracking_markers = TrackingMarkerStore()
+        # Number of moving markers on the last processed frame, counted before lost markers are removed
+        self.__moving_count = 0
 
         # The readable position and direction data
         self.__tracked_position = ()
         self.__tracked_direction = ()
 
+        # Draws the tracking output, pass a NullRenderer to run without a display
+        if renderer is None:
+            renderer = WindowRenderer()
+        self.__renderer = renderer
+
+        # Per stage timings and counters, pass a TrackingStats to record them
+        if stats is None:
+            stats = NullTrackingStats()
+        self.__stats = stats
+
+        # Once there is a lock, only process a padded box around the moving markers instead of the whole frame
+        # Marker positions, getPosition and getDirection always stay in full frame coordinates
+        self.__use_roi = use_roi
+        self.__region = TrackingRegion()
+        # Fewest corners a region is topped up to, however small it is
+        self.__min_region_corners = 60
+
+        # Instead of throwing every marker away when there is no lock, keep them and find new corners a few grid cells
+        # at a time wherever live points ran short, so no single frame pays for a full rescan
+        self.__top_up = top_up
+        self.__replenisher = FeatureReplenisher()
+
+        # Clusters the moving markers into separate targets with ids that last across frames, see getTargets
+        # The position and direction then follow the target with the most moving markers instead of averaging them all
+        self.__clusterer = TargetClusterer() if multi_target else None
+
     def run(self, video_frame):
 
         if video_frame is None:
             return
 
-        # Blue image to improve tracking, if already done by system accessing this script, consider deleting
-        optimized_frame = video_frame.copy()
-        optimized_frame = self.__optimizeFrame(optimized_frame)
+        frame_start = self.__stats.startTimer()
+        self.__trackFrame(video_frame)
+        self.__stats.stopTimer("frame", frame_start)
+        self.__stats.endFrame()
+
+    def getStats(self):
+        return self.__stats
+
+    def __trackFrame(self, video_frame):
+        stats = self.__stats
+
+        # Blurred gray image to improve tracking, if already done by system accessing this script, consider deleting
+        stage_start = stats.startTimer()
+        cur_gray_frame = self.__preprocessor.process(self.__region.crop(video_frame))
+        stats.stopTimer("preprocess", stage_start)
 
         # Optical flow requires 2 frames to compare, if we don't have a previous, simply generate and return
         # Note, this is expected to happen the first time, should never happen again
         if self.__prev_points is None:
-            self.__prev_gray_frame = cv.cvtColor(optimized_frame, cv.COLOR_BGR2GRAY)
+            self.__prev_gray_frame = cur_gray_frame
             self.__prev_points = self.__findTrackingPoints(self.__prev_gray_frame)
             return
 
         #print("Frame begin")
 
-        cur_frame = optimized_frame
-        cur_gray_frame = cv.cvtColor(cur_frame, cv.COLOR_BGR2GRAY)
-
         # Calculates sparse optical flow by Lucas-Kanade method
         # https://docs.opencv.org/3.0-beta/modules/video/doc/motion_analysis_and_object_tracking.html#calcopticalflowpyrlk
+        stage_start = stats.startTimer()
+        # Both image pyramids are rebuilt in this call, the Python bindings won't take the previous frame's, see benchmarks/lk_pyramid.py
         cur_points, status, error = cv.calcOpticalFlowPyrLK(self.__prev_gray_frame, cur_gray_frame, self.__prev_points, None, **self.__lk_params)
+        stats.stopTimer("optical_flow", stage_start)
 
         # We need to actively be looking for new tracking point so we can recognize when the cat enter view
-        if cur_points is not None and self.__no_movement_timer < self.__no_movement_reset_time:
+        # Without top up that means resetting the markers once there has been no lock for a while
+        lost_lock = self.__no_movement_timer >= self.__no_movement_reset_time
+        reset_due = not self.__top_up and lost_lock
+        if cur_points is not None and not reset_due:
+            stage_start = stats.startTimer()
+
+            # Points from a cropped or shrunk frame are moved back into full frame coordinates
+            cur_points = self.__preprocessor.toInputPoints(cur_points)
+            if self.__region.box is not None:
+                cur_points = cur_points + self.__region.getOffset()
+
             # Selects good feature points for next position
             self.__updateTrackingMarkers(cur_points)
-            good_new = cur_points[status == 1]
-
-            # If points were lost we need to adjust our markers appropriately
-            if good_new.__len__() != self.__tracking_markers.__len__():
-                self.__clearBadMarkers(good_new)
+            tracked = self.__findTrackedPoints(status, error)
+            good_new = cur_points[tracked]
 
             #If we have enough moving markers, reset the reset counter
-            if self.__moving_markers.__len__() > self.__moving_markers_lock:
+            if self.__moving_count > self.__moving_markers_lock:
                 self.__no_movement_timer = 0
             else:
                 self.__no_movement_timer += 1
 
+            # Lost markers still count towards this frame's position and direction, like they always have
             self.__calculateCenterPoint()
             self.__calculateMoveDirection()
 
-            # Everything related to drawing is probably unnecessary for anyone using this code? just here for local testing
-            self.__drawTracking(cur_frame)
+            # If points were lost we need to adjust our markers appropriately
+            lost_count = self.__tracking_markers.__len__() - good_new.__len__()
+            if lost_count != 0:
+                self.__clearBadMarkers(tracked)
+
+            stats.stopTimer("markers", stage_start)
+            stats.count("lost_points", lost_count)
+            stats.setGauge("live_points", self.__tracking_markers.__len__())
+            stats.setGauge("moving_points", self.__moving_count)
+
+            # Graphics are only built when the renderer is going to use them, and are drawn over the full input frame
+            if self.__renderer.isActive():
+                stage_start = stats.startTimer()
+                self.__drawTracking(video_frame)
+                stats.stopTimer("render", stage_start)
+
+            if self.__use_roi and self.__moving_count > self.__moving_markers_lock and \
+                    self.__region.update(self.__tracking_markers.getLatestPositions()[self.__tracking_markers.moving], video_frame.shape):
+                self.__moveRegion(video_frame)
+            elif lost_lock and self.__region.clear():
+                # Top up keeps the markers, but a region around a target that got away has to go back to the full frame
+                # or the target is never found again, the rest of the frame is filled with corners
+                self.__no_movement_timer = 0
+                self.__moveRegion(video_frame)
+            else:
+                # Updates previous frame, every frame gets a new image from the preprocessor so there is nothing to copy
+                self.__prev_gray_frame = cur_gray_frame
+                self.__prev_points = self.__preprocessor.toProcessedPoints(good_new - self.__region.getOffset()).reshape(-1, 1, 2)
 
-            # Updates previous frame
-            self.__prev_gray_frame = cur_gray_frame.copy()
-            self.__prev_points = good_new.reshape(-1, 1, 2)
+                if self.__top_up:
+                    self.__topUpMarkers(cur_gray_frame, video_frame)
         else:
             #Reset
+            stats.count("resets")
+
+            # Losing the lock means the target could be anywhere, go back to the full frame
+            if self.__region.clear():
+                cur_gray_frame = self.__preprocessor.process(video_frame)
+
             self.__prev_points = self.__findTrackingPoints(cur_gray_frame)
             self.__prev_gray_frame = cur_gray_frame
             self.__no_movement_timer = 0
@@ -95,113 +190,149 @@ class OpticalFlowSparse:
 
     def __findTrackingPoints(self, video_frame_gray):
 
-        self.__tracking_markers.clear()
-
         # Finds the strongest corners in the first frame by Shi-Tomasi method - we will track the optical flow for these corners
         # https://docs.opencv.org/3.0-beta/modules/imgproc/doc/feature_detection.html#goodfeaturestotrack
+        stage_start = self.__stats.startTimer()
         found_points = cv.goodFeaturesToTrack(video_frame_gray, mask=None, **self.__feature_params)
+        self.__stats.stopTimer("find_points", stage_start)
         # Creates an image filled with zero intensities with the same dimensions as the frame - for later drawing purposes
 
-        if found_points is not None:
-            # Recreate the list of markers using the newly found tracking points
-            for point in found_points:
-                new_marker = TrackingMarker()
-                new_marker.addPosition(point)
-                self.__tracking_markers.append(new_marker)
+        # Recreate the markers using the newly found tracking points, markers are kept in input frame coordinates
+        if found_points is None:
+            self.__tracking_markers.reset(found_points)
+        else:
+            self.__tracking_markers.reset(self.__preprocessor.toInputPoints(found_points))
+        # Targets made of the old markers are gone with them, new ones get new ids
+        if self.__clusterer is not None:
+            self.__clusterer.reset()
+
+        # Later top ups hold their corners to the same quality bar as this scan
+        if self.__top_up:
+            self.__replenisher.setReference(video_frame_gray, self.__feature_params)
 
         return found_points
 
-    def __clearBadMarkers(self, good_new):
-        for x in range(good_new.__len__()):
-            while self.__tracking_markers[x].testSamePosition(good_new[x]) == False:
-                self.__tracking_markers.remove(self.__tracking_markers[x])
-        # Above loop won't remove markers past the last index, do that here
-        while self.__tracking_markers.__len__() > good_new.__len__():
-            self.__tracking_markers.remove(self.__tracking_markers[-1])
+    def __topUpMarkers(self, cur_gray_frame, video_frame):
+        # Adds corners in the grid cells that lost their points, at most a few cells per frame
+        stage_start = self.__stats.startTimer()
+        found_points = self.__replenisher.findPoints(cur_gray_frame, self.__prev_points.reshape(-1, 2),
+                                                     self.__cornerBudget(video_frame), self.__feature_params)
+        if found_points is not None:
+            self.__tracking_markers.addMarkers(self.__preprocessor.toInputPoints(found_points) + self.__region.getOffset())
+            self.__prev_points = np.concatenate((self.__prev_points, found_points.reshape(-1, 1, 2)))
+            self.__stats.count("topped_up_points", found_points.__len__())
+        self.__stats.stopTimer("top_up", stage_start)
+
+    def __cornerBudget(self, video_frame):
+        # The corner budget shrinks with the region so the point density, and the optical flow cost with it, goes down
+        if self.__region.box is None:
+            return self.__feature_params["maxCorners"]
+        x0, y0, x1, y1 = self.__region.box
+        region_ratio = (x1 - x0) * (y1 - y0) / (video_frame.shape[0] * video_frame.shape[1])
+        return max(int(self.__feature_params["maxCorners"] * region_ratio), self.__min_region_corners)
+
+    def __moveRegion(self, video_frame):
+        # The region changed, so the next frame needs this frame's image and points in the new region
+        stage_start = self.__stats.startTimer()
+
+        # Markers outside the new region can't be tracked anymore
+        tracking_markers = self.__tracking_markers
+        tracking_markers.compact(self.__region.contains(tracking_markers.getLatestPositions()))
+
+        preprocessor = self.__preprocessor
+        self.__prev_gray_frame = preprocessor.process(self.__region.crop(video_frame))
+        offset = self.__region.getOffset()
+        local_positions = preprocessor.toProcessedPoints(tracking_markers.getLatestPositions() - offset)
+
+        # Fill the new part of the region with corners, away from the markers we already have
+        missing_count = self.__cornerBudget(video_frame) - tracking_markers.__len__()
+        if missing_count > 0:
+            mask = np.full(self.__prev_gray_frame.shape, 255, dtype=np.uint8)
+            pixels = np.clip(np.rint(local_positions).astype(np.int32), 0, np.array(mask.shape[::-1]) - 1)
+            mask[pixels[:, 1], pixels[:, 0]] = 0
+            mask = cv.erode(mask, np.ones((7, 7), dtype=np.uint8))
+
+            feature_params = dict(self.__feature_params, maxCorners=missing_count)
+            found_points = cv.goodFeaturesToTrack(self.__prev_gray_frame, mask=mask, **feature_params)
+            if found_points is not None:
+                tracking_markers.addMarkers(preprocessor.toInputPoints(found_points) + offset)
+
+        self.__prev_points = preprocessor.toProcessedPoints(tracking_markers.getLatestPositions() - offset).reshape(-1, 1, 2)
+        self.__stats.count("region_changes")
+        self.__stats.stopTimer("region", stage_start)
+
+    def getRegion(self):
+        # (x0, y0, x1, y1) of the region being processed, None when the full frame is
+        return self.__region.box
+
+    def __findTrackedPoints(self, status, error):
+        # Status is 1 for every point calcOpticalFlowPyrLK could follow, optionally also reject points with a large error
+        tracked = status.reshape(-1) == 1
+        if self.__max_tracking_error is not None:
+            tracked &= error.reshape(-1) < self.__max_tracking_error
+        return tracked
+
+    def __clearBadMarkers(self, tracked):
+        # Markers line up with the points given to calcOpticalFlowPyrLK, so the lost ones can be dropped in one pass
+        self.__tracking_markers.compact(tracked)
 
     def __updateTrackingMarkers(self, cur_points):
-        # Add the new positions to our marker objects and test if they're moving
-        for x in range(cur_points.__len__()):
-            self.__tracking_markers[x].addPosition(cur_points[x])
-            self.__tracking_markers[x].testMovement()
-
-        # Reset list of moving markers and reassign
-        self.__moving_markers.clear()
-        for marker in self.__tracking_markers:
-            if marker.getIsMoving():
-                self.__moving_markers.append(marker)
-
-    def __optimizeFrame(self, video_frame):
-        video_frame = self.__blurFrame(video_frame)
-        return video_frame
-
-    def __blurFrame(self, video_frame):
-        return cv.GaussianBlur(video_frame, (self.__blur_power, self.__blur_power), 0)
+        # Add the new positions to our markers and test if they're moving
+        self.__tracking_markers.addPositions(cur_points)
+        self.__moving_count = self.__tracking_markers.getMovingCount()
 
     def __drawTracking(self, cur_frame):
-        #Reset draw_mask
-        draw_mask = np.zeros_like(cur_frame)
-
-        #Draw the graphics for each marker, old way and new way
-        Graphics.drawMovementTracks(draw_mask, self.__tracking_markers)
-
-        #Draw center position and average direction of moving markers
-        if self.__moving_markers.__len__() > 1:
-            Graphics.drawTrackedPos(self.getPosition(), draw_mask)
-            Graphics.drawTrackedDir(self.getPosition(), self.getDirection(), draw_mask)
-
-        # Overlays the optical flow tracks on the original frame
-        output = cv.add(cur_frame, draw_mask)
-
-        # Opens a new window and displays the output frame
-        cv.imshow("sparse optical flow", output)
-        #cv.imshow("grey image", self.cur_gray_frame)
-
-        # This is literally just here so we can run the code and have the images render, delete whenever
-        if cv.waitKey(1):
-            1+1
+        draw_target = self.__moving_count > 1
+        self.__renderer.render(cur_frame, self.__tracking_markers, self.getPosition(), self.getDirection(), draw_target)
 
     def release(self):
-        # The following frees up resources and closes all windows
-        cv.destroyAllWindows()
-        # This is kinda pointless when being used by another system?
+        # The following frees up resources and closes any windows or video files the renderer opened
+        self.__renderer.release()
 
     def __calculateCenterPoint(self):
-
+        if self.__clusterer is not None:
+            self.__calculateTargets()
+            return
         # Center point is calculated by averaging the positions of all moving markers
-        center_point = (0, 0)
-        if self.__moving_markers.__len__() > 0:
-            add_pos_x = 0
-            add_pos_y = 0
-            for marker in self.__moving_markers:
-                position = marker.positions[-1]
-                add_pos_x += position[0]
-                add_pos_y += position[1]
-
-            average_x = add_pos_x / self.__moving_markers.__len__()
-            average_y = add_pos_y / self.__moving_markers.__len__()
-            center_point = (int(average_x), int(average_y))
-        self.__tracked_position = center_point
+        self.__tracked_position = self.__tracking_markers.getCenterPoint()
+
+    def __calculateTargets(self):
+        stage_start = self.__stats.startTimer()
+        tracking_markers = self.__tracking_markers
+        moving = tracking_markers.moving
+        self.__clusterer.update(tracking_markers.getLatestPositions()[moving], tracking_markers.getDirections()[moving])
+        self.__stats.stopTimer("targets", stage_start)
+
+        target = self.__clusterer.getLargestTarget()
+        if target is None:
+            self.__tracked_position = (0, 0)
+        else:
+            self.__tracked_position = (int(target[1]), int(target[2]))
+
+    def getTargets(self):
+        # N x 8 array with a row per target on the last frame, columns are TargetClusterer.COLUMNS
+        # Only filled in multi target mode, an empty array otherwise
+        if self.__clusterer is None:
+            return np.zeros((0, TargetClusterer.COLUMNS.__len__()), dtype=np.float64)
+        return self.__clusterer.getTargets()
 
     def getPosition(self):
         return self.__tracked_position
 
     def __calculateMoveDirection(self):
-
+        if self.__clusterer is not None:
+            target = self.__clusterer.getLargestTarget()
+            self.__tracked_direction = (0, 0) if target is None else (int(target[3]), int(target[4]))
+            return
         # Direction is calculated by averaging the directions of all moving markers
-        move_direction = (0, 0)
-        if self.__moving_markers.__len__() > 0:
-            add_dir_x = 0
-            add_dir_y = 0
-            for marker in self.__moving_markers:
-                direction = marker.getDirection()
-                add_dir_x += direction[0]
-                add_dir_y += direction[1]
-
-            average_dir_x = add_dir_x / self.__moving_markers.__len__()
-            average_dir_y = add_dir_y / self.__moving_markers.__len__()
-            move_direction = (int(average_dir_x), int(average_dir_y))
-        self.__tracked_direction = move_direction
+        self.__tracked_direction = self.__tracking_markers.getMeanDirection()
 
     def getDirection(self):
         return self.__tracked_direction
+
+    def getLiveCount(self):
+        # Markers still being tracked after the last frame, including any it topped up
+        return self.__tracking_markers.__len__()
+
+    def getMovingCount(self):
+        return self.__moving_count
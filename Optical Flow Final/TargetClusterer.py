@@ -0,0 +1,123 @@
+import cv2 as cv
+import numpy as np
+
+class TargetClusterer:
+    # Splits the moving markers into separate targets, e.g. two cats or a cat and the laser dot, instead of averaging
+    # them all into one point somewhere between them
+    # Markers are binned into a coarse grid and touching occupied cells form one target, so the cost grows linearly with
+    # the marker count, no distances between pairs of markers are ever worked out
+    # Targets keep their id from frame to frame by matching them to where last frame's targets were heading
+
+    # Columns of the array getTargets returns, one row per target
+    COLUMNS = ("id", "x", "y", "direction_x", "direction_y", "width", "height", "marker_count")
+
+    def __init__(self, cell_size=32, min_markers=3, max_link_distance=80, max_missing=5, direction_frames=4):
+        # Width and height of a grid cell in pixels, markers further apart than about one cell are separate targets
+        self.__cell_size = cell_size
+        # Clusters with fewer moving markers than this are noise, not a target
+        self.__min_markers = min_markers
+        # A target further than this many pixels from where a previous one was predicted to be gets a new id
+        self.__max_link_distance = max_link_distance
+        # Frames a target can go unseen before its id is dropped
+        self.__max_missing = max_missing
+        # Frames a marker's direction spans, to turn it into a per frame velocity for the prediction
+        self.__direction_frames = direction_frames
+
+        self.__next_id = 0
+        # Targets linked on the last frame and the ones that have gone unseen for a few frames, rows laid out as COLUMNS
+        self.__targets = np.zeros((0, self.COLUMNS.__len__()), dtype=np.float64)
+        self.__missing = np.zeros(0, dtype=np.int32)
+        # Rows of __targets seen on the last frame
+        self.__visible = np.zeros(0, dtype=bool)
+
+    def update(self, positions, directions):
+        # positions and directions are N x 2, one row per moving marker, in input frame pixels
+        clusters = self.__cluster(np.asarray(positions, dtype=np.float64).reshape(-1, 2),
+                                  np.asarray(directions, dtype=np.float64).reshape(-1, 2))
+        self.__link(clusters)
+        return self.getTargets()
+
+    def __cluster(self, positions, directions):
+        # Returns one row per cluster laid out as COLUMNS, with the id left at -1
+        empty = np.zeros((0, self.COLUMNS.__len__()), dtype=np.float64)
+        if positions.__len__() < self.__min_markers:
+            return empty
+
+        # Grid only covers the markers' bounding box, so it stays small whatever the frame size
+        cells = ((positions - positions.min(axis=0)) // self.__cell_size).astype(np.int32)
+        columns, rows = cells[:, 0], cells[:, 1]
+        occupancy = np.zeros((rows.max() + 1, columns.max() + 1), dtype=np.uint8)
+        occupancy[rows, columns] = 1
+
+        # Touching cells, diagonals included, belong to the same cluster
+        label_count, labels = cv.connectedComponents(occupancy, connectivity=8)
+        marker_labels = labels[rows, columns]
+
+        # Per cluster sums in one pass over the markers each
+        counts = np.bincount(marker_labels, minlength=label_count).astype(np.float64)
+        keep = counts >= self.__min_markers
+        keep[0] = False
+        if not keep.any():
+            return empty
+
+        clusters = np.zeros((label_count, self.COLUMNS.__len__()), dtype=np.float64)
+        clusters[:, 0] = -1
+        for column, values in ((1, positions[:, 0]), (2, positions[:, 1]), (3, directions[:, 0]), (4, directions[:, 1])):
+            clusters[:, column] = np.bincount(marker_labels, weights=values, minlength=label_count) / np.maximum(counts, 1)
+
+        # Extent of the markers in each cluster
+        low = np.full((label_count, 2), np.inf)
+        high = np.full((label_count, 2), -np.inf)
+        np.minimum.at(low, marker_labels, positions)
+        np.maximum.at(high, marker_labels, positions)
+        clusters[:, 5:7] = high - low
+        clusters[:, 7] = counts
+        return clusters[keep]
+
+    def __link(self, clusters):
+        # Greedy assignment on the distance from each previous target's predicted position, closest pairs first
+        # Targets and clusters are few, so this never depends on the marker count
+        previous = self.__targets
+        predicted = previous[:, 1:3] + previous[:, 3:5] * (self.__missing + 1).reshape(-1, 1) / self.__direction_frames
+        distances = np.linalg.norm(predicted[:, np.newaxis] - clusters[np.newaxis, :, 1:3], axis=2)
+
+        matched_previous = np.zeros(previous.__len__(), dtype=bool)
+        matched_clusters = np.zeros(clusters.__len__(), dtype=bool)
+        for flat_index in np.argsort(distances, axis=None):
+            previous_index, cluster_index = np.unravel_index(flat_index, distances.shape)
+            if distances[previous_index, cluster_index] > self.__max_link_distance:
+                break
+            if matched_previous[previous_index] or matched_clusters[cluster_index]:
+                continue
+            matched_previous[previous_index] = True
+            matched_clusters[cluster_index] = True
+            clusters[cluster_index, 0] = previous[previous_index, 0]
+
+        # Clusters nobody claimed are new targets
+        new_count = np.count_nonzero(~matched_clusters)
+        clusters[~matched_clusters, 0] = np.arange(self.__next_id, self.__next_id + new_count)
+        self.__next_id += new_count
+
+        # Unseen targets are kept where they were last seen until they have been missing too long
+        missing = self.__missing[~matched_previous] + 1
+        kept = missing <= self.__max_missing
+        self.__targets = np.concatenate((clusters, previous[~matched_previous][kept]))
+        self.__missing = np.concatenate((np.zeros(clusters.__len__(), dtype=np.int32), missing[kept]))
+        self.__visible = self.__missing == 0
+
+    def getTargets(self):
+        # Targets seen on the last frame, an N x 8 array laid out as COLUMNS, ordered by id
+        targets = self.__targets[self.__visible]
+        return targets[np.argsort(targets[:, 0], kind="stable")]
+
+    def getLargestTarget(self):
+        # Row of the target with the most moving markers, None when there are none
+        targets = self.__targets[self.__visible]
+        if targets.__len__() == 0:
+            return None
+        return targets[np.argmax(targets[:, 7])]
+
+    def reset(self):
+        self.__targets = np.zeros((0, self.COLUMNS.__len__()), dtype=np.float64)
+        self.__missing = np.zeros(0, dtype=np.int32)
+        self.__visible = np.zeros(0, dtype=bool)
@@ -22,6 +22,15 @@ class DataProcessor:
         tracking_comparison = TrackingComparator(frame, position, direction, clickPos, distance)
         self.__tracking_comparisons.append(tracking_comparison)
 
+    def printPositionComparisons(self):
+        # Text only version of showPositionComparisons for running without a display
+        for comparison in self.__tracking_comparisons:
+            print(f"Tracked {comparison.tracked_position} - Distance {comparison.distance} - Desired {comparison.desired_position}")
+
+        if self.__tracking_comparisons.__len__() > 0:
+            distances = [comparison.distance for comparison in self.__tracking_comparisons]
+            print(f"Mean distance {np.mean(distances)} - Median distance {np.median(distances)}")
+
     def showPositionComparisons(self):
         for comparison in self.__tracking_comparisons:
 
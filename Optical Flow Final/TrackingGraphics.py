@@ -1,4 +1,5 @@
 import cv2 as cv
+import numpy as np
 
 class TrackingGraphics:
 
@@ -11,21 +12,26 @@ class TrackingGraphics:
     __font = cv.FONT_HERSHEY_COMPLEX
 
     def drawMovementTracks(draw_mask, tracking_markers):
-        # Draws the optical flow tracks
-        for marker in tracking_markers:
+        # Draws the optical flow tracks, all markers of one color are drawn with a single polylines call
+        tracks = np.rint(tracking_markers.getTracks()).astype(np.int32)
+        moving = tracking_markers.moving
+
+        for is_moving in (False, True):
             #Determine color
-            if marker.getIsMoving():
+            if is_moving:
                 trackColor = TrackingGraphics.__color_moving
             else:
                 trackColor = TrackingGraphics.__color_still
 
-            #Draw a line for each set of positions
-            for x in range(marker.positions.__len__() -1):
-                point1 = marker.positions[x]
-                point2 = marker.positions[x+1]
-                cv.line(draw_mask, point1, point2, trackColor, 2)
+            marker_tracks = tracks[moving == is_moving]
+            if marker_tracks.__len__() == 0:
+                continue
+
+            #Draw a line through each set of positions
+            cv.polylines(draw_mask, list(marker_tracks), False, trackColor, 2)
             #Draw circle at current position
-            cv.circle(draw_mask, marker.positions[-1], 3, trackColor, -1)
+            for position in marker_tracks[:, -1]:
+                cv.circle(draw_mask, (int(position[0]), int(position[1])), 3, trackColor, -1)
 
     def drawTrackedPos(position, draw_mask):
         cv.circle(draw_mask, position, 10, TrackingGraphics.__color_position_tracked, -1)
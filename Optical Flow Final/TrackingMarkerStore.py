@@ -0,0 +1,122 @@
+import numpy as np
+
+class TrackingMarkerStore:
+    # Stores every tracking marker in shared numpy arrays instead of one TrackingMarker object per point
+    # Row i of every array belongs to marker i, so all per-marker work can be done as vectorized operations
+
+    #Number of positions each marker remembers
+    frame_store_count = 5
+
+    # Distance along either x or y that indicates if marker is moving
+    # Effective shape with current implementation is a square, should be implemented as a circle
+    movement_breakpoint = 1.5
+
+    def __init__(self):
+        # N x K x 2 ring buffer of positions, all markers share the same write slot
+        self.positions = np.zeros((0, self.frame_store_count, 2), dtype=np.float32)
+        # Number of valid positions each marker has stored, never more than frame_store_count
+        self.stored = np.zeros(0, dtype=np.int32)
+        self.moving = np.zeros(0, dtype=bool)
+        self.alive = np.zeros(0, dtype=bool)
+        # Slot the next position will be written to
+        self.__head = 0
+
+    def __len__(self):
+        return self.stored.__len__()
+
+    def reset(self, points):
+        # Recreate the store using the newly found tracking points, points are shaped N x 1 x 2 like OpenCV returns them
+        self.__head = 0
+        self.positions = np.zeros((0, self.frame_store_count, 2), dtype=np.float32)
+        self.stored = np.zeros(0, dtype=np.int32)
+        self.moving = np.zeros(0, dtype=bool)
+        self.alive = np.zeros(0, dtype=bool)
+
+        if points is not None:
+            self.addMarkers(points)
+
+    def addMarkers(self, points):
+        # Appends new markers with a single stored position
+        points = np.asarray(points, dtype=np.float32).reshape(-1, 2)
+        count = points.__len__()
+        if count == 0:
+            return
+
+        new_positions = np.zeros((count, self.frame_store_count, 2), dtype=np.float32)
+        new_positions[:, (self.__head - 1) % self.frame_store_count] = points
+
+        self.positions = np.concatenate((self.positions, new_positions))
+        self.stored = np.concatenate((self.stored, np.ones(count, dtype=np.int32)))
+        self.moving = np.concatenate((self.moving, np.zeros(count, dtype=bool)))
+        self.alive = np.concatenate((self.alive, np.ones(count, dtype=bool)))
+
+    def addPositions(self, points):
+        # Add the new positions to every marker and test if they're moving, points must have one row per marker
+        points = np.asarray(points, dtype=np.float32).reshape(-1, 2)
+
+        # Writing into the ring overwrites the oldest position once the buffer is full
+        self.positions[:, self.__head] = points
+        self.__head = (self.__head + 1) % self.frame_store_count
+        np.minimum(self.stored + 1, self.frame_store_count, out=self.stored)
+
+        self.testMovement()
+
+    def testMovement(self):
+        # Markers with a single position keep their previous moving state
+        has_history = self.stored > 1
+        difference = np.abs(self.getLatestPositions() - self.getOldestPositions())
+        is_moving = (difference > self.movement_breakpoint).any(axis=1)
+        self.moving = np.where(has_history, is_moving, self.moving)
+
+    def markAlive(self, alive):
+        # Flags which markers are still being tracked, the rest are dropped on the next compact call
+        self.alive = np.asarray(alive, dtype=bool).reshape(-1).copy()
+
+    def compact(self, keep=None):
+        # Drops every marker whose keep flag is False in one pass, defaults to dropping markers that are not alive
+        if keep is None:
+            keep = self.alive
+        keep = np.asarray(keep, dtype=bool).reshape(-1)
+
+        self.positions = self.positions[keep]
+        self.stored = self.stored[keep]
+        self.moving = self.moving[keep]
+        self.alive = self.alive[keep]
+
+    def getLatestPositions(self):
+        return self.positions[:, (self.__head - 1) % self.frame_store_count]
+
+    def getOldestPositions(self):
+        # Every marker can have a different amount of history, so the oldest slot is looked up per row
+        oldest_slots = (self.__head - self.stored) % self.frame_store_count
+        return self.positions[np.arange(self.stored.__len__()), oldest_slots]
+
+    def getDirections(self):
+        #How each marker has travelled from the first stored position to the last
+        return self.getLatestPositions() - self.getOldestPositions()
+
+    def getMovingCount(self):
+        return int(np.count_nonzero(self.moving))
+
+    def getTracks(self):
+        # Positions of every marker ordered from oldest to newest, as an N x K x 2 array
+        # Rows with less history than K repeat their oldest position at the start
+        order = (self.__head + np.arange(self.frame_store_count)) % self.frame_store_count
+        tracks = self.positions[:, order]
+        missing = (self.frame_store_count - self.stored).reshape(-1, 1, 1)
+        first_valid = np.take_along_axis(tracks, missing, axis=1)
+        return np.where(np.arange(self.frame_store_count).reshape(1, -1, 1) < missing, first_valid, tracks)
+
+    def getCenterPoint(self):
+        # Center point is calculated by averaging the positions of all moving markers
+        if not self.moving.any():
+            return (0, 0)
+        average = self.getLatestPositions()[self.moving].mean(axis=0, dtype=np.float64)
+        return (int(average[0]), int(average[1]))
+
+    def getMeanDirection(self):
+        # Direction is calculated by averaging the directions of all moving markers
+        if not self.moving.any():
+            return (0, 0)
+        average = self.getDirections()[self.moving].mean(axis=0, dtype=np.float64)
+        return (int(average[0]), int(average[1]))
@@ -0,0 +1,81 @@
+import numpy as np
+
+class TrackingRegion:
+    # Padded box around the moving markers, so a tracker with a lock only has to process that part of the frame
+    # No box means the full frame is used
+
+    def __init__(self, padding=64, edge_margin=24, full_frame_ratio=0.6):
+        # Pixels added around the moving markers on every side, on top of half their own size
+        self.__padding = padding
+        # Moving markers closer than this to the edge of the box make the box grow
+        self.__edge_margin = edge_margin
+        # Boxes covering more than this part of the frame aren't worth it, the full frame is used instead
+        self.__full_frame_ratio = full_frame_ratio
+
+        # (x0, y0, x1, y1) in full frame pixels, or None for the full frame
+        self.box = None
+
+    def getOffset(self):
+        if self.box is None:
+            return np.zeros(2, dtype=np.float32)
+        return np.array(self.box[:2], dtype=np.float32)
+
+    def crop(self, image):
+        # Returns a view into the image, nothing is copied
+        if self.box is None:
+            return image
+        x0, y0, x1, y1 = self.box
+        return image[y0:y1, x0:x1]
+
+    def contains(self, positions):
+        if self.box is None:
+            return np.ones(positions.__len__(), dtype=bool)
+        x0, y0, x1, y1 = self.box
+        return (positions[:, 0] >= x0) & (positions[:, 0] < x1) & (positions[:, 1] >= y0) & (positions[:, 1] < y1)
+
+    def clear(self):
+        # Falls back to the full frame, returns True if that changed the box
+        changed = self.box is not None
+        self.box = None
+        return changed
+
+    def update(self, moving_positions, frame_shape):
+        # Moves or grows the box to fit the moving markers, returns True if the box changed
+        if moving_positions.__len__() == 0:
+            return False
+
+        frame_height, frame_width = frame_shape[:2]
+        low = moving_positions.min(axis=0)
+        high = moving_positions.max(axis=0)
+
+        # Pad by half of the motion's own size as well, fast and big targets get more room
+        padding = self.__padding + (high - low) / 2
+        x0 = int(max(low[0] - padding[0], 0))
+        y0 = int(max(low[1] - padding[1], 0))
+        x1 = int(min(np.ceil(high[0] + padding[0]) + 1, frame_width))
+        y1 = int(min(np.ceil(high[1] + padding[1]) + 1, frame_height))
+
+        if self.box is not None:
+            old_x0, old_y0, old_x1, old_y1 = self.box
+            near_edge = (low[0] - self.__edge_margin < old_x0 and old_x0 > 0) or \
+                        (low[1] - self.__edge_margin < old_y0 and old_y0 > 0) or \
+                        (high[0] + self.__edge_margin > old_x1 and old_x1 < frame_width) or \
+                        (high[1] + self.__edge_margin > old_y1 and old_y1 < frame_height)
+            old_area = (old_x1 - old_x0) * (old_y1 - old_y0)
+
+            if near_edge:
+                # Grow the box to take in the new padded motion
+                x0, y0 = min(x0, old_x0), min(y0, old_y0)
+                x1, y1 = max(x1, old_x1), max(y1, old_y1)
+            elif old_area < 4 * (x1 - x0) * (y1 - y0):
+                # Keep the box while the motion stays clear of its edges, every change costs an extra crop on this frame
+                return False
+            # Otherwise the motion only fills a small part of the box, shrink back around it
+
+        if (x1 - x0) * (y1 - y0) > self.__full_frame_ratio * frame_width * frame_height:
+            return self.clear()
+
+        new_box = (x0, y0, x1, y1)
+        changed = new_box != self.box
+        self.box = new_box
+        return changed
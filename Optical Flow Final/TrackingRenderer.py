@@ -0,0 +1,108 @@
+import cv2 as cv
+import numpy as np
+from TrackingGraphics import TrackingGraphics as Graphics
+
+class TrackingRenderer:
+    # Base renderer, the tracker only builds graphics when isActive returns True
+    # Does nothing on its own, which makes it the renderer for running without a display
+
+    # Overlay and output images, reused every frame since the output is shown or written before the next one is drawn
+    __draw_mask = None
+    __output = None
+
+    def isActive(self):
+        return False
+
+    def hasWindow(self):
+        return False
+
+    def render(self, frame, tracking_markers, position, direction, draw_target):
+        pass
+
+    def setMouseCallback(self, callback):
+        pass
+
+    def release(self):
+        pass
+
+    def drawOverlay(self, frame, tracking_markers, position, direction, draw_target):
+        #Reset draw_mask, only allocated again when the frame size changes
+        if self.__draw_mask is None or self.__draw_mask.shape != frame.shape:
+            self.__draw_mask = np.zeros_like(frame)
+            self.__output = np.empty_like(frame)
+        else:
+            self.__draw_mask.fill(0)
+        draw_mask = self.__draw_mask
+
+        #Draw the graphics for each marker
+        Graphics.drawMovementTracks(draw_mask, tracking_markers)
+
+        #Draw center position and average direction of moving markers
+        if draw_target:
+            Graphics.drawTrackedPos(position, draw_mask)
+            Graphics.drawTrackedDir(position, direction, draw_mask)
+
+        # Overlays the optical flow tracks on the original frame
+        return cv.add(frame, draw_mask, dst=self.__output)
+
+
+class NullRenderer(TrackingRenderer):
+    # Zero cost renderer for headless use, the tracker skips all drawing work
+    pass
+
+
+class WindowRenderer(TrackingRenderer):
+    # Shows the tracking output in an OpenCV window
+
+    def __init__(self, window_name="sparse optical flow", wait_time=1):
+        self.__window_name = window_name
+        # Milliseconds cv.waitKey waits after each frame, the window only updates while waiting
+        self.__wait_time = wait_time
+
+    def isActive(self):
+        return True
+
+    def hasWindow(self):
+        return True
+
+    def render(self, frame, tracking_markers, position, direction, draw_target):
+        output = self.drawOverlay(frame, tracking_markers, position, direction, draw_target)
+
+        # Opens a new window and displays the output frame
+        cv.imshow(self.__window_name, output)
+        cv.waitKey(self.__wait_time)
+
+    def setMouseCallback(self, callback):
+        cv.namedWindow(self.__window_name)
+        cv.setMouseCallback(self.__window_name, callback)
+
+    def release(self):
+        # The following frees up resources and closes all windows
+        cv.destroyAllWindows()
+
+
+class VideoFileRenderer(TrackingRenderer):
+    # Writes the tracking output to a video file instead of showing it
+
+    def __init__(self, file_path, fps=30.0, fourcc="mp4v"):
+        self.__file_path = file_path
+        self.__fps = fps
+        self.__fourcc = cv.VideoWriter_fourcc(*fourcc)
+        # The writer needs the frame size, so it is only opened once the first frame arrives
+        self.__writer = None
+
+    def isActive(self):
+        return True
+
+    def render(self, frame, tracking_markers, position, direction, draw_target):
+        output = self.drawOverlay(frame, tracking_markers, position, direction, draw_target)
+
+        if self.__writer is None:
+            frame_size = (output.shape[1], output.shape[0])
+            self.__writer = cv.VideoWriter(self.__file_path, self.__fourcc, self.__fps, frame_size)
+        self.__writer.write(output)
+
+    def release(self):
+        if self.__writer is not None:
+            self.__writer.release()
+            self.__writer = None
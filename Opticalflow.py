@@ -7,6 +7,10 @@ class Opticalflow:
 
         cap = cv2.VideoCapture(video)
         cap.set(1, length)
+
+        # Take first frame, it also gives the frame size
+        ret, old_frame = cap.read()
+
         # params for ShiTomasi corner detection
         feature_params = dict(maxCorners=100,
                               qualityLevel=0.3,
@@ -14,15 +18,14 @@ class Opticalflow:
                               blockSize=7)
 
         # Parameters for lucas kanade optical flow
-        lk_params = dict(winSize=(cap.read()[1].shape[0], cap.read()[1].shape[1]),
+        lk_params = dict(winSize=(old_frame.shape[0], old_frame.shape[1]),
                          maxLevel=2,
                          criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 10, 0.03))
 
         # Create some random colors
         color = np.random.randint(0, 255, (100, 3))
 
-        # Take first frame and find corners in it
-        ret, old_frame = cap.read()
+        # Find corners in the first frame
         old_gray = cv2.cvtColor(old_frame, cv2.COLOR_BGR2GRAY)
         p0 = cv2.goodFeaturesToTrack(old_gray, mask=None, **feature_params)
 
@@ -36,7 +39,6 @@ class Opticalflow:
             # calculate optical flow
             p1, st, err = cv2.calcOpticalFlowPyrLK(old_gray, frame_gray, p0, None, **lk_params)
 
-            print(p1)
             # Select good points
             try:
                 good_new = p1[st == 1]
@@ -59,7 +61,7 @@ class Opticalflow:
                 break
 
             # Now update the previous frame and previous points
-            old_gray = frame_gray.copy()
+            old_gray = frame_gray
             p0 = good_new.reshape(-1, 1, 2)
             length += 1
 
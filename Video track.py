@@ -1,5 +1,5 @@
 import cv2
-import numpy as np
+from MotionDetector import MotionDetector
 
 #Video Insert and decoding
 cap = cv2.VideoCapture('http://10.166.49.61:8080/video')
@@ -9,31 +9,22 @@ fourcc = cv2.VideoWriter_fourcc('D','I','V','X')
 out = cv2.VideoWriter("output.mp4v", fourcc, 5.0, (1280,720))
 #framerate
 ret, frame1 = cap.read()
-ret, frame2 = cap.read()
 print(frame1.shape)
-#Apply gray filter and blur and thhreshhold frame by frame
-while cap.isOpened():
-    diff = cv2.absdiff(frame1, frame2)
-    gray = cv2.cvtColor(diff, cv2.COLOR_BGR2GRAY)
-    blur = cv2.GaussianBlur(gray, (5,5), 0)
-    _, thresh = cv2.threshold(blur, 20, 255, cv2.THRESH_BINARY)
-    dilated = cv2.dilate(thresh, None, iterations=3)
-    contours, _ = cv2.findContours(dilated, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
-#Use OpenCV contour to find blob movement
-    for contour in contours:
-        (x, y, w, h) = cv2.boundingRect(contour)
-        if cv2.contourArea(contour) < 900:
-            continue
+#Frame differencing at half size, the blur, threshold and 900 pixel area filter are done inside MotionDetector
+detector = MotionDetector(MotionDetector.MODEL_DIFFERENCE)
+while ret:
+    boxes, centroids = detector.detect(frame1)
+#Draw every blob that moved
+    for (x, y, w, h) in boxes:
         cv2.rectangle(frame1, (x, y), (x+w, y+h), (0, 255, 0), 2)
+    if boxes.__len__() > 0:
         cv2.putText(frame1, "Status: {}".format('Movement'), (10, 20), cv2.FONT_HERSHEY_SIMPLEX,
                     1, (0, 0, 255), 3)
-    #cv2.drawContours(frame1, contours, -1, (0, 255, 0), 2)
 #Resize window
     image = cv2.resize(frame1, (1280,720))
     out.write(image)
     cv2.imshow("feed", frame1)
-    frame1 = frame2
-    ret, frame2 = cap.read()
+    ret, frame1 = cap.read()
 
     if cv2.waitKey(40) == 27:
         break
@@ -0,0 +1,37 @@
+import argparse
+import json
+
+
+def loadResults(file_path):
+    with open(file_path) as result_file:
+        report = json.load(result_file)
+    return report, {(result["tracker"], result["video"]): result for result in report["results"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two run_trackers reports, for example from two commits")
+    parser.add_argument("before")
+    parser.add_argument("after")
+    args = parser.parse_args()
+
+    before_report, before = loadResults(args.before)
+    after_report, after = loadResults(args.after)
+
+    # Timings are only meaningful between runs made on the same machine with the same settings
+    for key in ("platform", "machine", "cpu_count", "opencv", "opencv_threads"):
+        if before_report["machine"].get(key) != after_report["machine"].get(key):
+            print(f"Warning: {key} differs ({before_report['machine'].get(key)} vs {after_report['machine'].get(key)})")
+
+    print(f"{'tracker':22} {'video':26} {'fps before':>10} {'fps after':>10} {'change':>8} {'p95 before':>11} {'p95 after':>10}")
+    for key in before:
+        if key not in after:
+            continue
+        old = before[key]
+        new = after[key]
+        change = (new["fps"] / old["fps"] - 1) * 100 if old["fps"] and new["fps"] else 0
+        print(f"{key[0]:22} {key[1]:26} {old['fps']:10.1f} {new['fps']:10.1f} {change:+7.1f}% "
+              f"{old['latency_ms']['p95']:11.2f} {new['latency_ms']['p95']:10.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+import os
+import sys
+import tracemalloc
+import cv2 as cv
+import numpy as np
+
+# Run from the repository root: python -m benchmarks.frame_allocations
+from benchmarks.trackers import repository_root
+from OpticalFlowSparse import OpticalFlowSparse
+from FramePreprocessor import FramePreprocessor
+from TrackingRenderer import TrackingRenderer
+from sparsedense.sparse_flow_vHappyDax import SparseHappyDax
+from sparsedense.framepreprocessor import FramePreprocessor as DaxFramePreprocessor
+
+video_path = os.path.join(repository_root, "videoplayback.mp4")
+warmup_count = 30
+frame_count = 300
+
+# NumPy reports its array memory to tracemalloc under its own domain, OpenCV's output images are NumPy arrays too
+numpy_domain = tracemalloc.DomainFilter(True, np.lib.tracemalloc_domain)
+
+
+class OverlayRenderer(TrackingRenderer):
+    # Builds the overlay like the window renderer, without a window to show it in
+
+    def isActive(self):
+        return True
+
+    def render(self, frame, tracking_markers, position, direction, draw_target):
+        self.drawOverlay(frame, tracking_markers, position, direction, draw_target)
+
+
+def makeTracker(tracker_name, arena):
+    if tracker_name == "optical_flow_sparse":
+        return OpticalFlowSparse(OverlayRenderer(), preprocessor=FramePreprocessor(arena=arena))
+    return SparseHappyDax(preprocessor=DaxFramePreprocessor(arena=arena))
+
+
+def measure(tracker_name, arena):
+    # Returns the mean and largest number of bytes in NumPy arrays allocated during a frame, read and tracking together
+    # Memory that is freed again within the frame is included, as long as it was alive at the frame's peak
+    cv.setNumThreads(1)
+    tracker = makeTracker(tracker_name, arena)
+    video_cap = cv.VideoCapture(video_path)
+
+    frame = None
+    frame_bytes = []
+    tracemalloc.start()
+    for frame_index in range(warmup_count + frame_count):
+        if not arena:
+            frame = None
+        start_bytes = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+
+        # With the arena the previous frame's image is decoded into again
+        ret, frame = video_cap.read(image=frame)
+        if ret is False:
+            break
+        tracker.run(frame)
+
+        if frame_index >= warmup_count:
+            frame_bytes.append(tracemalloc.get_traced_memory()[1] - start_bytes)
+    tracemalloc.stop()
+    video_cap.release()
+    return np.mean(frame_bytes), np.max(frame_bytes), frame.nbytes
+
+
+if __name__ == '__main__':
+    print(f"videoplayback.mp4, {frame_count} frames after {warmup_count} warm up frames, NumPy {np.__version__}, OpenCV {cv.__version__}")
+    for tracker_name in ("optical_flow_sparse", "sparse_happy_dax"):
+        for arena in (False, True):
+            mean_bytes, max_bytes, frame_nbytes = measure(tracker_name, arena)
+            label = f"{tracker_name} {'arena' if arena else 'allocating'}"
+            print(f"{label:34} {mean_bytes / 1024:9.1f} KiB per frame ({mean_bytes / frame_nbytes:5.2f} frames), "
+                  f"largest {max_bytes / 1024:9.1f} KiB")
@@ -0,0 +1,96 @@
+import multiprocessing
+import os
+import sys
+import timeit
+import numpy as np
+
+# Run from the repository root: python -m benchmarks.frame_transport
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dax'))
+from sharedframering import SharedFrameRing
+
+frame_shape = (720, 1280, 3)
+frame_count = 300
+slot_count = 8
+
+
+def makeSource():
+    # Stands in for the decoder, every frame is filled from this buffer and stamped with its index
+    return np.random.default_rng(0).integers(0, 256, frame_shape, dtype=np.uint8)
+
+
+def produceQueue(queue, count):
+    # Decodes into a fresh frame and puts it on the queue, which pickles it through a pipe
+    source = makeSource()
+    for index in range(count):
+        frame = np.empty(frame_shape, dtype=np.uint8)
+        np.copyto(frame, source)
+        frame[0, 0, 0] = index % 256
+        queue.put(frame)
+    queue.put(None)
+
+
+def produceRing(ring, count):
+    # Decodes straight into a ring slot, the frame is written once and never copied again
+    source = makeSource()
+    for index in range(count):
+        slot = ring.acquireSlot()
+        np.copyto(slot, source)
+        slot[0, 0, 0] = index % 256
+        ring.commitSlot()
+    ring.close()
+    ring.release()
+
+
+def consumeQueue(context, count):
+    queue = context.Queue(maxsize=slot_count)
+    producer = context.Process(target=produceQueue, args=(queue, count))
+    producer.start()
+
+    # The first frame also covers process start up, time from there on
+    frame = queue.get()
+    start = timeit.default_timer()
+    received = 1
+    while True:
+        frame = queue.get()
+        if frame is None:
+            break
+        if frame[0, 0, 0] != received % 256:
+            raise RuntimeError(f"Frame {received} arrived out of order")
+        received += 1
+    elapsed = timeit.default_timer() - start
+    producer.join()
+    return received, elapsed
+
+
+def consumeRing(context, count):
+    ring = SharedFrameRing(slot_count, context)
+    ring.allocate(frame_shape)
+    producer = context.Process(target=produceRing, args=(ring, count))
+    producer.start()
+
+    ret, frame = ring.read()
+    start = timeit.default_timer()
+    received = 1
+    while True:
+        ret, frame = ring.read()
+        if ret is False:
+            break
+        if frame[0, 0, 0] != received % 256:
+            raise RuntimeError(f"Frame {received} arrived out of order")
+        received += 1
+    elapsed = timeit.default_timer() - start
+    frame = None
+    producer.join()
+    ring.release()
+    return received, elapsed
+
+
+if __name__ == '__main__':
+    context = multiprocessing.get_context("spawn")
+    frame_megabytes = np.prod(frame_shape) / 1e6
+
+    print(f"{frame_shape[1]}x{frame_shape[0]} BGR frames, {frame_count} per run, {slot_count} frames in flight, {os.cpu_count()} cores")
+    for label, consume in (("multiprocessing.Queue", consumeQueue), ("SharedFrameRing", consumeRing)):
+        received, elapsed = consume(context, frame_count)
+        fps = (received - 1) / elapsed
+        print(f"{label:22} {fps:8.1f} frames/s {fps * frame_megabytes:8.1f} MB/s {elapsed / (received - 1) * 1000:7.3f} ms per frame")
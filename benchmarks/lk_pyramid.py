@@ -0,0 +1,90 @@
+import timeit
+import cv2 as cv
+import numpy as np
+
+# Run from the repository root: python -m benchmarks.lk_pyramid
+from benchmarks.synthetic_video import SyntheticVideo
+
+# Same settings as OpticalFlowSparse
+point_count = 300
+lk_params = dict(winSize=(35, 35), maxLevel=2, criteria=(cv.TERM_CRITERIA_EPS | cv.TERM_CRITERIA_COUNT, 10, 0.03))
+frame_count = 60
+
+
+def makeFrames():
+    video = SyntheticVideo(1280, 720, frame_count, blob_radius=60, speed=8.0)
+    return [cv.GaussianBlur(cv.cvtColor(frame, cv.COLOR_BGR2GRAY), (15, 15), 0) for frame, _ in video.frames()]
+
+
+def acceptsPyramids(gray_frame, points):
+    # C++ callers can hand calcOpticalFlowPyrLK the output of buildOpticalFlowPyramid, the Python bindings may not allow it
+    _, pyramid = cv.buildOpticalFlowPyramid(gray_frame, lk_params["winSize"], lk_params["maxLevel"])
+    try:
+        cv.calcOpticalFlowPyrLK(list(pyramid), list(pyramid), points, None, **lk_params)
+    except cv.error:
+        return False
+    return True
+
+
+def rebuildEveryFrame(gray_frames, points):
+    # What the trackers do, both pyramids are built inside every call
+    results = []
+    for prev_gray, gray in zip(gray_frames, gray_frames[1:]):
+        results.append(cv.calcOpticalFlowPyrLK(prev_gray, gray, points, None, **lk_params))
+    return results
+
+
+def buildPyramid(gray_frame):
+    pyramid = [gray_frame]
+    for _ in range(lk_params["maxLevel"]):
+        pyramid.append(cv.pyrDown(pyramid[-1]))
+    return pyramid
+
+
+def reuseByLevel(gray_frames, points):
+    # Builds each frame's pyramid once and runs coarse to fine by hand, one single level call per pyramid level
+    # Each level's result, doubled, is the starting guess for the next finer level, just like inside calcOpticalFlowPyrLK
+    single_level_params = dict(lk_params, maxLevel=0)
+    results = []
+    prev_pyramid = buildPyramid(gray_frames[0])
+    for gray in gray_frames[1:]:
+        pyramid = buildPyramid(gray)
+        guess = None
+        for level in range(lk_params["maxLevel"], -1, -1):
+            level_points = points / (2 ** level)
+            if guess is None:
+                guess, status, error = cv.calcOpticalFlowPyrLK(prev_pyramid[level], pyramid[level], level_points, None, **single_level_params)
+            else:
+                guess, status, error = cv.calcOpticalFlowPyrLK(prev_pyramid[level], pyramid[level], level_points, guess * 2,
+                                                               flags=cv.OPTFLOW_USE_INITIAL_FLOW, **single_level_params)
+        results.append((guess, status, error))
+        prev_pyramid = pyramid
+    return results
+
+
+def measure(flow_function, gray_frames, points):
+    start = timeit.default_timer()
+    results = flow_function(gray_frames, points)
+    elapsed = timeit.default_timer() - start
+    return elapsed / (gray_frames.__len__() - 1), results
+
+
+if __name__ == '__main__':
+    cv.setNumThreads(1)
+    gray_frames = makeFrames()
+    points = cv.goodFeaturesToTrack(gray_frames[0], point_count, 0.1, 1, blockSize=2)
+
+    rebuild_time, rebuild_results = measure(rebuildEveryFrame, gray_frames, points)
+    reuse_time, reuse_results = measure(reuseByLevel, gray_frames, points)
+    build_time = timeit.timeit(lambda: buildPyramid(gray_frames[0]), number=frame_count) / frame_count
+
+    largest_difference = 0.0
+    for (rebuild_points, rebuild_status, _), (reuse_points, reuse_status, _) in zip(rebuild_results, reuse_results):
+        both_tracked = (rebuild_status == 1) & (reuse_status == 1)
+        largest_difference = max(largest_difference, float(np.abs(rebuild_points - reuse_points)[both_tracked.reshape(-1)].max()))
+
+    print(f"1280x720, {points.__len__()} points, maxLevel {lk_params['maxLevel']}, OpenCV {cv.__version__}")
+    print(f"Pyramids accepted by calcOpticalFlowPyrLK: {acceptsPyramids(gray_frames[0], points)}")
+    print(f"One pyramid build:           {build_time * 1000:8.3f} ms")
+    print(f"Both pyramids every frame:   {rebuild_time * 1000:8.3f} ms per frame")
+    print(f"Reused pyramids, by level:   {reuse_time * 1000:8.3f} ms per frame (largest point difference {largest_difference:.4f} px)")
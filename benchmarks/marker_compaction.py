@@ -0,0 +1,72 @@
+import os
+import sys
+import timeit
+import numpy as np
+
+# Run from the repository root: python benchmarks/marker_compaction.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Optical Flow Final'))
+from TrackingMarker import TrackingMarker
+from TrackingMarkerStore import TrackingMarkerStore
+
+point_count = 1000
+loss_ratio = 0.5
+repeats = 20
+
+
+def makeFrame(seed):
+    # Points shaped like calcOpticalFlowPyrLK returns them, with a random half of them flagged as lost
+    rng = np.random.default_rng(seed)
+    points = rng.uniform(0, 640, (point_count, 1, 2)).astype(np.float32)
+    status = (rng.random((point_count, 1)) >= loss_ratio).astype(np.uint8)
+    return points, status
+
+
+def legacyScan(points, status):
+    # The position comparing scan the trackers used before the status mask
+    tracking_markers = []
+    for point in points:
+        marker = TrackingMarker()
+        marker.addPosition(point)
+        tracking_markers.append(marker)
+
+    start = timeit.default_timer()
+    good_new = points[status == 1]
+    for x in range(good_new.__len__()):
+        while tracking_markers[x].testSamePosition(good_new[x]) == False:
+            tracking_markers.remove(tracking_markers[x])
+    while tracking_markers.__len__() > good_new.__len__():
+        tracking_markers.remove(tracking_markers[-1])
+    elapsed = timeit.default_timer() - start
+
+    return elapsed, tracking_markers.__len__()
+
+
+def statusCompaction(points, status):
+    tracking_markers = TrackingMarkerStore()
+    tracking_markers.reset(points)
+
+    start = timeit.default_timer()
+    tracking_markers.compact(status.reshape(-1) == 1)
+    elapsed = timeit.default_timer() - start
+
+    return elapsed, tracking_markers.__len__()
+
+
+def measure(remove_function):
+    timings = []
+    remaining = None
+    for seed in range(repeats):
+        points, status = makeFrame(seed)
+        elapsed, remaining = remove_function(points, status)
+        timings.append(elapsed)
+    return np.median(timings), remaining
+
+
+if __name__ == '__main__':
+    legacy_time, legacy_remaining = measure(legacyScan)
+    compact_time, compact_remaining = measure(statusCompaction)
+
+    print(f"{point_count} points, {int(loss_ratio * 100)}% lost, median of {repeats} frames")
+    print(f"Position scan:     {legacy_time * 1000:8.3f} ms ({legacy_remaining} markers left)")
+    print(f"Status compaction: {compact_time * 1000:8.3f} ms ({compact_remaining} markers left)")
+    print(f"Speedup:           {legacy_time / compact_time:8.1f}x")
@@ -0,0 +1,188 @@
+import argparse
+import os
+import socket
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import cv2 as cv
+import numpy as np
+
+# Run from the repository root: python -m benchmarks.mjpeg_ingest
+# Or stand in for the phone with: python -m benchmarks.mjpeg_ingest --serve --port 8080
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dax'))
+from mjpegcapture import MjpegCapture
+from threadedcapture import ThreadedCapture
+from benchmarks.trackers import repository_root
+
+boundary = "frameboundary"
+
+
+class MjpegServer:
+    # Serves a video file as a multipart MJPEG stream at its frame rate, looping forever, the way the IP Webcam app
+    # serves /video. Every frame is encoded once up front so serving costs nothing but sending
+
+    def __init__(self, file_path, port=0, size=None, quality=80, frame_count=300):
+        self.__jpegs = []
+        video_cap = cv.VideoCapture(file_path)
+        self.__fps = video_cap.get(cv.CAP_PROP_FPS) or 30.0
+        while self.__jpegs.__len__() < frame_count:
+            ret, frame = video_cap.read()
+            if ret is False or frame is None:
+                break
+            if size is not None:
+                frame = cv.resize(frame, size, interpolation=cv.INTER_LINEAR)
+            self.__jpegs.append(cv.imencode(".jpg", frame, [cv.IMWRITE_JPEG_QUALITY, quality])[1].tobytes())
+            self.__frame_size = frame.shape[1::-1]
+        video_cap.release()
+        if self.__jpegs.__len__() == 0:
+            raise ValueError(f"Unknown video {file_path}")
+
+        server = self
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.stream(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.__server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.__server.daemon_threads = True
+        self.__thread = None
+        self.__stopped = threading.Event()
+
+    def getUrl(self):
+        return f"http://127.0.0.1:{self.__server.server_address[1]}/video"
+
+    def getFrameSize(self):
+        return self.__frame_size
+
+    def getMeanJpegSize(self):
+        return float(np.mean([jpeg.__len__() for jpeg in self.__jpegs]))
+
+    def start(self):
+        self.__thread = threading.Thread(target=self.__server.serve_forever, daemon=True)
+        self.__thread.start()
+
+    def stop(self):
+        # Drops every connection, clients see the stream end as if the phone went away
+        self.__stopped.set()
+        self.__server.shutdown()
+        self.__server.server_close()
+
+    def stream(self, handler):
+        handler.send_response(200)
+        handler.send_header("Content-Type", f"multipart/x-mixed-replace;boundary={boundary}")
+        handler.end_headers()
+        next_frame = time.monotonic()
+        index = 0
+        try:
+            while not self.__stopped.is_set():
+                jpeg = self.__jpegs[index % self.__jpegs.__len__()]
+                handler.wfile.write(f"--{boundary}\r\nContent-Type: image/jpeg\r\nContent-Length: {jpeg.__len__()}\r\n\r\n".encode("ascii"))
+                handler.wfile.write(jpeg)
+                handler.wfile.write(b"\r\n")
+                index += 1
+                next_frame += 1 / self.__fps
+                delay = next_frame - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+        except (BrokenPipeError, ConnectionResetError, OSError):
+            pass
+
+
+def measure(video_cap, duration, track_time):
+    # Reads like a tracker taking track_time seconds per frame, returns frames/s, mean lag in ms and the frame shape
+    ret, frame = video_cap.read()
+    if ret is False:
+        return 0.0, 0.0, None
+    frame_shape = frame.shape
+    start = time.monotonic()
+    read_count = 0
+    lag_total = 0.0
+    while time.monotonic() - start < duration:
+        ret, frame = video_cap.read()
+        if ret is False:
+            break
+        lag_total += time.monotonic() - video_cap.getLastTimestamp()
+        read_count += 1
+        # Busy wait instead of sleeping, a tracker holds the CPU and the GIL is released by OpenCV calls
+        busy_until = time.perf_counter() + track_time
+        while time.perf_counter() < busy_until:
+            cv.GaussianBlur(frame[:8, :8], (3, 3), 0)
+    elapsed = time.monotonic() - start
+    if read_count == 0:
+        return 0.0, 0.0, frame_shape
+    return read_count / elapsed, lag_total / read_count * 1000, frame_shape
+
+
+def measureReconnect(file_path, size, port):
+    # Drops the stream, brings the server back after a second and times how long the client takes to get a frame again
+    server = MjpegServer(file_path, port, size)
+    server.start()
+    video_cap = MjpegCapture(server.getUrl(), MjpegCapture.DECODE_GRAY, 4, min_backoff=0.25)
+    video_cap.read()
+    server.stop()
+    time.sleep(1.0)
+    server = MjpegServer(file_path, port, size)
+    server.start()
+    restarted = time.monotonic()
+    video_cap.read()
+    resumed = time.monotonic() - restarted
+    reconnects = video_cap.getReconnectCount()
+    video_cap.release()
+    server.stop()
+    return resumed, reconnects
+
+
+def freePort():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare ways of reading an MJPEG stream served from a local video file")
+    parser.add_argument("--video", default=os.path.join(repository_root, "videoplayback.mp4"))
+    parser.add_argument("--size", default="1280x720", help="frame size the video is served at, WIDTHxHEIGHT")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds each reader is measured for")
+    parser.add_argument("--track-ms", type=float, default=10.0, help="simulated tracking time per frame")
+    parser.add_argument("--serve", action="store_true", help="only serve the stream until interrupted")
+    parser.add_argument("--port", type=int, default=0)
+    args = parser.parse_args()
+
+    size = tuple(int(value) for value in args.size.split("x"))
+    port = args.port or freePort()
+    server = MjpegServer(args.video, port, size)
+    server.start()
+
+    if args.serve:
+        print(f"Serving {args.video} at {server.getUrl()}")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            server.stop()
+        sys.exit(0)
+
+    print(f"{size[0]}x{size[1]} JPEGs of {server.getMeanJpegSize() / 1000:.0f} kB, {args.track_ms:.0f} ms simulated tracking, {os.cpu_count()} cores")
+    readers = (
+        ("ThreadedCapture", lambda: ThreadedCapture(server.getUrl(), ThreadedCapture.POLICY_LATEST)),
+        ("MjpegCapture color", lambda: MjpegCapture(server.getUrl())),
+        ("MjpegCapture gray", lambda: MjpegCapture(server.getUrl(), MjpegCapture.DECODE_GRAY)),
+        ("MjpegCapture gray/2", lambda: MjpegCapture(server.getUrl(), MjpegCapture.DECODE_GRAY, 2)),
+        ("MjpegCapture gray/4", lambda: MjpegCapture(server.getUrl(), MjpegCapture.DECODE_GRAY, 4)),
+        ("MjpegCapture gray/8", lambda: MjpegCapture(server.getUrl(), MjpegCapture.DECODE_GRAY, 8)),
+    )
+    for label, makeReader in readers:
+        video_cap = makeReader()
+        fps, lag_ms, frame_shape = measure(video_cap, args.duration, args.track_ms / 1000)
+        decode = ""
+        if isinstance(video_cap, MjpegCapture):
+            decode = f"decode {video_cap.getDecodeTime() * 1000:6.2f} ms, {video_cap.getSkippedCount()} JPEGs never decoded"
+        video_cap.release()
+        print(f"{label:20} {str(frame_shape):16} {fps:6.1f} fps lag {lag_ms:6.1f} ms {decode}")
+    server.stop()
+
+    resumed, reconnects = measureReconnect(args.video, size, freePort())
+    print(f"Reconnected {resumed * 1000:.0f} ms after the server came back, {reconnects} attempts")
@@ -0,0 +1,123 @@
+import multiprocessing
+import os
+import pty
+import socket
+import sys
+import threading
+import time
+import numpy as np
+
+# Run from the repository root: python -m benchmarks.result_publishing
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dax'))
+from resultpublisher import RECORD, DatagramTransport, ResultPublisher, ResultSubscriber, WebSocketTransport
+
+frame_count = 2000
+# Time between frames the publisher gets to catch up in, a tracker running at a few hundred fps
+# It is slept instead of spent in a busy loop, trackers spend their time in OpenCV calls that let other threads run
+frame_interval = 0.002
+# Seconds without a record after which a consumer stops counting
+receive_timeout = 0.5
+
+
+def drainTerminal(master):
+    try:
+        while True:
+            os.read(master, 65536)
+    except OSError:
+        pass
+
+
+def timePrints(points):
+    # What dax/main.py and Opticalflow.py did, printing to a terminal that something else reads from
+    # A pseudo terminal stands in for the real one, a thread drains it the way a terminal window would
+    master, slave = pty.openpty()
+    draining = threading.Thread(target=drainTerminal, args=(master, ), daemon=True)
+    draining.start()
+    terminal = os.fdopen(slave, "w", buffering=1)
+
+    times = {}
+    for label, values in (("print position and direction", ((320, 180), (4, -2))), ("print every point", (points, ))):
+        start = time.perf_counter()
+        for _ in range(frame_count):
+            for value in values:
+                print(value, file=terminal)
+        times[label] = (time.perf_counter() - start) / frame_count
+    terminal.close()
+    return times
+
+
+def countDatagrams(address, results):
+    # Consumer process, binds the subscriber, reports its address, then counts records until they stop coming
+    subscriber = ResultSubscriber(address)
+    results.put(subscriber.getAddress())
+    count = 0
+    while subscriber.receive(receive_timeout) is not None:
+        count += 1
+    subscriber.close()
+    results.put(count)
+
+
+def countWebSocketMessages(port, results):
+    # Consumer process, a bare WebSocket client, every message is a two byte header and one record
+    client = socket.create_connection(("127.0.0.1", port))
+    client.sendall(b"GET / HTTP/1.1\r\nHost: localhost\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                   b"Sec-WebSocket-Key: dGhlIHNhbXBsZSBub25jZQ==\r\nSec-WebSocket-Version: 13\r\n\r\n")
+    response = b""
+    while not response.endswith(b"\r\n\r\n"):
+        response += client.recv(1)
+    results.put(None)
+
+    client.settimeout(receive_timeout)
+    received = 0
+    try:
+        while True:
+            chunk = client.recv(65536)
+            if chunk == b"":
+                break
+            received += chunk.__len__()
+    except socket.timeout:
+        pass
+    client.close()
+    results.put(received // (RECORD.size + 2))
+
+
+def runPublisher(transport, consumer, results):
+    # Publishes frame_count records a frame interval apart while the consumer process counts them
+    publisher = ResultPublisher(transport)
+    publish_time = 0.0
+    for index in range(frame_count):
+        start = time.perf_counter()
+        publisher.publish((320 + index % 10, 180), (4, -2), confidence=0.9)
+        publish_time += time.perf_counter() - start
+        time.sleep(frame_interval)
+    received = results.get()
+    consumer.join()
+    publisher.close()
+    return publish_time / frame_count, publisher, received
+
+
+if __name__ == '__main__':
+    context = multiprocessing.get_context("spawn")
+    points = np.random.default_rng(0).uniform(0, 640, (300, 1, 2)).astype(np.float32)
+    print(f"{frame_count} frames {frame_interval * 1000:.0f} ms apart, {RECORD.size} byte records, {os.cpu_count()} cores")
+    for label, per_frame in timePrints(points).items():
+        print(f"{label:30} {per_frame * 1e6:9.1f} us per frame")
+
+    socket_path = "/tmp/result_publishing.sock"
+    for label, address in (("UDP", ("127.0.0.1", 0)), ("Unix socket", socket_path), ("WebSocket", None)):
+        results = context.Queue()
+        if address is None:
+            transport = WebSocketTransport("127.0.0.1", 0)
+            consumer = context.Process(target=countWebSocketMessages, args=(transport.getPort(), results))
+            consumer.start()
+            results.get()
+            while transport.getClientCount() == 0:
+                time.sleep(0.001)
+        else:
+            consumer = context.Process(target=countDatagrams, args=(address, results))
+            consumer.start()
+            transport = DatagramTransport(results.get())
+
+        publish_time, publisher, received = runPublisher(transport, consumer, results)
+        print(f"{label:30} {publish_time * 1e6:9.1f} us per publish, send latency {publisher.getSendLatency() * 1e6:7.1f} us "
+              f"mean {publisher.getMaxSendLatency() * 1e6:8.1f} us max, {received} received, {publisher.getDroppedCount()} dropped")
@@ -0,0 +1,192 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+import cv2 as cv
+import numpy as np
+
+# Run from the repository root: python -m benchmarks.run_trackers --output results.json
+from benchmarks.synthetic_video import SyntheticVideo
+from benchmarks.trackers import TRACKERS, repository_root
+
+# Named videos every run can choose from, synthetic ones are generated in memory so they never differ between runs
+VIDEOS = {
+    "synthetic_360p": dict(width=640, height=360, blob_count=1, speed=4.0),
+    "synthetic_720p": dict(width=1280, height=720, blob_count=1, blob_radius=60, speed=8.0),
+    "synthetic_720p_fast": dict(width=1280, height=720, blob_count=1, blob_radius=60, speed=20.0),
+    "synthetic_360p_two_blobs": dict(width=640, height=360, blob_count=2, speed=4.0),
+    "videoplayback": os.path.join(repository_root, "videoplayback.mp4"),
+}
+
+
+class VideoFileSource:
+    # Reads frames from a file, ground truth is unknown
+
+    def __init__(self, file_path, frame_count):
+        self.__file_path = file_path
+        self.__frame_count = frame_count
+
+    def frames(self):
+        video_cap = cv.VideoCapture(self.__file_path)
+        for _ in range(self.__frame_count):
+            ret, frame = video_cap.read()
+            if ret is False or frame is None:
+                break
+            yield frame, None
+        video_cap.release()
+
+
+def makeSource(video_name, frame_count, seed):
+    video = VIDEOS[video_name]
+    if isinstance(video, str):
+        return VideoFileSource(video, frame_count)
+    return SyntheticVideo(frame_count=frame_count, seed=seed, **video)
+
+
+def percentile(values, percent):
+    if values.__len__() == 0:
+        return None
+    return float(np.percentile(values, percent))
+
+
+def runCase(tracker_name, video_name, frame_count, warmup_count, seed, thread_count):
+    # Runs one tracker over one video, meant to be called in a fresh process so peak memory belongs to this case alone
+    # Trackers print while they run, keep stdout free for the JSON report
+    sys.stdout = sys.stderr
+    cv.setRNGSeed(seed)
+    np.random.seed(seed)
+    if thread_count is not None:
+        cv.setNumThreads(thread_count)
+
+    tracker = TRACKERS[tracker_name]()
+    source = makeSource(video_name, frame_count + warmup_count, seed)
+
+    frame_times = []
+    source_times = []
+    errors = []
+    warmup_stages = {}
+    frame_index = 0
+    source_start = time.perf_counter()
+    for frame, true_positions in source.frames():
+        source_times.append(time.perf_counter() - source_start)
+
+        start = time.perf_counter()
+        tracker.run(frame)
+        elapsed = time.perf_counter() - start
+
+        if frame_index >= warmup_count:
+            frame_times.append(elapsed)
+
+            # Distance from the tracked position to the closest true blob center
+            position = tracker.getPosition()
+            if true_positions is not None and position is not None and len(position) == 2 and tuple(position) != (0, 0):
+                distances = np.linalg.norm(true_positions - np.asarray(position, dtype=np.float64), axis=1)
+                errors.append(float(distances.min()))
+
+        frame_index += 1
+        if frame_index == warmup_count and hasattr(tracker, "getStageTimings"):
+            warmup_stages = tracker.getStageTimings()
+        source_start = time.perf_counter()
+
+    frame_times = np.array(frame_times)
+    total_time = float(frame_times.sum())
+
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        peak_rss //= 1024
+
+    stages = {
+        "frame_source": float(np.sum(source_times[warmup_count:])),
+        "tracker_run": total_time,
+    }
+    # Stage totals from the tracker's own stats, without the warmup frames
+    if hasattr(tracker, "getStageTimings"):
+        for stage, seconds in tracker.getStageTimings().items():
+            stages[stage] = seconds - warmup_stages.get(stage, 0.0)
+
+    return {
+        "tracker": tracker_name,
+        "video": video_name,
+        "frames": int(frame_times.__len__()),
+        "fps": frame_times.__len__() / total_time if total_time > 0 else None,
+        "latency_ms": {
+            "mean": float(frame_times.mean() * 1000) if frame_times.__len__() > 0 else None,
+            "p50": percentile(frame_times * 1000, 50),
+            "p95": percentile(frame_times * 1000, 95),
+            "p99": percentile(frame_times * 1000, 99),
+            "max": float(frame_times.max() * 1000) if frame_times.__len__() > 0 else None,
+        },
+        "peak_rss_mb": peak_rss / 1024,
+        "stages_seconds": stages,
+        "position_error_px": {
+            "frames_with_position": errors.__len__(),
+            "mean": float(np.mean(errors)) if errors.__len__() > 0 else None,
+            "p95": percentile(errors, 95),
+        },
+    }
+
+
+def describeMachine():
+    # Recorded with every report so results are only compared between runs on the same setup
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=repository_root, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "opencv": cv.__version__,
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "opencv_threads": cv.getNumThreads(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the trackers headless and write the results as JSON")
+    parser.add_argument("--trackers", nargs="+", default=list(TRACKERS), choices=list(TRACKERS))
+    parser.add_argument("--videos", nargs="+", default=list(VIDEOS), choices=list(VIDEOS))
+    parser.add_argument("--frames", type=int, default=300, help="measured frames per run")
+    parser.add_argument("--warmup", type=int, default=10, help="frames run before measuring starts")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per case, the fastest run is reported")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--threads", type=int, default=None, help="cv.setNumThreads for the tracker process")
+    parser.add_argument("--output", default=None, help="JSON file to write, prints to stdout when left out")
+    args = parser.parse_args()
+
+    # Every case runs in its own fresh process, so one tracker's memory and caches don't leak into the next
+    context = multiprocessing.get_context("spawn")
+    results = []
+    for tracker_name in args.trackers:
+        for video_name in args.videos:
+            runs = []
+            for _ in range(args.repeat):
+                with context.Pool(1) as pool:
+                    runs.append(pool.apply(runCase, (tracker_name, video_name, args.frames, args.warmup, args.seed, args.threads)))
+            best = min(runs, key=lambda run: run["latency_ms"]["mean"] or float("inf"))
+            results.append(best)
+            print(f"{tracker_name:22} {video_name:26} {best['fps'] or 0:8.1f} fps  p95 {best['latency_ms']['p95'] or 0:7.2f} ms", file=sys.stderr)
+
+    report = {
+        "machine": describeMachine(),
+        "settings": vars(args),
+        "results": results,
+    }
+
+    if args.output is None:
+        print(json.dumps(report, indent=2))
+    else:
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
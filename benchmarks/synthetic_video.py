@@ -0,0 +1,97 @@
+import argparse
+import cv2 as cv
+import numpy as np
+
+class SyntheticVideo:
+    # Deterministic test video: a textured background with textured blobs bouncing around on it
+    # The same settings and seed always give exactly the same frames, and the true blob centers are known
+
+    def __init__(self, width=640, height=360, frame_count=300, blob_count=1, blob_radius=30, speed=4.0, seed=0):
+        self.width = width
+        self.height = height
+        self.frame_count = frame_count
+        self.blob_count = blob_count
+        self.blob_radius = blob_radius
+        self.speed = speed
+        self.seed = seed
+
+        rng = np.random.default_rng(seed)
+
+        # Low resolution noise scaled up gives soft texture with plenty of corners for the trackers to find
+        noise = rng.integers(0, 256, (max(height // 8, 1), max(width // 8, 1), 3), dtype=np.uint8)
+        self.__background = cv.resize(noise, (width, height), interpolation=cv.INTER_LINEAR)
+
+        # Each blob is a bright checkered disc so it has corners of its own that move with it
+        size = blob_radius * 2
+        self.__sprites = []
+        for _ in range(blob_count):
+            checker_count = 4
+            cells = rng.integers(0, 2, (checker_count, checker_count)).astype(np.uint8)
+            pattern = cv.resize(cells, (size, size), interpolation=cv.INTER_NEAREST)
+            color = rng.integers(150, 256, 3)
+            sprite = np.where(pattern[..., None] == 1, color, color // 3).astype(np.uint8)
+            self.__sprites.append(sprite)
+        self.__sprite_mask = np.zeros((size, size), dtype=np.uint8)
+        cv.circle(self.__sprite_mask, (blob_radius, blob_radius), blob_radius, 255, -1)
+
+        # Starting positions and velocities, every blob moves at the same speed in a different direction
+        low = np.array([blob_radius, blob_radius], dtype=np.float64)
+        high = np.array([width - blob_radius, height - blob_radius], dtype=np.float64)
+        self.__start_positions = rng.uniform(low, high, (blob_count, 2))
+        angles = rng.uniform(0, 2 * np.pi, blob_count)
+        self.__start_velocities = np.stack((np.cos(angles), np.sin(angles)), axis=1) * speed
+        self.__low = low
+        self.__high = high
+
+    def getName(self):
+        return f"synthetic_{self.width}x{self.height}_{self.blob_count}blob_speed{self.speed:g}_seed{self.seed}"
+
+    def getFps(self):
+        return 30.0
+
+    def positionsAt(self, frame_index):
+        # Blob centers bounce off the frame edges, worked out directly so any frame can be generated on its own
+        span = self.__high - self.__low
+        travelled = self.__start_positions - self.__low + self.__start_velocities * frame_index
+        folded = np.mod(travelled, 2 * span)
+        return self.__low + np.where(folded > span, 2 * span - folded, folded)
+
+    def renderFrame(self, frame_index):
+        frame = self.__background.copy()
+        size = self.blob_radius * 2
+        for sprite, position in zip(self.__sprites, self.positionsAt(frame_index)):
+            x = int(round(position[0])) - self.blob_radius
+            y = int(round(position[1])) - self.blob_radius
+            region = frame[y:y + size, x:x + size]
+            cv.copyTo(sprite, self.__sprite_mask, region)
+        return frame
+
+    def frames(self):
+        # Yields (frame, true blob centers) for every frame
+        for frame_index in range(self.frame_count):
+            yield self.renderFrame(frame_index), self.positionsAt(frame_index)
+
+    def write(self, file_path):
+        # Saves the video and the true blob centers next to it as a .npz file
+        writer = cv.VideoWriter(file_path, cv.VideoWriter_fourcc(*"mp4v"), self.getFps(), (self.width, self.height))
+        positions = []
+        for frame, frame_positions in self.frames():
+            writer.write(frame)
+            positions.append(frame_positions)
+        writer.release()
+        np.savez(file_path.rsplit(".", 1)[0] + "_truth.npz", positions=np.array(positions))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Write a deterministic synthetic tracking video")
+    parser.add_argument("output", help="video file to write, for example synthetic.mp4")
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=360)
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--blobs", type=int, default=1)
+    parser.add_argument("--radius", type=int, default=30)
+    parser.add_argument("--speed", type=float, default=4.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    SyntheticVideo(args.width, args.height, args.frames, args.blobs, args.radius, args.speed, args.seed).write(args.output)
@@ -0,0 +1,231 @@
+import os
+import sys
+import cv2 as cv
+import numpy as np
+
+# The trackers live in folders that are meant to be run from directly, make them importable from here
+repository_root = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+for folder_path in (repository_root, os.path.join(repository_root, 'Optical Flow Final'), os.path.join(repository_root, 'dax')):
+    if folder_path not in sys.path:
+        sys.path.insert(0, folder_path)
+
+
+class OpticalFlowSparseTracker:
+
+    def __init__(self, use_roi=False, preprocessing_mode="gray", levels=1, top_up=True, arena=False, multi_target=False):
+        from OpticalFlowSparse import OpticalFlowSparse
+        from FramePreprocessor import FramePreprocessor
+        from TrackingRenderer import NullRenderer
+        from TrackingStats import TrackingStats
+        preprocessor = FramePreprocessor(preprocessing_mode, levels=levels, arena=arena)
+        self.__tracker = OpticalFlowSparse(NullRenderer(), TrackingStats(), use_roi, preprocessor, top_up, multi_target)
+
+    def run(self, frame):
+        self.__tracker.run(frame)
+
+    def getPosition(self):
+        return self.__tracker.getPosition()
+
+    def getStageTimings(self):
+        return self.__tracker.getStats().getTotals()
+
+
+class SparseHappyDaxTracker:
+
+    def __init__(self, target_fps=None, cadence=None, max_motion=None):
+        from sparsedense.sparse_flow_vHappyDax import SparseHappyDax
+        from sparsedense.resolutioncontroller import ResolutionController
+        from sparsedense.predictivetracker import PredictiveTracker
+        from sparsedense.trackingstats import TrackingStats
+        self.__tracker = SparseHappyDax(TrackingStats())
+        self.__runner = self.__tracker
+        if target_fps is not None:
+            self.__runner = ResolutionController(self.__tracker, target_fps)
+        if cadence is not None:
+            self.__runner = PredictiveTracker(self.__tracker, cadence, max_motion)
+
+    def run(self, frame):
+        self.__runner.run(frame)
+
+    def getPosition(self):
+        return self.__runner.getPosition()
+
+    def getStageTimings(self):
+        return self.__tracker.stats.getTotals()
+
+
+class DenseOpticalFlowTracker:
+
+    def __init__(self, backend="farneback", preset="fast", levels=1, warm_start=True, visualize=False):
+        from sparsedense.dense_flow import DenseOpticalFlow
+        from sparsedense.framepreprocessor import FramePreprocessor
+        from sparsedense.trackingstats import TrackingStats
+        preprocessor = FramePreprocessor(FramePreprocessor.MODE_PYRAMID, blur_size=1, levels=levels)
+        self.__tracker = DenseOpticalFlow(backend, preset, preprocessor, warm_start, visualize, TrackingStats())
+
+    def run(self, frame):
+        self.__tracker.run(frame)
+
+    def getPosition(self):
+        return self.__tracker.getPosition()
+
+    def getStageTimings(self):
+        return self.__tracker.stats.getTotals()
+
+
+class ParticleFilterTracker:
+
+    def __init__(self, particle_count=2000):
+        from particle import ParticleTracker
+        from sparsedense.trackingstats import TrackingStats
+        self.__tracker = ParticleTracker(particle_count=particle_count, stats=TrackingStats())
+
+    def run(self, frame):
+        self.__tracker.run(frame)
+
+    def getPosition(self):
+        return self.__tracker.getPosition()
+
+    def getStageTimings(self):
+        return self.__tracker.stats.getTotals()
+
+
+class MotionDetectorTracker:
+
+    def __init__(self, model="average", scale=0.5):
+        from MotionDetector import MotionDetector
+        self.__detector = MotionDetector(model, scale)
+
+    def run(self, frame):
+        self.__detector.run(frame)
+
+    def getPosition(self):
+        return self.__detector.getPosition()
+
+
+class CamshiftTracker:
+    # Same per-frame work as the Camshift class in main.py, which runs its whole loop inside __init__ with windows open
+
+    def __init__(self):
+        self.__track_window = (200, 60, 200, 200)
+        self.__roi_hist = None
+        self.__term_crit = (cv.TERM_CRITERIA_EPS | cv.TERM_CRITERIA_COUNT, 10, 1)
+        self.__position = ()
+
+    def run(self, frame):
+        if self.__roi_hist is None:
+            # Histogram of the hard-coded starting window, like Camshift.__init__
+            x, y, width, height = self.__track_window
+            roi = frame[y:y + height, x:x + width]
+            hsv_roi = cv.cvtColor(roi, cv.COLOR_BGR2HSV)
+            self.__roi_hist = cv.calcHist([hsv_roi], [0], None, [180], [0, 180])
+            cv.normalize(self.__roi_hist, self.__roi_hist, 0, 255, cv.NORM_MINMAX)
+            return
+
+        frame_height, frame_width = frame.shape[:2]
+        frame = cv.resize(frame, (720, 720), fx=0, fy=0, interpolation=cv.INTER_CUBIC)
+        ret1, frame1 = cv.threshold(frame, 180, 155, cv.THRESH_TOZERO_INV)
+        hsv = cv.cvtColor(frame1, cv.COLOR_BGR2HSV)
+        dst = cv.calcBackProject([hsv], [0], self.__roi_hist, [0, 180], 1)
+        ret2, self.__track_window = cv.CamShift(dst, self.__track_window, self.__term_crit)
+
+        # CamShift collapses the window when it loses the target, start over from the initial window
+        if self.__track_window[2] == 0 or self.__track_window[3] == 0:
+            self.__track_window = (200, 60, 200, 200)
+
+        # Tracking happens on the 720 x 720 resized frame, scale back to the input frame
+        self.__position = (int(ret2[0][0] * frame_width / 720), int(ret2[0][1] * frame_height / 720))
+
+    def getPosition(self):
+        return self.__position
+
+
+class StreamingCamshiftTracker:
+
+    def __init__(self, padding=0.5):
+        import CamshiftTracker as camshift_tracker
+        self.__tracker = camshift_tracker.CamshiftTracker(padding=padding)
+
+    def run(self, frame):
+        self.__tracker.run(frame)
+
+    def getPosition(self):
+        return self.__tracker.getPosition()
+
+
+class FrameDifferenceTracker:
+    # Same per-frame work as "Video track.py", which is a top level script and can't be imported
+
+    def __init__(self):
+        self.__prev_frame = None
+        self.__position = ()
+
+    def run(self, frame):
+        if self.__prev_frame is None:
+            self.__prev_frame = frame
+            return
+
+        diff = cv.absdiff(self.__prev_frame, frame)
+        gray = cv.cvtColor(diff, cv.COLOR_BGR2GRAY)
+        blur = cv.GaussianBlur(gray, (5, 5), 0)
+        _, thresh = cv.threshold(blur, 20, 255, cv.THRESH_BINARY)
+        dilated = cv.dilate(thresh, None, iterations=3)
+        contours, _ = cv.findContours(dilated, cv.RETR_TREE, cv.CHAIN_APPROX_SIMPLE)
+        self.__prev_frame = frame
+
+        # The script only draws boxes, use the center of the biggest moving area as its position
+        largest_area = 900
+        for contour in contours:
+            area = cv.contourArea(contour)
+            if area < largest_area:
+                continue
+            largest_area = area
+            (x, y, w, h) = cv.boundingRect(contour)
+            self.__position = (x + w // 2, y + h // 2)
+
+    def getPosition(self):
+        return self.__position
+
+
+TRACKERS = {
+    "optical_flow_sparse": OpticalFlowSparseTracker,
+    "optical_flow_sparse_roi": lambda: OpticalFlowSparseTracker(use_roi=True),
+    # The blur on the color frame the tracker used before preprocessing became configurable, to compare against
+    "optical_flow_sparse_color": lambda: OpticalFlowSparseTracker(preprocessing_mode="color"),
+    "optical_flow_sparse_pyramid": lambda: OpticalFlowSparseTracker(preprocessing_mode="pyramid"),
+    "optical_flow_sparse_pyramid2": lambda: OpticalFlowSparseTracker(preprocessing_mode="pyramid", levels=2),
+    # Throws every marker away and rescans the whole frame when there is no lock, instead of topping up
+    "optical_flow_sparse_reset": lambda: OpticalFlowSparseTracker(top_up=False),
+    # Preprocessed images written into two reused buffers instead of new arrays every frame
+    "optical_flow_sparse_arena": lambda: OpticalFlowSparseTracker(arena=True),
+    "optical_flow_sparse_roi_arena": lambda: OpticalFlowSparseTracker(use_roi=True, arena=True),
+    # Moving markers clustered into separate targets, the position follows the biggest one
+    "optical_flow_sparse_multi": lambda: OpticalFlowSparseTracker(multi_target=True),
+    "sparse_happy_dax": SparseHappyDaxTracker,
+    # Shrunk to the biggest size that still tracks at 30 fps, starting from the 160 pixels wide frames of dax/main.py
+    "sparse_happy_dax_adaptive": lambda: SparseHappyDaxTracker(target_fps=30),
+    # Optical flow on every second or third frame, a Kalman filter predicts the position on the frames between
+    # A target moving more than half the optical flow window since the last run is tracked early
+    "sparse_happy_dax_kalman2": lambda: SparseHappyDaxTracker(cadence=2),
+    "sparse_happy_dax_kalman3": lambda: SparseHappyDaxTracker(cadence=3),
+    # Never tracked early, however fast the target moves
+    "sparse_happy_dax_kalman2_fixed": lambda: SparseHappyDaxTracker(cadence=2, max_motion=float("inf")),
+    # Full resolution Farneback building the HSV image every frame, what DenseOpticalFlow.Start always did
+    "dense_optical_flow": lambda: DenseOpticalFlowTracker(levels=0, warm_start=False, visualize=True),
+    "dense_farneback": DenseOpticalFlowTracker,
+    "dense_dis_ultrafast": lambda: DenseOpticalFlowTracker(backend="dis", preset="ultrafast"),
+    "dense_dis_fast": lambda: DenseOpticalFlowTracker(backend="dis", preset="fast"),
+    "dense_dis_fast_full": lambda: DenseOpticalFlowTracker(backend="dis", preset="fast", levels=0),
+    # Particle filter weighted by frame differences, no corners or optical flow
+    "particle_motion": ParticleFilterTracker,
+    "particle_motion_500": lambda: ParticleFilterTracker(500),
+    "camshift": CamshiftTracker,
+    # CamshiftTracker from the repository root, works on the area around the window instead of a resized whole frame
+    "camshift_streaming": StreamingCamshiftTracker,
+    "frame_difference": FrameDifferenceTracker,
+    # MotionDetector doing the same frame differencing at full size, then the cheaper settings
+    "motion_difference_full": lambda: MotionDetectorTracker("difference", 1.0),
+    "motion_difference": lambda: MotionDetectorTracker("difference"),
+    "motion_average": MotionDetectorTracker,
+    "motion_mog2": lambda: MotionDetectorTracker("mog2"),
+}
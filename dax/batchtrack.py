@@ -0,0 +1,123 @@
+import argparse
+import csv
+import multiprocessing
+import os
+import sys
+import time
+import numpy as np
+
+from trackingservice import TRACKERS, makeTracker
+
+# Columns of the per-frame track, positions and directions are empty (NaN in .npz) on frames without a lock
+COLUMNS = ("frame", "timestamp_ms", "x", "y", "direction_x", "direction_y", "live_points", "moving_points")
+
+
+def trackSegment(source, tracker_name, start_frame, end_frame, warmup_count, thread_count):
+    # Tracks frames start_frame up to end_frame, or the end of the video when end_frame is None
+    # The tracker first runs over up to warmup_count frames before start_frame without recording them, so it already has
+    # markers and a lock when the segment starts, like it would have had running through the whole video
+    import cv2
+    cv2.setNumThreads(thread_count)
+
+    tracker = makeTracker(tracker_name)
+    video_cap = cv2.VideoCapture(source)
+    frame_index = max(start_frame - warmup_count, 0)
+    if frame_index > 0:
+        video_cap.set(cv2.CAP_PROP_POS_FRAMES, frame_index)
+
+    # Every frame is decoded into the previous frame's image, the tracker is done with it by then
+    rows = []
+    frame = None
+    while end_frame is None or frame_index < end_frame:
+        ret, frame = video_cap.read(image=frame)
+        if ret is False or frame is None:
+            break
+        timestamp = video_cap.get(cv2.CAP_PROP_POS_MSEC)
+        tracker.run(frame)
+
+        if frame_index >= start_frame:
+            position = tuple(tracker.getPosition())
+            direction = tuple(tracker.getDirection())
+            if position.__len__() != 2 or direction.__len__() != 2:
+                position = direction = (np.nan, np.nan)
+            rows.append((frame_index, timestamp) + position + direction + (tracker.getLiveCount(), tracker.getMovingCount()))
+        frame_index += 1
+
+    video_cap.release()
+    return np.array(rows, dtype=np.float64).reshape(-1, COLUMNS.__len__())
+
+
+def splitSegments(frame_count, worker_count, segment_length=None):
+    # Even segments for every worker unless a length is given, the last one runs to the end of the video
+    # CAP_PROP_FRAME_COUNT is only an estimate for some files, which is why it is never used as the last end
+    if segment_length is None:
+        segment_length = int(np.ceil(frame_count / worker_count)) if frame_count > 0 else 0
+    if worker_count == 1 or segment_length <= 0:
+        return [(0, None)]
+
+    starts = list(range(0, frame_count, segment_length))
+    return [(start, end) for start, end in zip(starts, starts[1:] + [None])]
+
+
+def trackVideo(source, tracker_name="sparse_happy_dax", worker_count=1, segment_length=None, warmup_count=30):
+    # Returns the track as one row per frame with COLUMNS
+    import cv2
+    if tracker_name not in TRACKERS:
+        raise ValueError(f"Unknown tracker {tracker_name}")
+    if not os.path.isfile(source):
+        raise FileNotFoundError(source)
+
+    video_cap = cv2.VideoCapture(source)
+    frame_count = int(video_cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    video_cap.release()
+
+    segments = splitSegments(frame_count, worker_count, segment_length)
+    thread_count = max((os.cpu_count() or 1) // worker_count, 1)
+    tasks = [(source, tracker_name, start, end, warmup_count, thread_count) for start, end in segments]
+
+    # A single segment is the sequential run, it needs no worker process
+    if tasks.__len__() == 1:
+        return trackSegment(*tasks[0])
+
+    # Spawned workers start clean, like the tracking service's
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(worker_count) as pool:
+        results = pool.starmap(trackSegment, tasks)
+
+    # Segments don't overlap once their warm up frames are left out, stitching is putting them end to end
+    return np.concatenate(results)
+
+
+def writeTrack(track, file_path):
+    # .npz keeps one array per column, anything else is written as CSV
+    if file_path.endswith(".npz"):
+        columns = {column: track[:, index] for index, column in enumerate(COLUMNS)}
+        for column in ("frame", "live_points", "moving_points"):
+            columns[column] = columns[column].astype(np.int64)
+        np.savez_compressed(file_path, **columns)
+        return
+
+    with open(file_path, "w", newline="") as track_file:
+        writer = csv.writer(track_file)
+        writer.writerow(COLUMNS)
+        for row in track:
+            writer.writerow([int(row[0]), f"{row[1]:.3f}"] + ["" if np.isnan(value) else f"{value:g}" for value in row[2:6]] +
+                            [int(row[6]), int(row[7])])
+
+
+if __name__ == '__main__':
+    # Run from the dax folder: python batchtrack.py ../videoplayback.mp4 track.csv --workers 4
+    parser = argparse.ArgumentParser(description="Track a video file headless and write the per-frame track to CSV or .npz")
+    parser.add_argument("video")
+    parser.add_argument("output", help="track file, .npz or .csv")
+    parser.add_argument("--tracker", default="sparse_happy_dax", choices=TRACKERS)
+    parser.add_argument("--workers", type=int, default=1, help="segments tracked in parallel, 1 tracks the video in one go")
+    parser.add_argument("--segment-length", type=int, default=None, help="frames per segment, an even split between the workers by default")
+    parser.add_argument("--warmup", type=int, default=30, help="frames before each segment the tracker runs over to pick up the target")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    track = trackVideo(args.video, args.tracker, args.workers, args.segment_length, args.warmup)
+    elapsed = time.perf_counter() - start
+    writeTrack(track, args.output)
+    print(f"{track.__len__()} frames tracked in {elapsed:.1f}s ({track.__len__() / elapsed:.1f} fps), written to {args.output}", file=sys.stderr)
@@ -0,0 +1,156 @@
+import time
+import numpy as np
+
+class FrameScheduler:
+    # Reads frames from a ThreadedCapture and only runs the tracker on frames that are still fresh enough
+    # When frames are queued up behind a slow one, the old ones are skipped instead of tracked, and get a position
+    # extrapolated from the last tracked positions and their capture timestamps
+    # Has the same read/isOpened/release calls as the capture and the same getPosition/getDirection as the tracker
+
+    def __init__(self, video_cap, tracker, max_lag=0.1, max_extrapolation=0.5, stats=None):
+        # A ThreadedCapture, its timestamps are when each frame finished decoding
+        self.__video_cap = video_cap
+        # Anything with run, getPosition and getDirection
+        self.__tracker = tracker
+
+        # Seconds after capture a frame's tracking may finish, a frame that would finish later is skipped when a newer
+        # frame is already waiting. None skips every frame a newer one is waiting behind
+        self.__max_lag = max_lag
+        # Positions are not extrapolated further than this many seconds past the last tracked frame
+        self.__max_extrapolation = max_extrapolation
+
+        # Smoothed tracker time per frame, seconds
+        self.__run_time = 0.0
+
+        # Last tracked position with a lock, its capture timestamp and the velocity in pixels per second that led there
+        self.__measured_position = None
+        self.__measured_timestamp = None
+        self.__velocity = None
+
+        self.__position = ()
+        self.__timestamp = None
+        self.__extrapolated = False
+
+        self.__processed_count = 0
+        self.__skipped_count = 0
+        self.__extrapolated_count = 0
+        self.__lag = 0.0
+
+        # Counters and gauges go to the tracker's TrackingStats when given one
+        self.__stats = stats
+
+    def read(self):
+        # Returns (ret, frame) like the capture, the frame's position is ready once read returns
+        ret, frame = self.__video_cap.read()
+        if ret is False or frame is None:
+            return False, None
+
+        timestamp = self.__video_cap.getLastTimestamp()
+        self.__timestamp = timestamp
+        now = time.monotonic()
+
+        if self.__isStale(timestamp, now):
+            self.__skipped_count += 1
+            self.__count("skipped_frames")
+            self.__position = self.predictPosition(timestamp)
+            self.__extrapolated = self.__position.__len__() == 2
+            if self.__extrapolated:
+                self.__extrapolated_count += 1
+                self.__count("extrapolated_frames")
+            return True, frame
+
+        self.__tracker.run(frame)
+        finished = time.monotonic()
+        self.__run_time = (finished - now) if self.__processed_count == 0 else 0.8 * self.__run_time + 0.2 * (finished - now)
+        self.__processed_count += 1
+
+        # How far behind the camera the published position is
+        self.__lag = finished - timestamp
+        if self.__stats is not None:
+            self.__stats.setGauge("lag_ms", self.__lag * 1000)
+
+        self.__measure(self.__tracker.getPosition(), timestamp)
+        return True, frame
+
+    def __isStale(self, timestamp, now):
+        # Skipping a frame only helps when there is a newer one to track instead
+        if self.__video_cap.getBufferedCount() == 0:
+            return False
+        if self.__max_lag is None:
+            return True
+        return now + self.__run_time - timestamp > self.__max_lag
+
+    def __measure(self, position, timestamp):
+        self.__extrapolated = False
+        position = tuple(position)
+
+        # The trackers give (0, 0) or nothing when they have no lock, there is nothing to extrapolate from then
+        if position.__len__() != 2 or position == (0, 0):
+            self.__position = position
+            self.__measured_position = None
+            self.__velocity = None
+            return
+
+        position = np.array(position, dtype=np.float64)
+        if self.__measured_position is not None and timestamp > self.__measured_timestamp:
+            # Averaged with the previous velocity, the tracked center jitters by a few pixels from frame to frame
+            velocity = (position - self.__measured_position) / (timestamp - self.__measured_timestamp)
+            self.__velocity = velocity if self.__velocity is None else 0.5 * self.__velocity + 0.5 * velocity
+        self.__measured_position = position
+        self.__measured_timestamp = timestamp
+        self.__position = (int(position[0]), int(position[1]))
+
+    def predictPosition(self, timestamp):
+        # Position at a capture timestamp from the last tracked position moving on at constant velocity, () without a lock
+        if self.__measured_position is None:
+            return ()
+        if self.__velocity is None:
+            return (int(self.__measured_position[0]), int(self.__measured_position[1]))
+
+        elapsed = min(max(timestamp - self.__measured_timestamp, 0), self.__max_extrapolation)
+        position = self.__measured_position + self.__velocity * elapsed
+        return (int(position[0]), int(position[1]))
+
+    def __count(self, counter):
+        if self.__stats is not None:
+            self.__stats.count(counter)
+
+    def isOpened(self):
+        return self.__video_cap.isOpened()
+
+    def release(self):
+        self.__video_cap.release()
+
+    def getPosition(self):
+        return self.__position
+
+    def getDirection(self):
+        # Direction of the last tracked frame, the tracker's own measure of it
+        return self.__tracker.getDirection()
+
+    def getTimestamp(self):
+        # Capture timestamp of the frame the position belongs to
+        return self.__timestamp
+
+    def isExtrapolated(self):
+        # True when the last frame was skipped and its position comes from the motion model
+        return self.__extrapolated
+
+    def getVelocity(self):
+        # Pixels per second along x and y, None until two frames in a row were tracked with a lock
+        if self.__velocity is None:
+            return None
+        return (float(self.__velocity[0]), float(self.__velocity[1]))
+
+    def getProcessedCount(self):
+        return self.__processed_count
+
+    def getSkippedCount(self):
+        return self.__skipped_count
+
+    def getExtrapolatedCount(self):
+        return self.__extrapolated_count
+
+    def getLag(self):
+        # Seconds between capture and the tracker finishing, for the last tracked frame
+        return self.__lag
@@ -2,32 +2,65 @@ import cv2
 import numpy as np
 from particle import FollowParticle
 from sparsedense.sparse_flow_vHappyDax import SparseHappyDax
+from sparsedense.resolutioncontroller import ResolutionController
+from mjpegcapture import MjpegCapture
+from sharedframering import ProcessCapture
+from framescheduler import FrameScheduler
+from resultpublisher import ResultPublisher, DatagramTransport
 
-video_cap = cv2.VideoCapture("http://192.168.0.47:8080/video")
-print(video_cap)
-
-ret, firstFrame = video_cap.read()
-print(ret, firstFrame)
-if ret is not False:
-    sparse = SparseHappyDax()
-
-    while video_cap.isOpened():
-        ret, new_frame = video_cap.read()
-
-        if ret is False or new_frame is None:
-            break
-        new_frame = cv2.resize(new_frame, (160, 90))
-
-        sparse.run(new_frame)
-        print(sparse.getPosition())
-        print(sparse.getDirection())
-        
-        idk = tuple(sparse.getPosition())
-        
-        if (len(idk)!=0):
-            new_frame = cv2.circle(new_frame, idk, 2, (255, 0, 0), -1)
-        
-        cv2.imshow("ree", new_frame)
-
-    sparse.release()
-    video_cap.release()
\ No newline at end of file
+# ProcessCapture's capture process imports this file again, only the main process may run it
+if __name__ == '__main__':
+    # Set to a camera index or video file to track that instead of the phone, it is decoded in a separate process and the
+    # tracker reads every frame in place from shared memory, no frame is copied between the processes
+    local_source = None
+
+    if local_source is None:
+        # Read the phone's MJPEG stream ourselves, reconnecting whenever it drops, a few frames are buffered so the scheduler
+        # can see when tracking falls behind. The tracker only works on small gray frames, so the JPEGs are decoded straight
+        # to a quarter size gray image instead of decoding the full color frame and shrinking it afterwards
+        video_cap = MjpegCapture("http://192.168.0.47:8080/video", MjpegCapture.DECODE_GRAY, reduction=4, buffer_size=8)
+    else:
+        # Lossless keeps a few frames buffered like the MJPEG reader, the scheduler skips the ones tracking falls behind on
+        video_cap = ProcessCapture(local_source, ProcessCapture.POLICY_LOSSLESS)
+    print(video_cap)
+
+    ret, firstFrame = video_cap.read()
+    print(ret, firstFrame)
+    if ret is not False:
+        sparse = SparseHappyDax()
+        # Tracks a shrunk copy of every frame, the biggest one the tracker can still handle at the camera's 30 fps
+        controller = ResolutionController(sparse, target_fps=30)
+        # Frames that queued up behind a slow one are skipped instead of tracked, their positions are extrapolated
+        scheduler = FrameScheduler(video_cap, controller, stats=sparse.stats)
+        # Every frame's position and direction go out as a 40 byte UDP record instead of being printed, read them with
+        # resultpublisher.ResultSubscriber(("127.0.0.1", 5005)) from any other process
+        publisher = ResultPublisher(DatagramTransport(("127.0.0.1", 5005)))
+
+        while scheduler.isOpened():
+            ret, new_frame = scheduler.read()
+
+            if ret is False or new_frame is None:
+                break
+
+            publisher.publish(scheduler.getPosition(), scheduler.getDirection(), scheduler.getTimestamp(),
+                              extrapolated=scheduler.isExtrapolated())
+
+            idk = tuple(scheduler.getPosition())
+
+            if (len(idk)!=0):
+                new_frame = cv2.circle(new_frame, idk, 2, (255, 0, 0), -1)
+
+            cv2.imshow("ree", new_frame)
+
+        sparse.release()
+        publisher.close()
+        print(f"Published {publisher.getPublishedCount()} results, dropped {publisher.getDroppedCount()}, "
+              f"send latency {publisher.getSendLatency() * 1e6:.0f} us")
+        print(f"Tracked {scheduler.getProcessedCount()} frames, skipped {scheduler.getSkippedCount()}, "
+              f"extrapolated {scheduler.getExtrapolatedCount()}, last lag {scheduler.getLag() * 1000:.0f} ms")
+    if local_source is None:
+        print(f"Received {video_cap.getReceivedCount()} frames, decoded {video_cap.getDecodedCount()}, "
+              f"dropped {video_cap.getDroppedCount()}, reconnected {video_cap.getReconnectCount()} times")
+    else:
+        print(f"Decoded {video_cap.getDecodedCount()} frames, dropped {video_cap.getDroppedCount()}")
+    video_cap.release()
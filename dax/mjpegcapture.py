@@ -0,0 +1,290 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+import cv2
+import numpy as np
+
+class MjpegCapture:
+    # Reads a multipart MJPEG stream over HTTP, like the IP Webcam app's /video, without going through cv2.VideoCapture
+    # An asyncio loop on its own thread parses the stream and only hands the newest JPEG to the decode threads, JPEGs
+    # that arrive while every decoder is busy are dropped without ever being decoded. Lost connections are retried
+    # with a growing delay
+    # Has the same read/isOpened/release calls as ThreadedCapture, so FrameScheduler can read from it
+
+    # Full size BGR frames, what cv2.VideoCapture gives
+    DECODE_COLOR = "color"
+    # Gray frames, the JPEG decoder skips the color conversion and with a reduction also most of the inverse DCT
+    DECODE_GRAY = "gray"
+
+    # imread flags for each decode mode and reduction, a reduced decode is 1/2, 1/4 or 1/8 of the size on each side
+    __decode_flags = {
+        (DECODE_COLOR, 1): cv2.IMREAD_COLOR,
+        (DECODE_COLOR, 2): cv2.IMREAD_REDUCED_COLOR_2,
+        (DECODE_COLOR, 4): cv2.IMREAD_REDUCED_COLOR_4,
+        (DECODE_COLOR, 8): cv2.IMREAD_REDUCED_COLOR_8,
+        (DECODE_GRAY, 1): cv2.IMREAD_GRAYSCALE,
+        (DECODE_GRAY, 2): cv2.IMREAD_REDUCED_GRAYSCALE_2,
+        (DECODE_GRAY, 4): cv2.IMREAD_REDUCED_GRAYSCALE_4,
+        (DECODE_GRAY, 8): cv2.IMREAD_REDUCED_GRAYSCALE_8,
+    }
+
+    # Largest header line or JPEG without a Content-Length the stream reader buffers, in bytes
+    __read_limit = 1 << 23
+
+    def __init__(self, url, decode_mode=DECODE_COLOR, reduction=1, buffer_size=1, decode_threads=2, timeout=5.0,
+                 min_backoff=0.5, max_backoff=8.0, max_reconnects=None):
+        if (decode_mode, reduction) not in self.__decode_flags:
+            raise ValueError(f"Unknown decode mode {decode_mode} with reduction {reduction}")
+        self.__decode_flag = self.__decode_flags[(decode_mode, reduction)]
+
+        parts = urlsplit(url)
+        if parts.scheme != "http" or parts.hostname is None:
+            raise ValueError(f"Unknown MJPEG url {url}")
+        self.__host = parts.hostname
+        self.__port = parts.port or 80
+        self.__path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+
+        # Decoded frames waiting for read, the oldest is dropped when the tracker falls behind like POLICY_LATEST
+        self.__buffer_size = buffer_size
+        # Seconds without any data before the connection counts as lost
+        self.__timeout = timeout
+        # Delay before reconnecting doubles after every failed attempt, and goes back to min_backoff once a frame arrives
+        self.__min_backoff = min_backoff
+        self.__max_backoff = max_backoff
+        # Connection attempts in a row that may fail before the capture gives up, None keeps trying until release
+        self.__max_reconnects = max_reconnects
+
+        # Bounded ring buffer of (frame, timestamp)
+        self.__frames = deque()
+        self.__condition = threading.Condition()
+        self.__finished = False
+        self.__last_timestamp = None
+
+        # Newest JPEG that no decoder has taken yet, and the arrival number of the newest frame handed out
+        self.__pending_jpeg = None
+        self.__idle_decoders = decode_threads
+        self.__newest_sequence = -1
+
+        self.__received_count = 0
+        self.__skipped_count = 0
+        self.__decoded_count = 0
+        self.__dropped_count = 0
+        self.__reconnect_count = 0
+        self.__decode_time = 0.0
+
+        self.__loop = asyncio.new_event_loop()
+        self.__executor = ThreadPoolExecutor(max_workers=decode_threads, thread_name_prefix="mjpeg-decode")
+        self.__stop_event = None
+        self.__thread = threading.Thread(target=self.__runLoop, daemon=True)
+        self.__thread.start()
+
+    def __runLoop(self):
+        asyncio.set_event_loop(self.__loop)
+        try:
+            self.__loop.run_until_complete(self.__receiveLoop())
+        finally:
+            self.__loop.close()
+            with self.__condition:
+                self.__finished = True
+                self.__condition.notify_all()
+
+    async def __receiveLoop(self):
+        self.__stop_event = asyncio.Event()
+        backoff = self.__min_backoff
+        failures = 0
+        while not self.__stop_event.is_set():
+            received_before = self.__received_count
+            try:
+                await self.__receiveStream()
+            except (OSError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError, ValueError):
+                pass
+
+            if self.__stop_event.is_set():
+                break
+            if self.__received_count > received_before:
+                backoff = self.__min_backoff
+                failures = 0
+            failures += 1
+            if self.__max_reconnects is not None and failures > self.__max_reconnects:
+                break
+
+            self.__reconnect_count += 1
+            try:
+                await asyncio.wait_for(self.__stop_event.wait(), backoff)
+            except asyncio.TimeoutError:
+                pass
+            backoff = min(backoff * 2, self.__max_backoff)
+
+    async def __receiveStream(self):
+        # The default 64 KiB limit on a read is smaller than a single high quality frame
+        connection = asyncio.open_connection(self.__host, self.__port, limit=self.__read_limit)
+        reader, writer = await asyncio.wait_for(connection, self.__timeout)
+        # Closing the connection is how release interrupts a read that is waiting on the network
+        stop_task = asyncio.ensure_future(self.__stop_event.wait())
+        stop_task.add_done_callback(lambda _: writer.close())
+        try:
+            request = f"GET {self.__path} HTTP/1.1\r\nHost: {self.__host}:{self.__port}\r\nConnection: close\r\n\r\n"
+            writer.write(request.encode("ascii"))
+            await writer.drain()
+
+            status, headers = await self.__readHeaders(reader)
+            if status.split(b" ")[1:2] != [b"200"]:
+                raise ValueError(f"Unknown MJPEG response {status!r}")
+            boundary = self.__findBoundary(headers.get(b"content-type", b""))
+
+            while not self.__stop_event.is_set():
+                jpeg = await self.__readPart(reader, boundary)
+                self.__received_count += 1
+                self.__queueJpeg(jpeg, time.monotonic())
+        finally:
+            stop_task.cancel()
+            writer.close()
+
+    async def __readHeaders(self, reader):
+        # Returns the first line and a dict of lowercase header names to values, up to the blank line
+        first_line = b""
+        while first_line == b"":
+            first_line = (await self.__readLine(reader)).strip()
+        headers = {}
+        while True:
+            line = (await self.__readLine(reader)).strip()
+            if line == b"":
+                return first_line, headers
+            name, _, value = line.partition(b":")
+            headers[name.strip().lower()] = value.strip()
+
+    async def __readLine(self, reader):
+        line = await asyncio.wait_for(reader.readline(), self.__timeout)
+        if line == b"":
+            raise asyncio.IncompleteReadError(line, None)
+        return line
+
+    @staticmethod
+    def __findBoundary(content_type):
+        # multipart/x-mixed-replace;boundary=... , some servers quote it or already start it with --
+        for parameter in content_type.split(b";")[1:]:
+            name, _, value = parameter.strip().partition(b"=")
+            if name.lower() == b"boundary":
+                value = value.strip(b"\"")
+                return value if value.startswith(b"--") else b"--" + value
+        raise ValueError(f"Unknown MJPEG content type {content_type!r}")
+
+    async def __readPart(self, reader, boundary):
+        # Skips to the next boundary line, then reads the part's headers and its JPEG
+        while (await self.__readLine(reader)).strip() != boundary:
+            pass
+        _, headers = await self.__readHeaders(reader)
+
+        length = headers.get(b"content-length")
+        if length is not None:
+            return await asyncio.wait_for(reader.readexactly(int(length)), self.__timeout)
+        # Without a length the JPEG runs up to its end of image marker
+        return await asyncio.wait_for(reader.readuntil(b"\xff\xd9"), self.__timeout)
+
+    def __queueJpeg(self, jpeg, timestamp):
+        # A newer JPEG replaces one still waiting for a decoder, that one would only be stale by the time it was decoded
+        if self.__pending_jpeg is not None:
+            self.__skipped_count += 1
+        self.__pending_jpeg = (jpeg, timestamp, self.__received_count)
+        self.__startDecodes()
+
+    def __startDecodes(self):
+        # Runs on the loop thread, decodes the pending JPEG as soon as a decoder is idle
+        # Holding it back until the tracker reads would save decodes, but the frame then waits for the tracker in the
+        # buffer while newer ones arrive, on the benchmark that more than tripled the lag
+        if self.__pending_jpeg is None or self.__idle_decoders == 0 or self.__stop_event.is_set():
+            return
+
+        jpeg, timestamp, sequence = self.__pending_jpeg
+        self.__pending_jpeg = None
+        self.__idle_decoders -= 1
+        future = self.__loop.run_in_executor(self.__executor, self.__decode, jpeg, timestamp, sequence)
+        future.add_done_callback(self.__decodeDone)
+
+    def __decodeDone(self, _):
+        self.__idle_decoders += 1
+        self.__startDecodes()
+
+    def __decode(self, jpeg, timestamp, sequence):
+        decode_start = time.perf_counter()
+        frame = cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), self.__decode_flag)
+        decode_time = time.perf_counter() - decode_start
+        if frame is None:
+            return
+
+        with self.__condition:
+            self.__decode_time = decode_time if self.__decoded_count == 0 else 0.9 * self.__decode_time + 0.1 * decode_time
+            self.__decoded_count += 1
+            # With several decoders a frame can finish after a newer one, it is never handed out after it
+            if sequence < self.__newest_sequence:
+                self.__dropped_count += 1
+                return
+            self.__newest_sequence = sequence
+
+            if self.__frames.__len__() >= self.__buffer_size:
+                self.__frames.popleft()
+                self.__dropped_count += 1
+            self.__frames.append((frame, timestamp))
+            self.__condition.notify_all()
+
+    def read(self):
+        # Blocks until a frame is available, returns (False, None) once the capture has given up or been released
+        with self.__condition:
+            while self.__frames.__len__() == 0 and not self.__finished:
+                self.__condition.wait()
+
+            if self.__frames.__len__() == 0:
+                return False, None
+
+            frame, self.__last_timestamp = self.__frames.popleft()
+            return True, frame
+
+    def isOpened(self):
+        with self.__condition:
+            return not self.__finished or self.__frames.__len__() > 0
+
+    def getLastTimestamp(self):
+        # time.monotonic() of when the last returned frame's JPEG finished arriving, before it was decoded
+        return self.__last_timestamp
+
+    def getBufferedCount(self):
+        with self.__condition:
+            return self.__frames.__len__()
+
+    def getReceivedCount(self):
+        return self.__received_count
+
+    def getSkippedCount(self):
+        # JPEGs replaced by a newer one before any decoder took them
+        return self.__skipped_count
+
+    def getDecodedCount(self):
+        return self.__decoded_count
+
+    def getDroppedCount(self):
+        # Decoded frames thrown away, pushed out of the buffer or overtaken by a newer frame
+        return self.__dropped_count
+
+    def getReconnectCount(self):
+        return self.__reconnect_count
+
+    def getDecodeTime(self):
+        # Smoothed seconds per JPEG decode
+        return self.__decode_time
+
+    def release(self):
+        if self.__thread.is_alive():
+            if self.__stop_event is None:
+                # The loop hasn't started yet, wait for it so there is an event to set
+                while self.__stop_event is None and self.__thread.is_alive():
+                    time.sleep(0.001)
+            if self.__stop_event is not None:
+                self.__loop.call_soon_threadsafe(self.__stop_event.set)
+            self.__thread.join()
+        self.__executor.shutdown(wait=True)
+        with self.__condition:
+            self.__finished = True
+            self.__condition.notify_all()
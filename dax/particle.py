@@ -1,18 +1,230 @@
 from copy import deepcopy
+import cv2 as cv
 import numpy as np
+from sparsedense.trackingstats import NullTrackingStats
+from sparsedense.framepreprocessor import FramePreprocessor
 
 class FollowParticle:
     currentPos = np.array([0, 0])
     targetPos  = np.array([0, 0])
     moveSpeed = 100
 
-    def __init__(targetPos: np.array):
-        self.targetPos = targetPos
+    def __init__(self, targetPos: np.array):
+        self.targetPos = np.asarray(targetPos, dtype=np.float64)
         self.currentPos = deepcopy(self.targetPos)
 
-    def update():
+    def update(self):
+        # Moves moveSpeed towards the target, or onto it when it is closer than that
         dir = (self.targetPos-self.currentPos)
-        print(dir)
-        normalizedDir = dir/np.linalg.norm(dir)
-        print(normalizedDir)
-        self.currentPos += normalizedDir*moveSpeed
\ No newline at end of file
+        distance = np.linalg.norm(dir)
+        if distance <= self.moveSpeed:
+            self.currentPos = deepcopy(self.targetPos)
+            return
+        normalizedDir = dir/distance
+        self.currentPos += normalizedDir*self.moveSpeed
+
+
+class ParticleTracker:
+    # Follows one target with a particle filter, every particle is a guess at the target's position and velocity
+    # Particles live in NumPy arrays and every step works on all of them at once, so thousands cost little more than one
+    # Particles are weighted by a cheap per-frame likelihood image sampled at their positions, there is no corner
+    # detection or optical flow at all
+    # Has the same run/getPosition/getDirection calls as the other trackers
+
+    # Likelihood is how much each pixel changed since the previous frame, anything moving attracts the particles
+    LIKELIHOOD_MOTION = "motion"
+    # Likelihood is the back projection of the target's hue histogram, learnt with init from a box around the target
+    LIKELIHOOD_BACKPROJECTION = "backprojection"
+
+    def __init__(self, likelihood=LIKELIHOOD_MOTION, particle_count=2000, preprocessor=None, stats=None):
+        if likelihood not in (self.LIKELIHOOD_MOTION, self.LIKELIHOOD_BACKPROJECTION):
+            raise ValueError(f"Unknown likelihood {likelihood}")
+        self.likelihood = likelihood
+        self.particle_count = particle_count
+
+        # The likelihood image is worked out on a quarter size image, particles are kept in its pixels
+        if preprocessor is None:
+            preprocessor = FramePreprocessor(FramePreprocessor.MODE_PYRAMID, blur_size=9, levels=2)
+        self.preprocessor = preprocessor
+
+        # Random walk added every frame, in processed image pixels and pixels per frame
+        self.position_noise = 2.0
+        self.velocity_noise = 1.0
+        # Weight every particle keeps even on a pixel with no likelihood at all, so one bad frame doesn't wipe them out
+        self.min_weight = 0.01
+        # Gray level change in the motion image below which a pixel isn't moving, and the change that counts as certain
+        self.motion_threshold = 10
+        self.motion_full_scale = 64
+        # Part of the particles thrown around the strongest pixel of every frame, so a lost target is found again
+        self.reseed_fraction = 0.05
+        # Mean likelihood under the particles, 0 to 1, needed for a position, below it there is no target
+        self.min_confidence = 0.05
+        # Frames the direction spans, the same as a sparse tracker's marker direction
+        self.direction_frames = 4
+
+        self.rng = np.random.default_rng()
+        # N x 2 positions and velocities, N weights that add up to 1
+        self.positions = None
+        self.velocities = None
+        self.weights = None
+
+        self.roi_hist = None
+        self.prev_gray_frame = None
+        self.likelihood_image = None
+        self.confidence = 0.0
+
+        self.tracked_position = ()
+        self.tracked_direction = ()
+
+        # Per stage timings and counters, pass a TrackingStats to record them
+        if stats is None:
+            stats = NullTrackingStats()
+        self.stats = stats
+
+    def init(self, video_frame, box):
+        # Learns the target's hue from box, x, y, width, height in input frame pixels, and puts the particles there
+        x, y, width, height = [int(value) for value in box]
+        hsv_roi = cv.cvtColor(video_frame[y:y + height, x:x + width], cv.COLOR_BGR2HSV)
+        self.roi_hist = cv.calcHist([hsv_roi], [0], None, [180], [0, 180])
+        cv.normalize(self.roi_hist, self.roi_hist, 0, 255, cv.NORM_MINMAX)
+
+        center = self.preprocessor.toProcessedPoints(np.array([x + width / 2, y + height / 2], dtype=np.float32))
+        spread = self.preprocessor.toProcessedPoints(np.array([width / 4, height / 4], dtype=np.float32))
+        self.positions = (center + self.rng.normal(size=(self.particle_count, 2)) * spread).astype(np.float32)
+        self.velocities = np.zeros((self.particle_count, 2), dtype=np.float32)
+        self.weights = np.full(self.particle_count, 1 / self.particle_count)
+
+    def run(self, video_frame):
+
+        if video_frame is None:
+            return
+
+        frame_start = self.stats.startTimer()
+        self.trackFrame(video_frame)
+        self.stats.stopTimer("frame", frame_start)
+        self.stats.endFrame()
+
+    def trackFrame(self, video_frame):
+        stats = self.stats
+
+        stage_start = stats.startTimer()
+        likelihood_image = self.calculateLikelihood(video_frame)
+        stats.stopTimer("likelihood", stage_start)
+        if likelihood_image is None:
+            return
+        self.likelihood_image = likelihood_image
+
+        # Particles start spread over the whole image, the first frames pull them onto the target
+        height, width = likelihood_image.shape[:2]
+        if self.positions is None:
+            self.positions = (self.rng.random((self.particle_count, 2)) * (width, height)).astype(np.float32)
+            self.velocities = np.zeros((self.particle_count, 2), dtype=np.float32)
+            self.weights = np.full(self.particle_count, 1 / self.particle_count)
+
+        stage_start = stats.startTimer()
+        self.predict(width, height)
+        likelihoods = self.sampleLikelihood(likelihood_image)
+        self.weights = self.weights * np.maximum(likelihoods, self.min_weight)
+        self.weights /= self.weights.sum()
+        self.confidence = float(likelihoods.mean())
+        self.calculatePositionAndDirection()
+
+        # Resampling only when most of the weight sits on a few particles keeps the cloud from collapsing too early
+        effective_count = 1 / np.square(self.weights).sum()
+        if effective_count < self.particle_count / 2:
+            self.resample()
+            stats.count("resamples")
+        self.reseed(likelihood_image)
+        stats.stopTimer("particles", stage_start)
+        stats.setGauge("confidence", self.confidence)
+
+    def calculateLikelihood(self, video_frame):
+        # Returns a float32 image of values from 0 to 1 at the preprocessor's size, None while there is nothing to go on
+        if self.likelihood == self.LIKELIHOOD_BACKPROJECTION:
+            if self.roi_hist is None:
+                return None
+            scale = self.preprocessor.getScale()
+            small_frame = cv.resize(video_frame, None, fx=1 / scale, fy=1 / scale, interpolation=cv.INTER_AREA)
+            hsv = cv.cvtColor(small_frame, cv.COLOR_BGR2HSV)
+            back_projection = cv.calcBackProject([hsv], [0], self.roi_hist, [0, 180], 1)
+            return back_projection.astype(np.float32) / 255
+
+        # Motion needs two frames to compare, the first one only becomes the previous frame
+        gray_frame = self.preprocessor.process(video_frame)
+        prev_gray_frame = self.prev_gray_frame
+        self.prev_gray_frame = gray_frame
+        if prev_gray_frame is None or prev_gray_frame.shape != gray_frame.shape:
+            return None
+
+        difference = cv.absdiff(gray_frame, prev_gray_frame)
+        _, difference = cv.threshold(difference, self.motion_threshold, 255, cv.THRESH_TOZERO)
+        # Spread the moving pixels out so particles near the target, not only exactly on it, get weight too
+        difference = cv.GaussianBlur(difference, (9, 9), 0)
+        return np.minimum(difference.astype(np.float32) * (1 / self.motion_full_scale), 1)
+
+    def predict(self, width, height):
+        # Constant velocity with a random walk on both position and velocity, kept inside the image
+        count = self.particle_count
+        self.velocities += self.rng.normal(scale=self.velocity_noise, size=(count, 2)).astype(np.float32)
+        self.positions += self.velocities + self.rng.normal(scale=self.position_noise, size=(count, 2)).astype(np.float32)
+        np.clip(self.positions[:, 0], 0, width - 1, out=self.positions[:, 0])
+        np.clip(self.positions[:, 1], 0, height - 1, out=self.positions[:, 1])
+
+    def sampleLikelihood(self, likelihood_image):
+        # Nearest pixel under every particle, one fancy index for all of them
+        columns = self.positions[:, 0].astype(np.int32)
+        rows = self.positions[:, 1].astype(np.int32)
+        return likelihood_image[rows, columns]
+
+    def resample(self):
+        # Systematic resampling, one random offset and evenly spaced picks along the cumulative weights
+        count = self.particle_count
+        picks = (self.rng.random() + np.arange(count)) / count
+        indexes = np.searchsorted(np.cumsum(self.weights), picks)
+        np.minimum(indexes, count - 1, out=indexes)
+        self.positions = self.positions[indexes]
+        self.velocities = self.velocities[indexes]
+        self.weights = np.full(count, 1 / count)
+
+    def reseed(self, likelihood_image):
+        # Replaces a few random particles with new ones around the strongest pixel, standing still
+        reseed_count = int(self.particle_count * self.reseed_fraction)
+        _, max_value, _, max_location = cv.minMaxLoc(likelihood_image)
+        if reseed_count == 0 or max_value <= 0:
+            return
+
+        indexes = self.rng.integers(0, self.particle_count, reseed_count)
+        spread = self.rng.normal(scale=self.position_noise * 2, size=(reseed_count, 2))
+        self.positions[indexes] = (np.array(max_location) + spread).astype(np.float32)
+        self.velocities[indexes] = 0
+        self.weights[indexes] = self.weights.mean()
+        self.weights /= self.weights.sum()
+
+    def calculatePositionAndDirection(self):
+        # Weighted mean of the particles, both in input frame pixels like the other trackers'
+        if self.confidence < self.min_confidence:
+            self.tracked_position = ()
+            self.tracked_direction = ()
+            return
+
+        position = self.preprocessor.toInputPoints(self.weights @ self.positions)
+        direction = self.preprocessor.toInputPoints(self.weights @ self.velocities) * self.direction_frames
+        self.tracked_position = (int(position[0]), int(position[1]))
+        self.tracked_direction = (int(direction[0]), int(direction[1]))
+
+    def getPosition(self):
+        return np.array(self.tracked_position)
+
+    def getDirection(self):
+        return np.array(self.tracked_direction)
+
+    def getConfidence(self):
+        # Mean likelihood under the particles on the last frame, 0 to 1
+        return self.confidence
+
+    def getParticles(self):
+        # N x 2 particle positions in input frame pixels and their weights
+        return self.preprocessor.toInputPoints(self.positions), self.weights
+
+    def release(self):
+        pass
@@ -0,0 +1,325 @@
+import asyncio
+import base64
+import hashlib
+import math
+import os
+import socket
+import struct
+import threading
+import time
+from collections import deque
+
+# One tracking result as a fixed size little endian record, 40 bytes:
+# sequence, capture timestamp in time.monotonic() seconds, position x and y, direction x and y, confidence, flags
+RECORD = struct.Struct("<QdfffffB3x")
+
+# Set in flags when the position is valid, without it the tracker had no lock and the position is meaningless
+FLAG_LOCK = 1
+# Set in flags when the position was extrapolated for a skipped frame instead of tracked
+FLAG_EXTRAPOLATED = 2
+
+
+def packRecord(sequence, timestamp, position, direction, confidence=None, extrapolated=False):
+    # Positions and directions of () or (0, 0) mean no lock, like the trackers return them
+    flags = 0
+    if position.__len__() == 2 and tuple(position) != (0, 0):
+        flags |= FLAG_LOCK
+    else:
+        position = (0, 0)
+    if direction.__len__() != 2:
+        direction = (0, 0)
+    if extrapolated:
+        flags |= FLAG_EXTRAPOLATED
+    # Not every tracker has a confidence, NaN tells the reader it doesn't know
+    confidence = math.nan if confidence is None else confidence
+    return RECORD.pack(sequence, timestamp, position[0], position[1], direction[0], direction[1], confidence, flags)
+
+
+def unpackRecord(data):
+    # Returns (sequence, timestamp, (x, y), (direction x, direction y), confidence, flags)
+    sequence, timestamp, x, y, direction_x, direction_y, confidence, flags = RECORD.unpack(data)
+    return sequence, timestamp, (x, y), (direction_x, direction_y), confidence, flags
+
+
+class DatagramTransport:
+    # Sends every record as one datagram, over UDP to any machine or over a Unix socket to a process on this one
+    # The socket is non-blocking, a record that doesn't fit in the socket buffer, or has nobody to go to, is dropped
+    # on the spot instead of waiting. Sending inline costs a couple of microseconds, handing records to a sending
+    # thread cost ten times that on a single core
+
+    def __init__(self, address):
+        # (host, port) for UDP, a path for a Unix socket, the same address the ResultSubscriber binds
+        family = socket.AF_UNIX if isinstance(address, str) else socket.AF_INET
+        self.__address = address
+        self.__socket = socket.socket(family, socket.SOCK_DGRAM)
+        self.__socket.setblocking(False)
+
+        self.__sent_count = 0
+        self.__dropped_count = 0
+        self.__send_latency = 0.0
+        self.__max_send_latency = 0.0
+
+    def send(self, data):
+        # Returns False when the record was dropped
+        send_start = time.perf_counter()
+        try:
+            self.__socket.sendto(data, self.__address)
+        except OSError:
+            # Full buffer, or for a Unix socket nobody bound to the path yet
+            self.__dropped_count += 1
+            return False
+        latency = time.perf_counter() - send_start
+        self.__send_latency = latency if self.__sent_count == 0 else 0.9 * self.__send_latency + 0.1 * latency
+        self.__max_send_latency = max(self.__max_send_latency, latency)
+        self.__sent_count += 1
+        return True
+
+    def getSentCount(self):
+        return self.__sent_count
+
+    def getDroppedCount(self):
+        return self.__dropped_count
+
+    def getSendLatency(self):
+        # Smoothed seconds from send being called to the record being in the socket
+        return self.__send_latency
+
+    def getMaxSendLatency(self):
+        return self.__max_send_latency
+
+    def close(self):
+        self.__socket.close()
+
+
+class WebSocketTransport:
+    # Serves the records to browsers as binary WebSocket messages, e.g. for a live dashboard
+    # Runs an asyncio server on its own thread, send only hands the record over to it. Every client has its own queue,
+    # with conflate a client that can't keep up only ever gets the newest record, older ones are replaced while it is
+    # still busy with the last one. Without it up to queue_size records wait and the oldest is dropped when it is full
+
+    __handshake_key = b"258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+    def __init__(self, host="0.0.0.0", port=8765, conflate=True, queue_size=64):
+        self.__host = host
+        self.__port = port
+        self.__queue_size = 1 if conflate else queue_size
+        # (queue of (record, time sent), event set when the queue has something) for every connected client
+        self.__clients = {}
+
+        self.__sent_count = 0
+        self.__dropped_count = 0
+        self.__send_latency = 0.0
+        self.__max_send_latency = 0.0
+
+        self.__loop = asyncio.new_event_loop()
+        self.__server = None
+        self.__start_error = None
+        self.__started = threading.Event()
+        self.__thread = threading.Thread(target=self.__runLoop, daemon=True)
+        self.__thread.start()
+        self.__started.wait()
+        # E.g. the port is already in use, the loop thread has ended and the error is raised here instead
+        if self.__start_error is not None:
+            self.__thread.join()
+            raise self.__start_error
+
+    def __runLoop(self):
+        asyncio.set_event_loop(self.__loop)
+        try:
+            self.__server = self.__loop.run_until_complete(asyncio.start_server(self.__serveClient, self.__host, self.__port))
+        except Exception as error:
+            self.__start_error = error
+            self.__loop.close()
+            return
+        finally:
+            self.__started.set()
+        self.__loop.run_forever()
+
+        # Stopped by close, hang up on every client and let their handlers see the connection end
+        self.__server.close()
+        for writer in list(self.__clients):
+            writer.close()
+        tasks = asyncio.all_tasks(self.__loop)
+        if tasks.__len__() > 0:
+            self.__loop.run_until_complete(asyncio.wait(tasks, timeout=1.0))
+        self.__loop.close()
+
+    async def __serveClient(self, reader, writer):
+        try:
+            if not await self.__handshake(reader, writer):
+                return
+
+            # Client messages are never needed, the connection closing is all that matters
+            records = deque()
+            ready = asyncio.Event()
+            self.__clients[writer] = (records, ready)
+            reading = asyncio.ensure_future(reader.read())
+            while not reading.done():
+                waiting = asyncio.ensure_future(ready.wait())
+                await asyncio.wait((reading, waiting), return_when=asyncio.FIRST_COMPLETED)
+                waiting.cancel()
+                ready.clear()
+                while records.__len__() > 0:
+                    data, sent = records.popleft()
+                    # Binary frame in a single fragment, records are always shorter than 126 bytes
+                    writer.write(bytes((0x82, data.__len__())) + data)
+                    await writer.drain()
+                    self.__countSent(time.monotonic() - sent)
+            reading.cancel()
+        except (OSError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.__clients.pop(writer, None)
+            writer.close()
+
+    async def __handshake(self, reader, writer):
+        # Answers the HTTP upgrade request, returns False for anything that isn't a WebSocket client
+        key = None
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.partition(b":")
+            if name.strip().lower() == b"sec-websocket-key":
+                key = value.strip()
+        if key is None:
+            writer.write(b"HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\n\r\n")
+            return False
+
+        accept = base64.b64encode(hashlib.sha1(key + self.__handshake_key).digest())
+        writer.write(b"HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                     b"Sec-WebSocket-Accept: " + accept + b"\r\n\r\n")
+        await writer.drain()
+        return True
+
+    def __queueRecord(self, data, sent):
+        for records, ready in self.__clients.values():
+            if records.__len__() >= self.__queue_size:
+                records.popleft()
+                self.__dropped_count += 1
+            records.append((data, sent))
+            ready.set()
+
+    def __countSent(self, latency):
+        self.__send_latency = latency if self.__sent_count == 0 else 0.9 * self.__send_latency + 0.1 * latency
+        self.__max_send_latency = max(self.__max_send_latency, latency)
+        self.__sent_count += 1
+
+    def send(self, data):
+        # Returns False once the server has been closed
+        try:
+            self.__loop.call_soon_threadsafe(self.__queueRecord, data, time.monotonic())
+        except RuntimeError:
+            return False
+        return True
+
+    def getPort(self):
+        # The port actually listened on, useful when port 0 picked a free one
+        return self.__server.sockets[0].getsockname()[1]
+
+    def getClientCount(self):
+        return self.__clients.__len__()
+
+    def getSentCount(self):
+        # Records written to a client, a record sent to two clients counts twice
+        return self.__sent_count
+
+    def getDroppedCount(self):
+        # Records replaced or pushed out of a client's queue before they were written
+        return self.__dropped_count
+
+    def getSendLatency(self):
+        # Smoothed seconds from send being called to the record being written to a client
+        return self.__send_latency
+
+    def getMaxSendLatency(self):
+        return self.__max_send_latency
+
+    def close(self):
+        if self.__thread.is_alive():
+            self.__loop.call_soon_threadsafe(self.__loop.stop)
+            self.__thread.join()
+
+
+class ResultPublisher:
+    # Publishes every frame's tracking result as a packed binary record, instead of printing it
+    # Other processes, like the servo controller or a dashboard, read the records while the tracker runs
+    # Neither transport ever waits on a consumer, so publish never holds up the tracking loop
+
+    def __init__(self, transport):
+        # A DatagramTransport or WebSocketTransport
+        self.__transport = transport
+        self.__sequence = 0
+
+    def publish(self, position, direction, timestamp=None, confidence=None, extrapolated=False):
+        # timestamp is the frame's capture time, e.g. ThreadedCapture.getLastTimestamp(), now when not given
+        # Returns False when the transport dropped the record
+        if timestamp is None:
+            timestamp = time.monotonic()
+        self.__sequence += 1
+        return self.__transport.send(packRecord(self.__sequence, timestamp, position, direction, confidence, extrapolated))
+
+    def getPublishedCount(self):
+        return self.__sequence
+
+    def getSentCount(self):
+        return self.__transport.getSentCount()
+
+    def getDroppedCount(self):
+        return self.__transport.getDroppedCount()
+
+    def getSendLatency(self):
+        return self.__transport.getSendLatency()
+
+    def getMaxSendLatency(self):
+        return self.__transport.getMaxSendLatency()
+
+    def close(self):
+        self.__transport.close()
+
+
+class ResultSubscriber:
+    # Receives the records of a DatagramTransport, e.g. in the servo process
+
+    def __init__(self, address):
+        # (host, port) for UDP, a path for a Unix socket
+        if isinstance(address, str):
+            if os.path.exists(address):
+                os.unlink(address)
+            self.__socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        else:
+            self.__socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.__socket.bind(address)
+        self.__address = self.__socket.getsockname()
+
+    def getAddress(self):
+        # The address actually bound, useful when port 0 picked a free one
+        return self.__address
+
+    def receive(self, timeout=None):
+        # Returns the next record like unpackRecord does, None when nothing arrived within timeout seconds
+        self.__socket.settimeout(timeout)
+        try:
+            data = self.__socket.recv(RECORD.size)
+        except socket.timeout:
+            return None
+        return unpackRecord(data)
+
+    def receiveLatest(self, timeout=None):
+        # Waits like receive, then reads everything else already waiting and returns only the newest record
+        latest = self.receive(timeout)
+        if latest is None:
+            return None
+        self.__socket.setblocking(False)
+        while True:
+            try:
+                data = self.__socket.recv(RECORD.size)
+            except BlockingIOError:
+                break
+            latest = unpackRecord(data)
+        return latest
+
+    def close(self):
+        self.__socket.close()
+        if isinstance(self.__address, str) and os.path.exists(self.__address):
+            os.unlink(self.__address)
@@ -1,9 +1,11 @@
-from gpiozero import LED, DistanceSensor, AngularServo, Servo
-from time import sleep
-from math import sin
+from gpiozero import LED, DistanceSensor, AngularServo
+from time import sleep, monotonic
+from sparsedense.sparse_flow_vHappyDax import SparseHappyDax
+from threadedcapture import ThreadedCapture
+from servocontroller import LatestValue, AngleTable, ServoController
 #sensor = DistanceSensor(17, 27)
 servoInner = AngularServo(12, min_angle=-90, max_angle=90)
-servoOuter = Servo(13)
+servoOuter = AngularServo(13, min_angle=-90, max_angle=90)
 
 # turnTheeseOn = (LED(26), LED(16))
 # for turnOn in turnTheeseOn:
@@ -12,17 +14,47 @@ servoOuter = Servo(13)
 #     print(turnOn)
 
 servoInner.angle = 0
-servoOuter.value = -0.1
+servoOuter.angle = -9
 
-ree = 0.1
-while True:
-    ree += 0.01
-    servoInner.angle = sin(ree)*45
-    sleep(0.01)
+# Track on the main thread, the servos follow the newest position on their own thread at the PWM rate
+video_cap = ThreadedCapture(0, ThreadedCapture.POLICY_LATEST)
+ret, first_frame = video_cap.read()
+if ret is not False:
+    frame_height, frame_width = first_frame.shape[:2]
+    positions = LatestValue()
+    # Inner servo pans, outer servo tilts, the outer one rests at -9 degrees when pointing at the middle of the frame
+    angle_table = AngleTable.fromFieldOfView((frame_width, frame_height), tilt_offset=-9, invert_tilt=True)
+    servos = ServoController(servoInner, servoOuter, positions, angle_table)
+    servos.start()
 
+    sparse = SparseHappyDax()
+    # Printing every frame slows the tracking loop down and floods the terminal, the status goes out once a second
+    next_status = monotonic()
+    while video_cap.isOpened():
+        ret, new_frame = video_cap.read()
+
+        if ret is False or new_frame is None:
+            break
+
+        sparse.run(new_frame)
+        position = tuple(sparse.getPosition())
+        # (0, 0) means no moving markers, the servos hold still instead of aiming at the corner
+        if position.__len__() != 2 or position == (0, 0):
+            position = ()
+        positions.put(position, video_cap.getLastTimestamp())
+
+        if monotonic() >= next_status:
+            next_status = monotonic() + 1
+            age = servos.getPositionAge()
+            print(f"{position} -> {servos.getAngles()}, {servos.getCommandRate()} commands/s, "
+                  f"{servos.getSkippedCount()} ticks skipped, acting on {age * 1000 if age is not None else 0:.0f} ms old positions")
+
+    servos.stop()
+    sparse.release()
+video_cap.release()
 
 sleep(1)
 
 # while True:
 #     print('Distance thingy: ', sensor.distance, 'm')
-#     sleep(1)
\ No newline at end of file
+#     sleep(1)
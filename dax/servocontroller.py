@@ -0,0 +1,196 @@
+import threading
+import time
+from collections import deque
+import numpy as np
+
+class LatestValue:
+    # Single slot mailbox between threads, every put replaces what was there so the reader only ever sees the newest
+    # value and never works through a backlog
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__value = None
+        self.__timestamp = None
+        self.__sequence = 0
+
+    def put(self, value, timestamp=None):
+        # timestamp is when the value was true, e.g. the capture time of the frame a position was tracked on
+        if timestamp is None:
+            timestamp = time.monotonic()
+        with self.__lock:
+            self.__value = value
+            self.__timestamp = timestamp
+            self.__sequence += 1
+
+    def get(self):
+        # Returns (value, timestamp, sequence), the sequence goes up by one with every put, (None, None, 0) before the first
+        with self.__lock:
+            return self.__value, self.__timestamp, self.__sequence
+
+
+class AngleTable:
+    # Precomputed pan and tilt angles for every cell_size x cell_size block of the camera frame
+    # Looking an angle up is an index into the table, nothing is worked out while the servos are being driven
+
+    def __init__(self, table, cell_size=4):
+        # table is rows x columns x 2 of (pan, tilt) degrees, row r column c belongs to pixel (c * cell_size, r * cell_size)
+        self.__table = np.asarray(table, dtype=np.float32)
+        self.__cell_size = cell_size
+        self.__rows, self.__columns = self.__table.shape[:2]
+
+    @staticmethod
+    def fromFieldOfView(frame_size, horizontal_fov=62.2, vertical_fov=48.8, pan_offset=0.0, tilt_offset=0.0,
+                        invert_pan=False, invert_tilt=False, cell_size=4):
+        # Angles of a pinhole camera looking along the servos' zero position, fields of view in degrees
+        # The defaults are the Raspberry Pi camera module v2's, the offsets are the servo angles that point at the center
+        width, height = frame_size
+        focal_x = (width / 2) / np.tan(np.radians(horizontal_fov / 2))
+        focal_y = (height / 2) / np.tan(np.radians(vertical_fov / 2))
+
+        xs = np.arange(0, width + cell_size, cell_size, dtype=np.float64)
+        ys = np.arange(0, height + cell_size, cell_size, dtype=np.float64)
+        pan = np.degrees(np.arctan((xs - width / 2) / focal_x))
+        tilt = np.degrees(np.arctan((ys - height / 2) / focal_y))
+        if invert_pan:
+            pan = -pan
+        if invert_tilt:
+            tilt = -tilt
+
+        table = np.empty((ys.__len__(), xs.__len__(), 2), dtype=np.float32)
+        table[..., 0] = pan[np.newaxis, :] + pan_offset
+        table[..., 1] = tilt[:, np.newaxis] + tilt_offset
+        return AngleTable(table, cell_size)
+
+    @staticmethod
+    def load(file_path):
+        # Reads a table written by save, e.g. one measured by pointing the laser at known pixels
+        data = np.load(file_path)
+        return AngleTable(data["table"], int(data["cell_size"]))
+
+    def save(self, file_path):
+        np.savez(file_path, table=self.__table, cell_size=self.__cell_size)
+
+    def lookup(self, x, y):
+        # Returns (pan, tilt) in degrees for a pixel, pixels outside the frame get the angles of the nearest edge
+        column = min(max(int(x / self.__cell_size + 0.5), 0), self.__columns - 1)
+        row = min(max(int(y / self.__cell_size + 0.5), 0), self.__rows - 1)
+        pan, tilt = self.__table[row, column]
+        return float(pan), float(tilt)
+
+
+class ServoController:
+    # Drives a pan and a tilt servo towards the newest tracked position on its own thread
+    # The tracker only puts positions into a LatestValue, so a slow frame never holds the servos up and the servos never
+    # hold the tracker up. Commands go out at the servos' PWM rate at most, move no faster than max_speed, and are not
+    # sent at all when the angle would change by less than deadband
+
+    def __init__(self, pan_servo, tilt_servo, positions, angle_table, rate=None, max_speed=180.0, deadband=0.5,
+                 max_age=0.5):
+        # Servos are gpiozero AngularServo objects, or anything else with an angle property and min_angle/max_angle
+        self.__pan_servo = pan_servo
+        self.__tilt_servo = tilt_servo
+        # LatestValue holding (x, y) frame pixel positions, () or None when the tracker has no target
+        self.__positions = positions
+        self.__angle_table = angle_table
+
+        # A servo only takes a new position once per PWM frame, 50 Hz for hobby servos, sending faster is wasted
+        if rate is None:
+            rate = 1 / getattr(pan_servo, "frame_width", 0.02)
+        self.__interval = 1 / rate
+        # Degrees per second, the slew limit that keeps the laser from jerking across the room on a bad position
+        self.__max_step = max_speed * self.__interval
+        self.__deadband = deadband
+        # Positions older than this many seconds are not acted on, the servos hold where they are
+        self.__max_age = max_age
+
+        self.__pan_limits = (pan_servo.min_angle, pan_servo.max_angle)
+        self.__tilt_limits = (tilt_servo.min_angle, tilt_servo.max_angle)
+        self.__angles = None
+
+        # Send times over the last second for the command rate, and the age of the position behind the last command
+        self.__send_times = deque()
+        self.__sent_count = 0
+        self.__skipped_count = 0
+        self.__position_age = None
+
+        self.__stop_event = threading.Event()
+        self.__thread = None
+
+    def start(self):
+        self.__stop_event.clear()
+        self.__thread = threading.Thread(target=self.__controlLoop, daemon=True)
+        self.__thread.start()
+
+    def stop(self):
+        self.__stop_event.set()
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+
+    def __controlLoop(self):
+        # Ticks on a fixed schedule instead of sleeping a fixed time, so the time a step takes doesn't slow the rate
+        next_tick = time.monotonic()
+        while not self.__stop_event.is_set():
+            self.step(next_tick)
+            next_tick += self.__interval
+            delay = next_tick - time.monotonic()
+            if delay > 0:
+                self.__stop_event.wait(delay)
+            else:
+                # Fell behind, e.g. the thread wasn't scheduled for a while, start counting again from now
+                next_tick = time.monotonic()
+
+    def step(self, now=None):
+        # One control tick, the thread calls this at the command rate, call it directly to drive the servos by hand
+        if now is None:
+            now = time.monotonic()
+        position, timestamp, _ = self.__positions.get()
+        if position is None or position.__len__() != 2 or now - timestamp > self.__max_age:
+            return False
+
+        target_pan, target_tilt = self.__angle_table.lookup(position[0], position[1])
+        target = (self.__clip(target_pan, self.__pan_limits), self.__clip(target_tilt, self.__tilt_limits))
+        if self.__angles is None:
+            self.__angles = (self.__pan_servo.angle or 0.0, self.__tilt_servo.angle or 0.0)
+
+        # Slew limit, the rest of the way is covered on the next ticks
+        angles = tuple(current + self.__clip(goal - current, (-self.__max_step, self.__max_step))
+                       for current, goal in zip(self.__angles, target))
+        if max(abs(angles[0] - self.__angles[0]), abs(angles[1] - self.__angles[1])) < self.__deadband:
+            self.__skipped_count += 1
+            return False
+
+        self.__pan_servo.angle = angles[0]
+        self.__tilt_servo.angle = angles[1]
+        self.__angles = angles
+
+        self.__sent_count += 1
+        self.__position_age = now - timestamp
+        self.__send_times.append(now)
+        while self.__send_times[0] < now - 1:
+            self.__send_times.popleft()
+        return True
+
+    @staticmethod
+    def __clip(value, limits):
+        return min(max(value, limits[0]), limits[1])
+
+    def getAngles(self):
+        # (pan, tilt) last sent to the servos, None before the first command
+        return self.__angles
+
+    def getCommandRate(self):
+        # Commands sent over the last second
+        start = time.monotonic() - 1
+        return sum(1 for send_time in list(self.__send_times) if send_time >= start)
+
+    def getPositionAge(self):
+        # Seconds between the position being tracked and the last command acting on it
+        return self.__position_age
+
+    def getSentCount(self):
+        return self.__sent_count
+
+    def getSkippedCount(self):
+        # Ticks where the servos were already close enough to the target
+        return self.__skipped_count
@@ -0,0 +1,329 @@
+import multiprocessing
+import time
+from multiprocessing import shared_memory
+import numpy as np
+import cv2
+
+# Header layout, int64 values in front of the frame slots
+HEADER_WRITTEN = 0
+HEADER_CLOSED = 1
+HEADER_DROPPED = 2
+HEADER_FIELDS = 3
+
+
+def attachSharedMemory(name):
+    # Only the process that created the memory may clean it up, the attaching side must not track it
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python before 3.13 always tracks, child processes share the parent's resource tracker so it is only
+        # tracked once, and unregistering here would take it away from the parent
+        return shared_memory.SharedMemory(name=name)
+
+
+class SharedFrameRing:
+    # Fixed number of frame slots in shared memory, one process writes frames and another reads them in place
+    # Slots are handed back and forth with two semaphores, frames are never pickled or copied between processes
+    # Create it before starting the other process and pass it in as a Process argument
+
+    def __init__(self, slot_count=4, context=None):
+        if context is None:
+            context = multiprocessing.get_context()
+        self.__slot_count = slot_count
+
+        # Slots the writer may fill, and slots holding a frame the reader hasn't taken yet
+        self.__free_slots = context.Semaphore(slot_count)
+        self.__filled_slots = context.Semaphore(0)
+
+        # Set by allocate or attach, once the frame size is known
+        self.__memory = None
+        self.__owner = False
+        self.__frame_shape = None
+        self.__dtype = None
+        self.__header = None
+        self.__sequences = None
+        self.__timestamps = None
+        self.__slots = None
+
+        # Every frame has a sequence number, the writer and reader each keep track of their own next one
+        self.__write_index = 0
+        self.__read_index = 0
+        # Slot handed to the reader, it stays valid until the next read
+        self.__held_slot = False
+        # Frames the reader skipped to get to the newest one
+        self.__skipped_count = 0
+
+    def __getstate__(self):
+        # Only the semaphores and what is needed to attach travel to the other process
+        name = self.__memory.name if self.__memory is not None else None
+        return self.__slot_count, self.__free_slots, self.__filled_slots, name, self.__frame_shape, self.__dtype
+
+    def __setstate__(self, state):
+        slot_count, free_slots, filled_slots, name, frame_shape, dtype = state
+        self.__slot_count = slot_count
+        self.__free_slots = free_slots
+        self.__filled_slots = filled_slots
+        self.__memory = None
+        self.__owner = False
+        self.__write_index = 0
+        self.__read_index = 0
+        self.__held_slot = False
+        self.__skipped_count = 0
+        if name is not None:
+            self.attach(name, frame_shape, dtype)
+
+    def allocate(self, frame_shape, dtype=np.uint8):
+        # Creates the shared memory, the creating process is the one that frees it on release
+        frame_bytes = int(np.prod(frame_shape)) * np.dtype(dtype).itemsize
+        header_bytes = (HEADER_FIELDS + 2 * self.__slot_count) * 8
+        self.__memory = shared_memory.SharedMemory(create=True, size=header_bytes + self.__slot_count * frame_bytes)
+        self.__owner = True
+        self.__mapArrays(frame_shape, dtype)
+        self.__header[:] = 0
+        self.__sequences[:] = -1
+
+    def attach(self, name, frame_shape, dtype=np.uint8):
+        self.__memory = attachSharedMemory(name)
+        self.__mapArrays(frame_shape, dtype)
+
+    def __mapArrays(self, frame_shape, dtype):
+        self.__frame_shape = tuple(frame_shape)
+        self.__dtype = np.dtype(dtype)
+        slot_count = self.__slot_count
+        buffer = self.__memory.buf
+
+        self.__header = np.ndarray((HEADER_FIELDS,), dtype=np.int64, buffer=buffer)
+        self.__sequences = np.ndarray((slot_count,), dtype=np.int64, buffer=buffer, offset=HEADER_FIELDS * 8)
+        self.__timestamps = np.ndarray((slot_count,), dtype=np.float64, buffer=buffer, offset=(HEADER_FIELDS + slot_count) * 8)
+        self.__slots = np.ndarray((slot_count,) + self.__frame_shape, dtype=self.__dtype, buffer=buffer,
+                                  offset=(HEADER_FIELDS + 2 * slot_count) * 8)
+
+    def getName(self):
+        return self.__memory.name
+
+    def getFrameShape(self):
+        return self.__frame_shape
+
+    def getWrittenCount(self):
+        return int(self.__header[HEADER_WRITTEN])
+
+    def getDroppedCount(self):
+        # Frames the writer couldn't fit in because the reader held every slot
+        return int(self.__header[HEADER_DROPPED])
+
+    def getSkippedCount(self):
+        return self.__skipped_count
+
+    def getBufferedCount(self):
+        # Frames written that the reader hasn't got to yet, not counting the one it holds
+        if self.__header is None:
+            return 0
+        return int(self.__header[HEADER_WRITTEN]) - self.__read_index - (1 if self.__held_slot else 0)
+
+    # Writer side
+
+    def acquireSlot(self, block=True):
+        # Returns the next free slot to fill in place, or None if block is False and the reader holds every slot
+        if not self.__free_slots.acquire(block):
+            return None
+        return self.__slots[self.__write_index % self.__slot_count]
+
+    def countDropped(self):
+        # A frame was ready but acquireSlot had no slot for it
+        self.__header[HEADER_DROPPED] += 1
+
+    def commitSlot(self, timestamp=None):
+        # Hands the slot from acquireSlot over to the reader
+        slot = self.__write_index % self.__slot_count
+        self.__timestamps[slot] = time.monotonic() if timestamp is None else timestamp
+        self.__sequences[slot] = self.__write_index
+        self.__write_index += 1
+        self.__header[HEADER_WRITTEN] = self.__write_index
+        self.__filled_slots.release()
+
+    def write(self, frame, timestamp=None, block=True):
+        # Copies a frame into the next slot, returns False if it had to be dropped
+        slot = self.acquireSlot(block)
+        if slot is None:
+            self.countDropped()
+            return False
+        np.copyto(slot, frame)
+        self.commitSlot(timestamp)
+        return True
+
+    def close(self):
+        # No more frames will be written, the reader gets (False, None) once it has read the ones already written
+        self.__header[HEADER_CLOSED] = 1
+        self.__filled_slots.release()
+
+    # Reader side
+
+    def read(self, timeout=None, latest=False):
+        # Returns (True, frame) where frame is a view into shared memory, valid until the next read or release
+        # With latest, frames written since the last read are skipped and only the newest one is returned
+        # Returns (False, None) once the writer closed the ring and every frame was read, or on timeout
+        self.__freeHeldSlot()
+
+        if not self.__filled_slots.acquire(True, timeout):
+            return False, None
+        if self.__read_index >= self.__header[HEADER_WRITTEN]:
+            # Woken up by close, leave the wake up in place for any later read
+            self.__filled_slots.release()
+            return False, None
+
+        if latest:
+            while self.__read_index + 1 < self.__header[HEADER_WRITTEN] and self.__filled_slots.acquire(False):
+                self.__read_index += 1
+                self.__skipped_count += 1
+                self.__free_slots.release()
+
+        slot = self.__read_index % self.__slot_count
+        if self.__sequences[slot] != self.__read_index:
+            raise RuntimeError(f"Frame ring slot {slot} holds frame {self.__sequences[slot]}, expected {self.__read_index}")
+        self.__held_slot = True
+        return True, self.__slots[slot]
+
+    def getTimestamp(self):
+        # time.monotonic() of when the frame returned by the last read was written
+        return float(self.__timestamps[self.__read_index % self.__slot_count]) if self.__held_slot else None
+
+    def __freeHeldSlot(self):
+        if self.__held_slot:
+            self.__held_slot = False
+            self.__read_index += 1
+            self.__free_slots.release()
+
+    def release(self):
+        # Views returned by read must not be used after this
+        self.__held_slot = False
+        self.__header = self.__sequences = self.__timestamps = self.__slots = None
+        if self.__memory is not None:
+            try:
+                self.__memory.close()
+            except BufferError:
+                # Someone still holds a frame view, the mapping goes away once that view does
+                pass
+            if self.__owner:
+                self.__memory.unlink()
+            self.__memory = None
+
+
+def captureFrames(source, ring, connection, drop_frames, stop_event):
+    # Runs in the capture process, decodes straight into the ring's slots so every frame is written exactly once
+    video_cap = cv2.VideoCapture(source)
+    ret, first_frame = video_cap.read()
+    if ret is False or first_frame is None:
+        connection.send(None)
+        video_cap.release()
+        return
+
+    properties = {prop_id: video_cap.get(prop_id) for prop_id in (cv2.CAP_PROP_FPS, cv2.CAP_PROP_FRAME_WIDTH,
+                                                                     cv2.CAP_PROP_FRAME_HEIGHT, cv2.CAP_PROP_FRAME_COUNT)}
+    connection.send((first_frame.shape, first_frame.dtype.str, properties))
+    ring.attach(connection.recv(), first_frame.shape, first_frame.dtype)
+    ring.write(first_frame)
+
+    # Frames that arrive while the reader holds every slot are decoded here and dropped, a camera has to be kept up with
+    scratch_frame = np.empty_like(first_frame)
+    try:
+        while not stop_event.is_set():
+            slot = ring.acquireSlot(not drop_frames)
+            ret, frame = video_cap.read(image=scratch_frame if slot is None else slot)
+            timestamp = time.monotonic()
+            if ret is False or frame is None:
+                break
+            if slot is None:
+                ring.countDropped()
+                continue
+            if frame is not slot:
+                # The decoder returned a different size, copy rather than hand over a half written slot
+                np.copyto(slot, frame)
+            ring.commitSlot(timestamp)
+    finally:
+        slot = frame = None
+        ring.close()
+        ring.release()
+        video_cap.release()
+
+
+class ProcessCapture:
+    # Decodes frames in a separate process and hands them over through a SharedFrameRing
+    # Has the same read/isOpened/release/get calls as ThreadedCapture, so FrameScheduler can read from it, but read
+    # returns views into shared memory that stay valid until the next read, so trackers can use them in place without a copy
+
+    POLICY_LATEST = "latest"
+    POLICY_LOSSLESS = "lossless"
+
+    def __init__(self, source, policy=POLICY_LATEST, slot_count=None, open_timeout=20.0):
+        if policy not in (self.POLICY_LATEST, self.POLICY_LOSSLESS):
+            raise ValueError(f"Unknown capture policy {policy}")
+        self.__policy = policy
+
+        # The reader holds one slot, latest only needs one more to always have the newest frame ready
+        if slot_count is None:
+            slot_count = 3 if policy == self.POLICY_LATEST else 8
+
+        context = multiprocessing.get_context("spawn")
+        self.__ring = SharedFrameRing(slot_count, context)
+        self.__stop_event = context.Event()
+        connection, child_connection = context.Pipe()
+        self.__process = context.Process(target=captureFrames, daemon=True,
+                                         args=(source, self.__ring, child_connection, policy == self.POLICY_LATEST, self.__stop_event))
+        self.__process.start()
+
+        # The frame size is only known once the capture process has decoded a frame
+        self.__properties = {}
+        self.__opened = False
+        if connection.poll(open_timeout):
+            opened = connection.recv()
+            if opened is not None:
+                frame_shape, dtype, self.__properties = opened
+                self.__ring.allocate(frame_shape, np.dtype(dtype))
+                connection.send(self.__ring.getName())
+                self.__opened = True
+        connection.close()
+
+        self.__finished = not self.__opened
+
+    def read(self):
+        # Blocks until a frame is available, returns (False, None) once the source has ended
+        if self.__finished:
+            return False, None
+        ret, frame = self.__ring.read(latest=self.__policy == self.POLICY_LATEST)
+        if ret is False:
+            self.__finished = True
+            return False, None
+        return True, frame
+
+    def isOpened(self):
+        return not self.__finished
+
+    def get(self, prop_id):
+        # Only the properties sent over when the capture opened are known here
+        return self.__properties.get(prop_id, 0.0)
+
+    def getLastTimestamp(self):
+        return self.__ring.getTimestamp() if self.__opened else None
+
+    def getBufferedCount(self):
+        return self.__ring.getBufferedCount() if self.__opened else 0
+
+    def getDecodedCount(self):
+        return self.__ring.getWrittenCount() + self.__ring.getDroppedCount() if self.__opened else 0
+
+    def getDroppedCount(self):
+        # Frames dropped by the capture process plus frames skipped to get to the newest one
+        return self.__ring.getDroppedCount() + self.__ring.getSkippedCount() if self.__opened else 0
+
+    def release(self):
+        self.__stop_event.set()
+        if self.__opened:
+            # Free every slot the reader held, so a capture process waiting for one can see the stop
+            while self.__ring.read(timeout=0)[0]:
+                pass
+        self.__process.join(2.0)
+        if self.__process.is_alive():
+            self.__process.kill()
+            self.__process.join()
+        self.__ring.release()
+        self.__finished = True
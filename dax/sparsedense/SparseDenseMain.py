@@ -2,6 +2,8 @@ from sparsedense.sparse_flow import SparseOpticalFlow
 from sparsedense.dense_flow import DenseOpticalFlow
 from sparsedense.sparse_flow_v2 import SparseOpticalFlowMod
 from sparsedense.sparse_flow_vHappyDax import SparseHappyDax
+from sparsedense.framepreprocessor import FramePreprocessor
+from threadedcapture import ThreadedCapture
 import cv2 as cv
 import os
 
@@ -19,19 +21,22 @@ def doSparse():
         sparse.Start(sparse)
 
 def doDense():
-    dense = DenseOpticalFlow
-    dense.Start(dense)
+    dense = DenseOpticalFlow()
+    dense.Start()
 
 
 if makeDaxHappy:
 
     video_name = "videoplayback.mp4"
     vidPath = os.path.abspath(os.path.join(os.path.dirname("BlobDetection"), '..', video_name))
-    video_cap = cv.VideoCapture(vidPath)
+    # Decode on a separate thread, every frame of a file should be tracked so nothing is dropped
+    # Each frame is done with once the next one is read, so they are decoded into a few reused images
+    video_cap = ThreadedCapture(vidPath, ThreadedCapture.POLICY_LOSSLESS, reuse_frames=True)
 
     ret, firstFrame = video_cap.read()
     if ret is not False:
-        sparse = SparseHappyDax()
+        # The preprocessed images are written into the same two buffers every frame instead of new arrays
+        sparse = SparseHappyDax(preprocessor=FramePreprocessor(arena=True))
 
         while video_cap.isOpened():
             ret, new_frame = video_cap.read()
@@ -1,47 +1,206 @@
 import cv2 as cv
 import numpy as np
 import os
+from collections import deque
+from sparsedense.trackingstats import NullTrackingStats
+from sparsedense.framepreprocessor import FramePreprocessor
 
 class DenseOpticalFlow():
+    # Computes dense optical flow one frame at a time and tracks the area that moves the most
+    # Has the same run/getPosition/getDirection calls as the sparse trackers, so it can be swapped in for them
+
+    # Polynomial expansion flow, the method this class always used
+    BACKEND_FARNEBACK = "farneback"
+    # Dense inverse search, a lot faster than Farneback, its presets trade speed for accuracy
+    BACKEND_DIS = "dis"
+
+    DIS_PRESETS = {
+        "ultrafast": cv.DISOPTICAL_FLOW_PRESET_ULTRAFAST,
+        "fast": cv.DISOPTICAL_FLOW_PRESET_FAST,
+        "medium": cv.DISOPTICAL_FLOW_PRESET_MEDIUM,
+    }
+
+    def __init__(self, backend=BACKEND_FARNEBACK, preset="fast", preprocessor=None, warm_start=True, visualize=False, stats=None):
+        if backend not in (self.BACKEND_FARNEBACK, self.BACKEND_DIS):
+            raise ValueError(f"Unknown dense flow backend {backend}")
+        self.backend = backend
+
+        # Parameters for Farneback optical flow, the ones this class always used
+        # pyr_scale=0.5, levels=3, winsize=15, iterations=3, poly_n=5, poly_sigma=1.2
+        self.farneback_params = dict(pyr_scale=0.5, levels=3, winsize=15, iterations=3, poly_n=5, poly_sigma=1.2)
+        self.dis = None
+        if backend == self.BACKEND_DIS:
+            if preset not in self.DIS_PRESETS:
+                raise ValueError(f"Unknown DIS preset {preset}")
+            self.dis = cv.DISOpticalFlow_create(self.DIS_PRESETS[preset])
+
+        # Flow is computed on the gray image from the preprocessor, by default halved in size which quarters the work
+        # Dense flow does its own smoothing, so the default preprocessor doesn't blur
+        if preprocessor is None:
+            preprocessor = FramePreprocessor(FramePreprocessor.MODE_PYRAMID, blur_size=1, levels=1)
+        self.preprocessor = preprocessor
+
+        # Start every Farneback frame's flow from the previous frame's, motion rarely changes much between two frames
+        # DIS always starts from scratch, its calc only writes the flow argument and never reads it
+        self.warm_start = warm_start
+
+        # Pixels moving more than this many input frame pixels per frame count as moving
+        self.motion_threshold = 1.0
+        # Fewest moving pixels, as a fraction of the image, needed for a position, below that it is just noise
+        self.min_moving_fraction = 0.001
+        # Frames the direction is summed over, the same span a sparse tracker's marker direction covers
+        self.direction_frames = 4
+
+        # Only build the HSV image of the flow when someone is going to look at it
+        self.visualize = visualize
+        self.visualization = None
+        self.hsv_mask = None
+
+        self.prev_gray_frame = None
+        self.flow = None
+        self.moving_fraction = 0.0
+        self.recent_flow = deque(maxlen=self.direction_frames)
+
+        self.tracked_position = ()
+        self.tracked_direction = ()
+
+        # Per stage timings and counters, pass a TrackingStats to record them
+        if stats is None:
+            stats = NullTrackingStats()
+        self.stats = stats
+
+    @staticmethod
+    def drawFlow(flow, mask):
+        # Computes the magnitude and angle of the 2D vectors
+        magnitude, angle = cv.cartToPolar(flow[..., 0], flow[..., 1])
+        # Sets image hue according to the optical flow direction
+        mask[..., 0] = angle * 180 / np.pi / 2
+        # Sets image value according to the optical flow magnitude (normalized)
+        mask[..., 2] = cv.normalize(magnitude, None, 0, 255, cv.NORM_MINMAX)
+        # Converts HSV to RGB (BGR) color representation
+        return cv.cvtColor(mask, cv.COLOR_HSV2BGR)
+
+    def run(self, video_frame):
+
+        if video_frame is None:
+            return
+
+        frame_start = self.stats.startTimer()
+        self.trackFrame(video_frame)
+        self.stats.stopTimer("frame", frame_start)
+        self.stats.endFrame()
+
+    def trackFrame(self, video_frame):
+        stats = self.stats
+
+        stage_start = stats.startTimer()
+        gray_frame = self.preprocessor.process(video_frame)
+        stats.stopTimer("preprocess", stage_start)
+
+        # Optical flow requires 2 frames to compare, the first frame only becomes the previous one
+        if self.prev_gray_frame is None or self.prev_gray_frame.shape != gray_frame.shape:
+            self.prev_gray_frame = gray_frame
+            self.flow = None
+            return
+
+        stage_start = stats.startTimer()
+        self.flow = self.calculateStreamingFlow(self.prev_gray_frame, gray_frame)
+        stats.stopTimer("dense_flow", stage_start)
+
+        stage_start = stats.startTimer()
+        self.calculatePositionAndDirection()
+        stats.stopTimer("position", stage_start)
+        stats.setGauge("moving_fraction", self.moving_fraction)
+
+        if self.visualize:
+            stage_start = stats.startTimer()
+            if self.hsv_mask is None or self.hsv_mask.shape[:2] != self.flow.shape[:2]:
+                # Saturation stays at maximum, only hue and value change per frame
+                self.hsv_mask = np.zeros(self.flow.shape[:2] + (3,), dtype=np.uint8)
+                self.hsv_mask[..., 1] = 255
+            self.visualization = DenseOpticalFlow.drawFlow(self.flow, self.hsv_mask)
+            stats.stopTimer("render", stage_start)
+
+        # Updates previous frame, every frame gets a new image from the preprocessor so there is nothing to copy
+        self.prev_gray_frame = gray_frame
+
+    def calculateStreamingFlow(self, prev_gray, gray):
+        if self.backend == self.BACKEND_DIS:
+            return self.dis.calc(prev_gray, gray, None)
+
+        # The previous flow is only a starting guess, Farneback refines it into this frame's flow in place
+        # Calculates dense optical flow by Farneback method
+        # https://docs.opencv.org/3.0-beta/modules/video/doc/motion_analysis_and_object_tracking.html#calcopticalflowfarneback
+        initial_flow = self.flow if self.warm_start else None
+        flags = 0 if initial_flow is None else cv.OPTFLOW_USE_INITIAL_FLOW
+        return cv.calcOpticalFlowFarneback(prev_gray, gray, initial_flow, flags=flags, **self.farneback_params)
+
+    def calculatePositionAndDirection(self):
+        # Position is the center of the moving pixels weighted by how fast they move, direction is their mean flow
+        # Both are in input frame pixels like the sparse trackers', the flow itself stays in processed image pixels
+        scale = self.preprocessor.getScale()
+        magnitude = cv.magnitude(self.flow[..., 0], self.flow[..., 1])
+        moving = magnitude * scale > self.motion_threshold
+        moving_count = int(np.count_nonzero(moving))
+        self.moving_fraction = moving_count / moving.size
+
+        if moving_count == 0 or self.moving_fraction < self.min_moving_fraction:
+            self.recent_flow.clear()
+            self.tracked_position = (0, 0)
+            self.tracked_direction = (0, 0)
+            return
+
+        ys, xs = np.nonzero(moving)
+        weights = magnitude[ys, xs]
+        center_x = np.average(xs, weights=weights)
+        center_y = np.average(ys, weights=weights)
+        self.tracked_position = (int(center_x * scale), int(center_y * scale))
+
+        mean_flow = self.flow[ys, xs].mean(axis=0, dtype=np.float64) * scale
+        self.recent_flow.append(mean_flow)
+        direction = np.sum(self.recent_flow, axis=0)
+        self.tracked_direction = (int(direction[0]), int(direction[1]))
+
+    def getPosition(self):
+        return np.array(self.tracked_position)
+
+    def getDirection(self):
+        return np.array(self.tracked_direction)
+
+    def getFlow(self):
+        # Flow of the last frame in processed image pixels, None before the second frame
+        return self.flow
+
+    def getVisualization(self):
+        # HSV coded flow of the last frame, only built when visualize is on
+        return self.visualization
+
+    def release(self):
+        if self.dis is not None:
+            self.dis.collectGarbage()
 
     def Start(self):
+        # Shows the flow of videoplayback.mp4 in a window, how this class was used before run existed
         # The video feed is read in as a VideoCapture object
         vidPath = os.path.abspath(os.path.join(os.path.dirname("BlobDetection"), '..', 'videoplayback.mp4'))
         cap = cv.VideoCapture(vidPath)
-        # ret = a boolean return value from getting the frame, first_frame = the first frame in the entire video sequence
-        ret, first_frame = cap.read()
-        # Converts frame to grayscale because we only need the luminance channel for detecting edges - less computationally expensive
-        prev_gray = cv.cvtColor(first_frame, cv.COLOR_BGR2GRAY)
-        # Creates an image filled with zero intensities with the same dimensions as the frame
-        mask = np.zeros_like(first_frame)
-        # Sets image saturation to maximum
-        mask[..., 1] = 255
+        self.visualize = True
 
         while(cap.isOpened()):
             # ret = a boolean return value from getting the frame, frame = the current frame being projected in the video
             ret, frame = cap.read()
+            if ret is False or frame is None:
+                break
             # Opens a new window and displays the input frame
             cv.imshow("input", frame)
-            # Converts each frame to grayscale - we previously only converted the first frame to grayscale
-            gray = cv.cvtColor(frame, cv.COLOR_BGR2GRAY)
-            # Calculates dense optical flow by Farneback method
-            # https://docs.opencv.org/3.0-beta/modules/video/doc/motion_analysis_and_object_tracking.html#calcopticalflowfarneback
-            flow = cv.calcOpticalFlowFarneback(prev_gray, gray, None, 0.5, 3, 15, 3, 5, 1.2, 0)
-            # Computes the magnitude and angle of the 2D vectors
-            magnitude, angle = cv.cartToPolar(flow[..., 0], flow[..., 1])
-            # Sets image hue according to the optical flow direction
-            mask[..., 0] = angle * 180 / np.pi / 2
-            # Sets image value according to the optical flow magnitude (normalized)
-            mask[..., 2] = cv.normalize(magnitude, None, 0, 255, cv.NORM_MINMAX)
-            # Converts HSV to RGB (BGR) color representation
-            rgb = cv.cvtColor(mask, cv.COLOR_HSV2BGR)
+            self.run(frame)
             # Opens a new window and displays the output frame
-            cv.imshow("dense optical flow", rgb)
-            # Updates previous frame
-            prev_gray = gray
+            if self.visualization is not None:
+                cv.imshow("dense optical flow", self.visualization)
             # Frames are read by intervals of 1 millisecond. The programs breaks out of the while loop when the user presses the 'q' key
             if cv.waitKey(1) & 0xFF == ord('q'):
                 break
         # The following frees up resources and closes all windows
+        self.release()
         cap.release()
         cv.destroyAllWindows()
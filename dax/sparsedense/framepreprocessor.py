@@ -0,0 +1,112 @@
+import cv2 as cv
+import numpy as np
+
+class FramePreprocessor:
+    # Turns a BGR video frame into the blurred gray image the trackers work on
+    # Frames that are already gray, e.g. from a reduced gray JPEG decode, skip the color conversion
+    # Pyramid mode also shrinks the image, getScale gives the factor that maps its coordinates back to the input frame
+
+    # Blur the color frame, then convert to gray, the way the trackers always did it
+    MODE_COLOR = "color"
+    # Convert to gray first so the blur only runs on one channel instead of three
+    MODE_GRAY = "gray"
+    # Convert to gray, halve the size with pyrDown for every level, then blur the small image with a smaller kernel
+    MODE_PYRAMID = "pyramid"
+
+    def __init__(self, mode=MODE_GRAY, blur_size=15, levels=1, arena=False):
+        if mode not in (self.MODE_COLOR, self.MODE_GRAY, self.MODE_PYRAMID):
+            raise ValueError(f"Unknown preprocessing mode {mode}")
+        self.__mode = mode
+
+        # Only pyramid mode works at reduced resolution
+        if mode != self.MODE_PYRAMID:
+            levels = 0
+        self.__levels = levels
+        self.__scale = 2 ** levels
+
+        # pyrDown already smooths the image, the rest of the blur is done with a kernel shrunk to match the smaller image
+        # Kernel sizes have to be odd, below 3 there is nothing left to blur
+        blur_size = blur_size // self.__scale
+        if blur_size % 2 == 0:
+            blur_size -= 1
+        self.__blur_size = blur_size if blur_size >= 3 else None
+
+        # Arena mode writes every image into buffers allocated once instead of a new array per call
+        # The tracker keeps the previous frame's image while the next one is made, so two sets are swapped between
+        # calls, an image from process stays valid until process has been called twice more
+        self.__arena = arena
+        self.__buffer_sets = ({}, {})
+        self.__buffer_index = 0
+
+    def getMode(self):
+        return self.__mode
+
+    def getScale(self):
+        # Input frame pixels per processed image pixel
+        return self.__scale
+
+    def process(self, video_frame):
+        # Never writes to video_frame, so it doesn't need to be copied first and can be a view into a bigger frame
+        if self.__arena:
+            return self.__processIntoBuffers(video_frame)
+
+        if self.__mode == self.MODE_COLOR and video_frame.ndim == 3:
+            return cv.cvtColor(self.__blur(video_frame), cv.COLOR_BGR2GRAY)
+
+        gray_frame = video_frame if video_frame.ndim == 2 else cv.cvtColor(video_frame, cv.COLOR_BGR2GRAY)
+        for _ in range(self.__levels):
+            gray_frame = cv.pyrDown(gray_frame)
+        return self.__blur(gray_frame)
+
+    def toInputPoints(self, points):
+        # Processed image coordinates to input frame coordinates
+        if self.__scale == 1:
+            return points
+        return points * self.__scale
+
+    def toProcessedPoints(self, points):
+        # Input frame coordinates to processed image coordinates
+        if self.__scale == 1:
+            return points
+        return points / self.__scale
+
+    def __blur(self, image):
+        if self.__blur_size is None:
+            return image
+        return cv.GaussianBlur(image, (self.__blur_size, self.__blur_size), 0)
+
+    def __processIntoBuffers(self, video_frame):
+        # Same steps as process, each one writing into its buffer with dst
+        buffers = self.__buffer_sets[self.__buffer_index]
+        self.__buffer_index = 1 - self.__buffer_index
+        height, width = video_frame.shape[:2]
+
+        if self.__mode == self.MODE_COLOR and video_frame.ndim == 3:
+            # Without a blur the frame is converted straight into the gray buffer
+            color_frame = video_frame
+            if self.__blur_size is not None:
+                color_frame = cv.GaussianBlur(video_frame, (self.__blur_size, self.__blur_size), 0,
+                                              dst=self.__getBuffer(buffers, "blurred_color", video_frame.shape))
+            return cv.cvtColor(color_frame, cv.COLOR_BGR2GRAY, dst=self.__getBuffer(buffers, "gray", (height, width)))
+
+        if video_frame.ndim == 2:
+            gray_frame = video_frame
+        else:
+            gray_frame = cv.cvtColor(video_frame, cv.COLOR_BGR2GRAY, dst=self.__getBuffer(buffers, "gray", (height, width)))
+        for level in range(self.__levels):
+            height, width = (height + 1) // 2, (width + 1) // 2
+            gray_frame = cv.pyrDown(gray_frame, dst=self.__getBuffer(buffers, f"level{level}", (height, width)))
+
+        if self.__blur_size is None:
+            return gray_frame
+        return cv.GaussianBlur(gray_frame, (self.__blur_size, self.__blur_size), 0,
+                               dst=self.__getBuffer(buffers, "blurred", (height, width)))
+
+    @staticmethod
+    def __getBuffer(buffers, name, shape):
+        # Only allocates when the image size changes, which with a tracking region happens when the region moves
+        buffer = buffers.get(name)
+        if buffer is None or buffer.shape != shape:
+            buffer = np.empty(shape, dtype=np.uint8)
+            buffers[name] = buffer
+        return buffer
@@ -0,0 +1,202 @@
+import numpy as np
+import cv2 as cv
+from sparsedense.trackingstats import NullTrackingStats
+
+class PredictiveTracker:
+    # Runs a tracker only every few frames and fills in the frames between with a Kalman filter on position and velocity
+    # Every frame gets a filtered position and its uncertainty, and the position can be predicted ahead by a latency so
+    # whatever acts on it can aim at where the target will be instead of where it was
+
+    # Standard deviation of a new lock's velocity in pixels per second, it starts out standing still
+    initial_velocity_noise = 500.0
+    # Pixels the target may move between tracker runs when the tracker has no optical flow window to go by
+    default_max_motion = 8
+
+    def __init__(self, tracker, cadence=2, max_motion=None, fps=30, measurement_noise=3.0, acceleration_noise=2000.0,
+                 max_coast=0.5, stats=None):
+        # Anything with run, getPosition and getDirection, positions of (0, 0) or () mean it has no lock
+        self.__tracker = tracker
+
+        # The tracker runs on every cadence-th frame at the latest
+        self.__cadence = cadence
+        # The tracker also runs early, as soon as the target is predicted to have moved more than max_motion pixels
+        # since the tracker last ran. Optical flow loses points that move too far between the frames it compares, so a
+        # fast target gets tracked every frame and a slow one only every cadence-th
+        # None uses half the tracker's optical flow search window, float("inf") keeps a fixed cadence
+        self.__max_motion = max_motion
+        # Time between frames when run is called without capture timestamps
+        self.__frame_interval = 1 / fps
+
+        # Standard deviations of the tracked position in pixels, and of the target's acceleration in pixels per second squared
+        self.__measurement_noise = measurement_noise
+        self.__acceleration_noise = acceleration_noise
+        # Seconds the filter keeps predicting without a measurement before the lock counts as lost
+        self.__max_coast = max_coast
+
+        # State is x, y, velocity x, velocity y, measurements are x, y
+        self.__kalman = cv.KalmanFilter(4, 2)
+        self.__kalman.measurementMatrix = np.eye(2, 4, dtype=np.float32)
+        self.__kalman.measurementNoiseCov = np.eye(2, dtype=np.float32) * measurement_noise ** 2
+        self.__has_lock = False
+
+        self.__timestamp = None
+        self.__measured_timestamp = None
+        self.__frames_since_run = 0
+        self.__run_timestamp = None
+        self.__ran_tracker = False
+
+        self.__tracked_count = 0
+        self.__predicted_count = 0
+
+        if stats is None:
+            stats = NullTrackingStats()
+        self.__stats = stats
+
+    def run(self, video_frame, timestamp=None):
+        # timestamp is the frame's capture time in seconds, e.g. ThreadedCapture.getLastTimestamp()
+
+        if video_frame is None:
+            return
+
+        if timestamp is None:
+            timestamp = 0.0 if self.__timestamp is None else self.__timestamp + self.__frame_interval
+        elapsed = 0.0 if self.__timestamp is None else timestamp - self.__timestamp
+        self.__timestamp = timestamp
+
+        if self.__has_lock:
+            self.__predict(elapsed)
+            if timestamp - self.__measured_timestamp > self.__max_coast:
+                self.__has_lock = False
+                self.__stats.count("lost_locks")
+
+        self.__frames_since_run += 1
+        self.__ran_tracker = self.__shouldRunTracker()
+        if not self.__ran_tracker:
+            self.__predicted_count += 1
+            self.__stats.count("predicted_frames")
+            self.__setGauges()
+            return
+
+        self.__frames_since_run = 0
+        self.__run_timestamp = timestamp
+        self.__tracked_count += 1
+        self.__tracker.run(video_frame)
+
+        position = tuple(self.__tracker.getPosition())
+        if position.__len__() == 2 and position != (0, 0):
+            self.__correct(position, timestamp)
+        self.__setGauges()
+
+    def __shouldRunTracker(self):
+        # Without a lock there is nothing to predict with, the tracker has to run until it finds the target again
+        if not self.__has_lock or self.__frames_since_run >= self.__cadence:
+            return True
+        velocity_x, velocity_y = self.getVelocity()
+        return np.hypot(velocity_x, velocity_y) * (self.__timestamp - self.__run_timestamp) > self.getMaxMotion()
+
+    def getMaxMotion(self):
+        # Pixels of the frames passed to run the target may move before the tracker runs early
+        if self.__max_motion is not None:
+            return self.__max_motion
+
+        # A ResolutionController shrinks the frames first, its window covers more of the frames passed to run
+        tracker = self.__tracker
+        scale = 1.0
+        if hasattr(tracker, "getTracker"):
+            scale = max(tracker.getScale())
+            tracker = tracker.getTracker()
+
+        # LK finds points that moved up to about half its window, further than that it locks onto other texture
+        lk_params = getattr(tracker, "lk_params", None)
+        if lk_params is None:
+            return self.default_max_motion
+        if hasattr(tracker, "preprocessor"):
+            scale *= tracker.preprocessor.getScale()
+        return min(lk_params["winSize"]) / 2 * scale
+
+    def __setTransition(self, elapsed):
+        # Constant velocity over elapsed seconds, with a random acceleration as the process noise
+        kalman = self.__kalman
+        transition = np.eye(4, dtype=np.float32)
+        transition[0, 2] = transition[1, 3] = elapsed
+        kalman.transitionMatrix = transition
+
+        quarter = elapsed ** 4 / 4
+        half = elapsed ** 3 / 2
+        square = elapsed ** 2
+        noise = np.array([[quarter, 0, half, 0],
+                          [0, quarter, 0, half],
+                          [half, 0, square, 0],
+                          [0, half, 0, square]], dtype=np.float32)
+        kalman.processNoiseCov = noise * self.__acceleration_noise ** 2
+
+    def __predict(self, elapsed):
+        # cv.KalmanFilter.predict also copies the prediction into statePost, so it stands until a measurement comes
+        self.__setTransition(elapsed)
+        self.__kalman.predict()
+
+    def __correct(self, position, timestamp):
+        measurement = np.array(position, dtype=np.float32).reshape(2, 1)
+        kalman = self.__kalman
+        if not self.__has_lock:
+            # A new lock starts at the measured position, standing still but with a wide velocity uncertainty
+            kalman.statePost = np.array([[measurement[0, 0]], [measurement[1, 0]], [0], [0]], dtype=np.float32)
+            kalman.errorCovPost = np.diag([self.__measurement_noise ** 2, self.__measurement_noise ** 2,
+                                           self.initial_velocity_noise ** 2, self.initial_velocity_noise ** 2]).astype(np.float32)
+            self.__has_lock = True
+        else:
+            kalman.correct(measurement)
+        self.__measured_timestamp = timestamp
+
+    def __setGauges(self):
+        if self.__has_lock:
+            self.__stats.setGauge("position_std", float(max(self.getUncertainty())))
+
+    def predictPosition(self, latency):
+        # Returns (position, standard deviation) latency seconds after the last frame, ((), ()) without a lock
+        if not self.__has_lock:
+            return (), ()
+
+        state = self.__kalman.statePost.reshape(-1).astype(np.float64)
+        covariance = self.__kalman.errorCovPost.astype(np.float64)
+        transition = np.eye(4)
+        transition[0, 2] = transition[1, 3] = latency
+        state = transition @ state
+        covariance = transition @ covariance @ transition.T
+        std = np.sqrt(np.diag(covariance)[:2])
+        return (int(state[0]), int(state[1])), (float(std[0]), float(std[1]))
+
+    def getPosition(self):
+        # Filtered position on the last frame, () without a lock
+        return self.predictPosition(0)[0]
+
+    def getUncertainty(self):
+        # Standard deviation of the position in pixels along x and y, () without a lock
+        return self.predictPosition(0)[1]
+
+    def getDirection(self):
+        # The tracker's own direction from the last frame it ran on
+        return self.__tracker.getDirection()
+
+    def getVelocity(self):
+        # Filtered velocity in pixels per second along x and y, () without a lock
+        if not self.__has_lock:
+            return ()
+        state = self.__kalman.statePost.reshape(-1)
+        return (float(state[2]), float(state[3]))
+
+    def hasLock(self):
+        return self.__has_lock
+
+    def ranTracker(self):
+        # True when the tracker ran on the last frame, False when its position is a prediction
+        return self.__ran_tracker
+
+    def getTrackedCount(self):
+        return self.__tracked_count
+
+    def getPredictedCount(self):
+        return self.__predicted_count
+
+    def getTracker(self):
+        return self.__tracker
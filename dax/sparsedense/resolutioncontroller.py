@@ -0,0 +1,127 @@
+import time
+from collections import deque
+import cv2 as cv
+import numpy as np
+from sparsedense.trackingstats import NullTrackingStats
+
+class ResolutionController:
+    # Runs a tracker on a shrunk copy of every frame and picks how far to shrink it from how long the tracker takes
+    # The width steps down when frames take longer than the budget and back up when the next width up would still fit
+    # comfortably, positions and directions are always given in the frame pixels that were passed to run
+
+    # Processing widths to choose from, narrowest first, 160 is what dax/main.py always used
+    default_widths = (160, 240, 320, 480, 640, 960, 1280)
+
+    def __init__(self, tracker, target_fps=15, widths=default_widths, width=160, window=15, headroom=0.7, stats=None):
+        # Anything with run, getPosition and getDirection, it has to cope with the frame size changing between frames
+        self.__tracker = tracker
+
+        # Milliseconds the tracker may spend on a frame
+        self.__budget_ms = 1000 / target_fps
+        self.__widths = tuple(sorted(widths))
+        self.__width_index = int(np.argmin(np.abs(np.array(self.__widths) - width)))
+
+        # Frames averaged before deciding, the window starts over after every change so the new width is measured alone
+        self.__frame_times_ms = deque(maxlen=window)
+        # Stepping up needs the next width's estimated time below this part of the budget, the gap between this and
+        # stepping down at the full budget keeps the width from flipping back and forth
+        self.__headroom = headroom
+
+        self.__frame_size = None
+        self.__processing_size = None
+        self.__processing_frame = None
+        # Input frame pixels per processing frame pixel, x and y
+        self.__scale = (1.0, 1.0)
+        self.__last_frame_ms = 0.0
+
+        if stats is None:
+            stats = NullTrackingStats()
+        self.__stats = stats
+
+    def run(self, video_frame):
+
+        if video_frame is None:
+            return
+
+        # The input frame can never be made bigger
+        height, width = video_frame.shape[:2]
+        if self.__frame_size != (width, height):
+            self.__frame_size = (width, height)
+            self.__frame_times_ms.clear()
+            while self.__width_index > 0 and self.__widths[self.__width_index] > width:
+                self.__width_index -= 1
+        self.__resize(video_frame)
+
+        start = time.perf_counter()
+        self.__tracker.run(self.__processing_frame)
+        self.__last_frame_ms = (time.perf_counter() - start) * 1000
+
+        self.__frame_times_ms.append(self.__last_frame_ms)
+        if self.__frame_times_ms.__len__() == self.__frame_times_ms.maxlen:
+            self.__adjustWidth()
+
+    def __resize(self, video_frame):
+        # Shrinks into the same image every frame, the tracker is done with the previous one by now
+        frame_width, frame_height = self.__frame_size
+        width = min(self.__widths[self.__width_index], frame_width)
+        height = max(int(round(frame_height * width / frame_width)), 1)
+
+        if width == frame_width:
+            self.__processing_size = self.__frame_size
+            self.__processing_frame = video_frame
+            self.__scale = (1.0, 1.0)
+            return
+
+        if self.__processing_size != (width, height) or self.__processing_frame is video_frame:
+            self.__processing_size = (width, height)
+            self.__processing_frame = np.empty((height, width) + video_frame.shape[2:], dtype=np.uint8)
+        self.__scale = (frame_width / width, frame_height / height)
+        cv.resize(video_frame, (width, height), dst=self.__processing_frame, interpolation=cv.INTER_AREA)
+
+    def __adjustWidth(self):
+        mean_ms = float(np.mean(self.__frame_times_ms))
+        self.__stats.setGauge("frame_ms", mean_ms)
+
+        width_index = self.__width_index
+        if mean_ms > self.__budget_ms and width_index > 0:
+            width_index -= 1
+        elif width_index + 1 < self.__widths.__len__() and self.__widths[width_index + 1] <= self.__frame_size[0]:
+            # Tracking time grows with the pixel count, so guess the next width's time from the area ratio
+            growth = (self.__widths[width_index + 1] / self.__widths[width_index]) ** 2
+            if mean_ms * growth < self.__budget_ms * self.__headroom:
+                width_index += 1
+
+        if width_index != self.__width_index:
+            self.__width_index = width_index
+            self.__frame_times_ms.clear()
+            self.__stats.count("scale_changes")
+        self.__stats.setGauge("processing_width", self.__widths[self.__width_index])
+
+    def __toFramePixels(self, values):
+        values = np.asarray(values)
+        if values.__len__() != 2:
+            return values
+        return np.rint(values * self.__scale).astype(int)
+
+    def getPosition(self):
+        return self.__toFramePixels(self.__tracker.getPosition())
+
+    def getDirection(self):
+        return self.__toFramePixels(self.__tracker.getDirection())
+
+    def getTracker(self):
+        return self.__tracker
+
+    def getProcessingSize(self):
+        # Width and height the tracker ran at on the last frame
+        return self.__processing_size
+
+    def getScale(self):
+        return self.__scale
+
+    def getFrameTime(self):
+        # Milliseconds the tracker took on the last frame
+        return self.__last_frame_ms
+
+    def getBudget(self):
+        return self.__budget_ms
@@ -68,8 +68,8 @@ class SparseOpticalFlow():
                 frame = cv.circle(frame, (a, b), 3, color, -1)
             # Overlays the optical flow tracks on the original frame
             output = cv.add(frame, mask)
-            # Updates previous frame
-            prev_gray = gray.copy()
+            # Updates previous frame, gray is a new image every frame so it can be kept as is
+            prev_gray = gray
             # Updates previous good feature points
             prev = good_new.reshape(-1, 1, 2)
             # Opens a new window and displays the output frame
@@ -1,10 +1,12 @@
 import cv2 as cv
 import numpy as np
-from sparsedense.trackingmarker import TrackingMarker
+from sparsedense.trackingmarkerstore import TrackingMarkerStore
+from sparsedense.trackingstats import NullTrackingStats
+from sparsedense.framepreprocessor import FramePreprocessor
 
 class SparseHappyDax():
 
-    def __init__(self):
+    def __init__(self, stats=None, preprocessor=None):
         print("using the modified sparse optical flow")
 
         # Parameters for Shi-Tomasi corner detection
@@ -26,15 +28,27 @@ class SparseHappyDax():
         self.no_movement_reset_time = 3
         # Number of active markers required to prevent reset
         self.moving_markers_lock = 2
+        # Points with a tracking error above this are treated as lost, None only uses the status from calcOpticalFlowPyrLK
+        self.max_tracking_error = None
 
-        self.blur_power = 15
+        # Turns frames into the blurred gray images that are tracked, its scale maps the points back to the input frame
+        if preprocessor is None:
+            preprocessor = FramePreprocessor()
+        self.preprocessor = preprocessor
+
+        # A smaller image needs a smaller search window to cover the same part of the input frame
+        scale = preprocessor.getScale()
+        if scale != 1:
+            win_width, win_height = self.lk_params["winSize"]
+            self.lk_params["winSize"] = (max(win_width // scale, 9), max(win_height // scale, 9))
 
         self.cur_frame = None
         self.cur_gray_frame = None
         self.good_new = None
 
-        self.tracking_markers = []
-        self.moving_markers = []
+        self.tracking_markers = TrackingMarkerStore()
+        # Number of moving markers on the last processed frame, lost markers are only removed on the next frame
+        self.moving_count = 0
 
         self.prev_points = None
         self.prev_gray_frame = None
@@ -44,90 +58,127 @@ class SparseHappyDax():
         self.tracked_position = ()
         self.tracked_direction = ()
 
-    def findTrackingPoints(self, video_frame_gray):
+        # Per stage timings and counters, pass a TrackingStats to record them
+        if stats is None:
+            stats = NullTrackingStats()
+        self.stats = stats
 
-        self.tracking_markers.clear()
+    def findTrackingPoints(self, video_frame_gray):
 
         # Finds the strongest corners in the first frame by Shi-Tomasi method - we will track the optical flow for these corners
         # https://docs.opencv.org/3.0-beta/modules/imgproc/doc/feature_detection.html#goodfeaturestotrack
+        stage_start = self.stats.startTimer()
         found_points = cv.goodFeaturesToTrack(video_frame_gray, mask=None, **self.feature_params)
+        self.stats.stopTimer("find_points", stage_start)
         # Creates an image filled with zero intensities with the same dimensions as the frame - for later drawing purposes
 
-        if found_points is not None:
-            # Recreate the list of markers using the newly found tracking points
-            for point in found_points:
-                new_marker = TrackingMarker()
-                new_marker.addPosition(point)
-                self.tracking_markers.append(new_marker)
+        # Recreate the markers using the newly found tracking points, markers are kept in input frame coordinates
+        if found_points is None:
+            self.tracking_markers.reset(found_points)
+        else:
+            self.tracking_markers.reset(self.preprocessor.toInputPoints(found_points))
 
         return found_points
 
+    def findTrackedPoints(self, status, error):
+        # Status is 1 for every point calcOpticalFlowPyrLK could follow, optionally also reject points with a large error
+        tracked = status.reshape(-1) == 1
+        if self.max_tracking_error is not None:
+            tracked &= error.reshape(-1) < self.max_tracking_error
+        return tracked
+
     def clearLostMarkers(self):
-        for x in range(self.prev_points.__len__()):
-            while self.tracking_markers[x].testSamePosition(self.prev_points[x]) == False:
-                self.tracking_markers.remove(self.tracking_markers[x])
-        # Above loop won't remove markers past the last index, do that here
-        while self.tracking_markers.__len__() > self.prev_points.__len__():
-            self.tracking_markers.remove(self.tracking_markers[-1])
+        # Markers flagged on the previous frame are dropped in one pass
+        self.tracking_markers.compact()
 
     def updateTrackingMarkers(self, cur_points):
-        # Add the new positions to our marker objects and test if they're moving
-        for x in range(cur_points.__len__()):
-            self.tracking_markers[x].addPosition(cur_points[x])
-            self.tracking_markers[x].testMovement()
-
-        # Reset list of moving markers and reassign
-        self.moving_markers.clear()
-        for marker in self.tracking_markers:
-            if marker.getIsMoving():
-                self.moving_markers.append(marker)
-
-    def optimizeFrame(self, video_frame):
-        video_frame = self.blurFrame(video_frame)
-        return video_frame
-
-    def blurFrame(self, video_frame):
-        return cv.GaussianBlur(video_frame, (self.blur_power, self.blur_power), 0)
+        # Add the new positions to our markers and test if they're moving
+        self.tracking_markers.addPositions(cur_points)
+        self.moving_count = self.tracking_markers.getMovingCount()
+
+    def rescaleTracking(self, gray_frame):
+        # Moves the previous frame, the points and the markers over to gray_frame's size, so the lock survives the change
+        prev_height, prev_width = self.prev_gray_frame.shape[:2]
+        height, width = gray_frame.shape[:2]
+        factor = np.array((width / prev_width, height / prev_height), dtype=np.float32)
+
+        interpolation = cv.INTER_AREA if width < prev_width else cv.INTER_LINEAR
+        self.prev_gray_frame = cv.resize(self.prev_gray_frame, (width, height), interpolation=interpolation)
+        if self.prev_points is not None:
+            self.prev_points = self.prev_points * factor
+        if self.good_new is not None:
+            self.good_new = self.good_new * factor
+        self.tracking_markers.rescale(factor)
+
+        if self.tracked_position.__len__() == 2:
+            self.tracked_position = (int(self.tracked_position[0] * factor[0]), int(self.tracked_position[1] * factor[1]))
+            self.tracked_direction = (int(self.tracked_direction[0] * factor[0]), int(self.tracked_direction[1] * factor[1]))
 
     def run(self, video_frame):
 
         if video_frame is None:
             return
 
-        optimized_frame = video_frame.copy()
-        optimized_frame = self.optimizeFrame(optimized_frame)
+        frame_start = self.stats.startTimer()
+        self.trackFrame(video_frame)
+        self.stats.stopTimer("frame", frame_start)
+        self.stats.endFrame()
+
+    def trackFrame(self, video_frame):
+        stats = self.stats
+
+        stage_start = stats.startTimer()
+        gray_frame = self.preprocessor.process(video_frame)
+        stats.stopTimer("preprocess", stage_start)
+
+        # Frames changed size since the last one, e.g. a ResolutionController changed the scale
+        if self.prev_gray_frame is not None and self.prev_gray_frame.shape != gray_frame.shape:
+            self.rescaleTracking(gray_frame)
 
         # Optical flow requires 2 frames to compare, if we don't have a previous, simply generate and return
         # Note, this is expected to happen the first time, should never happen again
         if self.prev_points is None:
-            self.prev_gray_frame = cv.cvtColor(optimized_frame, cv.COLOR_BGR2GRAY)
+            self.prev_gray_frame = gray_frame
             self.prev_points = self.findTrackingPoints(self.prev_gray_frame)
             return
 
-        self.cur_frame = optimized_frame
-        self.cur_gray_frame = cv.cvtColor(self.cur_frame, cv.COLOR_BGR2GRAY)
+        self.cur_frame = video_frame
+        self.cur_gray_frame = gray_frame
 
         # Calculates sparse optical flow by Lucas-Kanade method
         # https://docs.opencv.org/3.0-beta/modules/video/doc/motion_analysis_and_object_tracking.html#calcopticalflowpyrlk
+        stage_start = stats.startTimer()
+        # Both image pyramids are rebuilt in this call, the Python bindings won't take the previous frame's, see benchmarks/lk_pyramid.py
         cur_points, status, error = cv.calcOpticalFlowPyrLK(self.prev_gray_frame, self.cur_gray_frame, self.prev_points, None, **self.lk_params)
+        stats.stopTimer("optical_flow", stage_start)
+
+        stage_start = stats.startTimer()
 
         # If points were lost we need to adjust our markers appropriately
-        if self.prev_points.__len__() != self.tracking_markers.__len__():
+        if not self.tracking_markers.alive.all():
             self.clearLostMarkers()
 
         if cur_points is not None and self.no_movement_timer < self.no_movement_reset_time:
             # Selects good feature points for next position
-            self.good_new = cur_points[status == 1]
+            cur_points = self.preprocessor.toInputPoints(cur_points)
+            tracked = self.findTrackedPoints(status, error)
+            self.good_new = cur_points[tracked]
 
             self.updateTrackingMarkers(cur_points)
+            self.tracking_markers.markAlive(tracked)
+
+            stats.count("lost_points", self.tracking_markers.__len__() - self.good_new.__len__())
+            stats.setGauge("live_points", self.good_new.__len__())
+            stats.setGauge("moving_points", self.moving_count)
 
             #If we have enough moving markers, reset the reset counter
-            if self.moving_markers.__len__() > self.moving_markers_lock:
+            if self.moving_count > self.moving_markers_lock:
                 self.no_movement_timer = 0
             else:
                 self.no_movement_timer += 1
         else:
             #Reset
+            stats.count("resets")
             self.prev_points = self.findTrackingPoints(self.cur_gray_frame)
             self.prev_gray_frame = self.cur_gray_frame
             self.no_movement_timer = 0
@@ -135,23 +186,27 @@ class SparseHappyDax():
 
         self.calculateCenterPoint()
         self.calculateMoveDirection()
+        stats.stopTimer("markers", stage_start)
 
         # Everything related to drawing is probably unnecessary for anyone using this code? just here for local testing
         #self.drawTracking()
 
-        # Updates previous frame
-        self.prev_gray_frame = self.cur_gray_frame.copy()
-        self.prev_points = self.good_new.reshape(-1, 1, 2)
+        # Updates previous frame, every frame gets a new image from the preprocessor so there is nothing to copy
+        self.prev_gray_frame = self.cur_gray_frame
+        self.prev_points = self.preprocessor.toProcessedPoints(self.good_new).reshape(-1, 1, 2)
 
     def drawTracking(self):
-        #Reset draw_mask
-        self.draw_mask = np.zeros_like(self.cur_frame)
+        #Reset draw_mask, only allocated again when the frame size changes
+        if self.draw_mask is None or self.draw_mask.shape != self.cur_frame.shape:
+            self.draw_mask = np.zeros_like(self.cur_frame)
+        else:
+            self.draw_mask.fill(0)
 
         #Draw the graphics for each marker, old way and new way
         self.drawMovementTracks()
 
         #Draw center position and average direction of moving markers
-        if self.moving_markers.__len__() > 1:
+        if self.moving_count > 1:
             self.drawPosAndDir()
 
         # Overlays the optical flow tracks on the original frame
@@ -172,59 +227,47 @@ class SparseHappyDax():
         # Maybe kinda pointless when being used by another system?
 
     def drawMovementTracks(self):
-        # Draws the optical flow tracks
-        for marker in self.tracking_markers:
+        # Draws the optical flow tracks, all markers of one color are drawn with a single polylines call
+        tracks = np.rint(self.tracking_markers.getTracks()).astype(np.int32)
+
+        for is_moving in (False, True):
             #Determine color
-            if marker.getIsMoving():
+            if is_moving:
                 trackColor = self.color_moving
             else:
                 trackColor = self.color_still
 
-            #Draw a line for each set of positions
-            for x in range(marker.positions.__len__() -1):
-                point1 = marker.positions[x]
-                point2 = marker.positions[x+1]
-                self.draw_mask = cv.line(self.draw_mask, point1, point2, trackColor, 2)
+            marker_tracks = tracks[self.tracking_markers.moving == is_moving]
+            if marker_tracks.__len__() == 0:
+                continue
+
+            #Draw a line through each set of positions
+            self.draw_mask = cv.polylines(self.draw_mask, list(marker_tracks), False, trackColor, 2)
             #Draw circle at current position
-            self.draw_mask = cv.circle(self.draw_mask, marker.positions[-1], 3, trackColor, -1)
+            for position in marker_tracks[:, -1]:
+                self.draw_mask = cv.circle(self.draw_mask, (int(position[0]), int(position[1])), 3, trackColor, -1)
 
     def calculateCenterPoint(self):
-
-        center_point = (0,0)
-        if self.moving_markers.__len__() > 0:
-            add_pos_x = 0
-            add_pos_y = 0
-            for marker in self.moving_markers:
-                position = marker.positions[-1]
-                add_pos_x += position[0]
-                add_pos_y += position[1]
-
-            average_x = add_pos_x / self.moving_markers.__len__()
-            average_y = add_pos_y / self.moving_markers.__len__()
-            center_point = (int(average_x), int(average_y))
-        self.tracked_position = center_point
+        # Center point is calculated by averaging the positions of all moving markers
+        self.tracked_position = self.tracking_markers.getCenterPoint()
 
     def getPosition(self):
         return np.array(self.tracked_position)
 
     def calculateMoveDirection(self):
-        move_direction = (0, 0)
-        if self.moving_markers.__len__() > 0:
-            add_dir_x = 0
-            add_dir_y = 0
-            for marker in self.moving_markers:
-                direction = marker.getDirection()
-                add_dir_x += direction[0]
-                add_dir_y += direction[1]
-
-            average_dir_x = add_dir_x / self.moving_markers.__len__()
-            average_dir_y = add_dir_y / self.moving_markers.__len__()
-            move_direction = (int(average_dir_x), int(average_dir_y))
-        self.tracked_direction = move_direction
+        # Direction is calculated by averaging the directions of all moving markers
+        self.tracked_direction = self.tracking_markers.getMeanDirection()
 
     def getDirection(self):
         return np.array(self.tracked_direction)
 
+    def getLiveCount(self):
+        # Lost markers are only dropped at the start of the next frame, so count the ones still alive
+        return int(self.tracking_markers.alive.sum())
+
+    def getMovingCount(self):
+        return self.moving_count
+
     def drawPosAndDir(self):
         self.drawPos()
         self.drawDir()
@@ -0,0 +1,154 @@
+import json
+import os
+import time
+from collections import deque
+import numpy as np
+
+class TrackingStats:
+    # Records how long each stage of a frame takes, plus counters and point counts, over a rolling window of frames
+
+    # Upper edges of the histogram buckets, in milliseconds
+    bucket_edges_ms = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250)
+
+    def __init__(self, window=300):
+        # Number of most recent samples kept per stage for the histograms and percentiles
+        self.__window = window
+
+        self.__durations = {}
+        self.__total_seconds = {}
+        self.__total_counts = {}
+        self.__counters = {}
+        self.__gauges = {}
+        self.__frame_count = 0
+
+        # Periodic dumping, set up with setDumpFile
+        self.__dump_path = None
+        self.__dump_format = None
+        self.__dump_interval = None
+        self.__last_dump = 0
+
+    def isEnabled(self):
+        return True
+
+    def startTimer(self):
+        return time.perf_counter()
+
+    def stopTimer(self, stage, start):
+        duration = time.perf_counter() - start
+        if stage not in self.__durations:
+            self.__durations[stage] = deque(maxlen=self.__window)
+            self.__total_seconds[stage] = 0.0
+            self.__total_counts[stage] = 0
+        self.__durations[stage].append(duration)
+        self.__total_seconds[stage] += duration
+        self.__total_counts[stage] += 1
+
+    def count(self, counter, amount=1):
+        self.__counters[counter] = self.__counters.get(counter, 0) + amount
+
+    def setGauge(self, gauge, value):
+        self.__gauges[gauge] = value
+
+    def endFrame(self):
+        self.__frame_count += 1
+
+        if self.__dump_path is not None:
+            now = time.monotonic()
+            if now - self.__last_dump >= self.__dump_interval:
+                self.__last_dump = now
+                self.dump(self.__dump_path, self.__dump_format)
+
+    def setDumpFile(self, file_path, interval=10.0, file_format="json"):
+        # Writes the stats to file_path every interval seconds, file_format is "json" or "prometheus"
+        if file_format not in ("json", "prometheus"):
+            raise ValueError(f"Unknown stats format {file_format}")
+        self.__dump_path = file_path
+        self.__dump_format = file_format
+        self.__dump_interval = interval
+        self.__last_dump = time.monotonic()
+
+    def getStageSummary(self, stage):
+        durations_ms = np.array(self.__durations[stage]) * 1000
+        histogram = np.histogram(durations_ms, bins=(0,) + self.bucket_edges_ms + (np.inf,))[0]
+        return {
+            "samples": int(durations_ms.__len__()),
+            "mean_ms": float(durations_ms.mean()),
+            "p50_ms": float(np.percentile(durations_ms, 50)),
+            "p95_ms": float(np.percentile(durations_ms, 95)),
+            "p99_ms": float(np.percentile(durations_ms, 99)),
+            "max_ms": float(durations_ms.max()),
+            "histogram_ms": {"le_" + str(edge): int(bucket) for edge, bucket in zip(self.bucket_edges_ms + ("inf",), histogram)},
+            "total_seconds": self.__total_seconds[stage],
+            "total_count": self.__total_counts[stage],
+        }
+
+    def getSummary(self):
+        return {
+            "frames": self.__frame_count,
+            "stages": {stage: self.getStageSummary(stage) for stage in self.__durations},
+            "counters": dict(self.__counters),
+            "gauges": dict(self.__gauges),
+        }
+
+    def getTotals(self):
+        # Total seconds spent in each stage since the stats were created
+        return dict(self.__total_seconds)
+
+    def toPrometheus(self, prefix="tracker"):
+        lines = [f"# TYPE {prefix}_stage_seconds summary"]
+        for stage in self.__durations:
+            durations = np.array(self.__durations[stage])
+            for quantile in (0.5, 0.95, 0.99):
+                lines.append(f'{prefix}_stage_seconds{{stage="{stage}",quantile="{quantile}"}} {np.percentile(durations, quantile * 100):.9f}')
+            lines.append(f'{prefix}_stage_seconds_sum{{stage="{stage}"}} {self.__total_seconds[stage]:.9f}')
+            lines.append(f'{prefix}_stage_seconds_count{{stage="{stage}"}} {self.__total_counts[stage]}')
+
+        lines.append(f"# TYPE {prefix}_frames_total counter")
+        lines.append(f"{prefix}_frames_total {self.__frame_count}")
+        for counter, value in self.__counters.items():
+            lines.append(f"# TYPE {prefix}_{counter}_total counter")
+            lines.append(f"{prefix}_{counter}_total {value}")
+        for gauge, value in self.__gauges.items():
+            lines.append(f"# TYPE {prefix}_{gauge} gauge")
+            lines.append(f"{prefix}_{gauge} {value}")
+        return "\n".join(lines) + "\n"
+
+    def dump(self, file_path, file_format="json"):
+        if file_format == "prometheus":
+            text = self.toPrometheus()
+        else:
+            text = json.dumps(self.getSummary(), indent=2)
+
+        # Write to a temporary file first so readers never see a half written file
+        temporary_path = file_path + ".tmp"
+        with open(temporary_path, "w") as stats_file:
+            stats_file.write(text)
+        os.replace(temporary_path, file_path)
+
+
+class NullTrackingStats:
+    # Stand-in used when stats are disabled, every call returns straight away
+
+    def isEnabled(self):
+        return False
+
+    def startTimer(self):
+        return 0
+
+    def stopTimer(self, stage, start):
+        pass
+
+    def count(self, counter, amount=1):
+        pass
+
+    def setGauge(self, gauge, value):
+        pass
+
+    def endFrame(self):
+        pass
+
+    def getSummary(self):
+        return {}
+
+    def getTotals(self):
+        return {}
@@ -0,0 +1,135 @@
+import threading
+import time
+from collections import deque
+import cv2
+
+class ThreadedCapture:
+    # Decodes frames on its own thread so decode time doesn't add to tracking time
+    # Has the same read/isOpened/release/get calls as cv2.VideoCapture, so it can replace one directly
+
+    # Only keep the newest frames, older frames are dropped when the tracker falls behind. Use for live cameras
+    POLICY_LATEST = "latest"
+    # Never drop a frame, decoding waits for the tracker instead. Use for video files
+    POLICY_LOSSLESS = "lossless"
+
+    def __init__(self, source, policy=POLICY_LATEST, buffer_size=None, reuse_frames=False):
+        if policy not in (self.POLICY_LATEST, self.POLICY_LOSSLESS):
+            raise ValueError(f"Unknown capture policy {policy}")
+
+        # Accept either anything cv2.VideoCapture can open, or an already opened capture
+        if isinstance(source, cv2.VideoCapture):
+            self.__video_cap = source
+        else:
+            self.__video_cap = cv2.VideoCapture(source)
+
+        # Latest frame only by default for live use, lossless gets a few frames of slack
+        if buffer_size is None:
+            buffer_size = 1 if policy == self.POLICY_LATEST else 8
+        self.__policy = policy
+        self.__buffer_size = buffer_size
+
+        # With reuse_frames, frames are decoded into a fixed set of images with cv2.VideoCapture.read(image=...) instead
+        # of a new one per frame. A frame returned by read is then only valid until the next read, so leave it off
+        # when frames are kept around. At most buffer_size + 2 images exist: the buffered ones, the one the caller
+        # holds and the one being decoded
+        self.__reuse_frames = reuse_frames
+        self.__free_frames = []
+        self.__held_frame = None
+
+        # Bounded ring buffer of (frame, capture timestamp)
+        self.__frames = deque()
+        self.__condition = threading.Condition()
+        self.__stopped = False
+        self.__finished = False
+
+        # Counters for frames decoded by the capture thread and dropped before the tracker read them
+        self.__decoded_count = 0
+        self.__dropped_count = 0
+        self.__last_timestamp = None
+
+        self.__thread = threading.Thread(target=self.__captureLoop, daemon=True)
+        if self.__video_cap.isOpened():
+            self.__thread.start()
+        else:
+            self.__finished = True
+
+    def __captureLoop(self):
+        while not self.__stopped:
+            image = None
+            if self.__reuse_frames:
+                with self.__condition:
+                    if self.__free_frames.__len__() > 0:
+                        image = self.__free_frames.pop()
+            ret, frame = self.__video_cap.read(image=image)
+            timestamp = time.monotonic()
+
+            if ret is False or frame is None:
+                break
+
+            with self.__condition:
+                self.__decoded_count += 1
+
+                if self.__policy == self.POLICY_LOSSLESS:
+                    # Wait for the tracker to make room instead of dropping anything
+                    while self.__frames.__len__() >= self.__buffer_size and not self.__stopped:
+                        self.__condition.wait()
+                elif self.__frames.__len__() >= self.__buffer_size:
+                    # Drop the oldest frame so the tracker always gets the freshest one
+                    dropped_frame, _ = self.__frames.popleft()
+                    self.__dropped_count += 1
+                    if self.__reuse_frames:
+                        self.__free_frames.append(dropped_frame)
+
+                self.__frames.append((frame, timestamp))
+                self.__condition.notify_all()
+
+        with self.__condition:
+            self.__finished = True
+            self.__condition.notify_all()
+
+    def read(self):
+        # Blocks until a frame is available, returns (False, None) once the source has ended
+        with self.__condition:
+            while self.__frames.__len__() == 0 and not self.__finished:
+                self.__condition.wait()
+
+            if self.__frames.__len__() == 0:
+                return False, None
+
+            frame, self.__last_timestamp = self.__frames.popleft()
+            if self.__reuse_frames:
+                # The caller is done with the frame from the previous read, it can be decoded into again
+                if self.__held_frame is not None:
+                    self.__free_frames.append(self.__held_frame)
+                self.__held_frame = frame
+            self.__condition.notify_all()
+            return True, frame
+
+    def isOpened(self):
+        with self.__condition:
+            return not self.__finished or self.__frames.__len__() > 0
+
+    def get(self, prop_id):
+        return self.__video_cap.get(prop_id)
+
+    def getLastTimestamp(self):
+        # time.monotonic() of when the last returned frame finished decoding
+        return self.__last_timestamp
+
+    def getDecodedCount(self):
+        return self.__decoded_count
+
+    def getDroppedCount(self):
+        return self.__dropped_count
+
+    def getBufferedCount(self):
+        with self.__condition:
+            return self.__frames.__len__()
+
+    def release(self):
+        with self.__condition:
+            self.__stopped = True
+            self.__condition.notify_all()
+        if self.__thread.is_alive():
+            self.__thread.join()
+        self.__video_cap.release()
@@ -0,0 +1,342 @@
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+# Trackers a stream can run, both are headless and report a position and direction per frame
+TRACKERS = ("sparse_happy_dax", "optical_flow_sparse")
+
+# Stream states shown in the health report
+STATE_STARTING = "starting"
+STATE_RUNNING = "running"
+STATE_RESTARTING = "restarting"
+STATE_FINISHED = "finished"
+
+# Exit code of a worker whose video file ended normally, every other exit means the stream failed
+EXIT_FINISHED = 0
+EXIT_FAILED = 1
+
+
+def makeTracker(tracker_name):
+    if tracker_name == "optical_flow_sparse":
+        folder_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Optical Flow Final')
+        if folder_path not in sys.path:
+            sys.path.insert(0, folder_path)
+        from OpticalFlowSparse import OpticalFlowSparse
+        from TrackingRenderer import NullRenderer
+        from FramePreprocessor import FramePreprocessor
+        return OpticalFlowSparse(NullRenderer(), preprocessor=FramePreprocessor(arena=True))
+
+    # Both trackers write their preprocessed images into the same two buffers every frame instead of new arrays
+    from sparsedense.sparse_flow_vHappyDax import SparseHappyDax
+    from sparsedense.framepreprocessor import FramePreprocessor
+    return SparseHappyDax(preprocessor=FramePreprocessor(arena=True))
+
+
+def runStream(source, tracker_name, resize, loop, realtime, thread_count, heartbeat, frame_count, result, stop_event):
+    # Worker process for a single stream, tracks frames until the source ends or the service stops it
+    # Only touches shared values, so the service can read every stream's progress without talking to it
+    import cv2
+    from threadedcapture import ThreadedCapture
+
+    # Every stream gets its share of the cores, so a box full of streams isn't fighting over OpenCV's thread pool
+    cv2.setNumThreads(thread_count)
+
+    # Files stand in for cameras, they are decoded without dropping frames and can loop forever
+    is_file = os.path.isfile(source)
+    policy = ThreadedCapture.POLICY_LOSSLESS if is_file else ThreadedCapture.POLICY_LATEST
+
+    # Every frame is done with once the next one is read, so frames are decoded into a few reused images
+    tracker = makeTracker(tracker_name)
+    video_cap = ThreadedCapture(source, policy, reuse_frames=True)
+    frame_interval = 0
+    if is_file and realtime:
+        fps = video_cap.get(cv2.CAP_PROP_FPS)
+        frame_interval = 1 / fps if fps > 0 else 0
+
+    tracked_any = False
+    next_frame_time = time.monotonic()
+    try:
+        while not stop_event.is_set():
+            ret, frame = video_cap.read()
+
+            if ret is False or frame is None:
+                if is_file and loop and tracked_any:
+                    video_cap.release()
+                    video_cap = ThreadedCapture(source, policy, reuse_frames=True)
+                    continue
+                break
+
+            # Play files back at their own frame rate so they behave like a camera
+            if frame_interval > 0:
+                next_frame_time += frame_interval
+                delay = next_frame_time - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+
+            if resize is not None:
+                frame = cv2.resize(frame, resize)
+            tracker.run(frame)
+            tracked_any = True
+
+            position = tuple(tracker.getPosition())
+            direction = tuple(tracker.getDirection())
+            with result.get_lock():
+                if position.__len__() == 2 and direction.__len__() == 2:
+                    result[:] = [1, position[0], position[1], direction[0], direction[1]]
+                else:
+                    result[0] = 0
+
+            frame_count.value += 1
+            heartbeat.value = time.monotonic()
+    finally:
+        video_cap.release()
+
+    # A camera never ends on its own and a file that couldn't be read never started, both get restarted
+    if not stop_event.is_set() and not (is_file and tracked_any):
+        sys.exit(EXIT_FAILED)
+    sys.exit(EXIT_FINISHED)
+
+
+class StreamWorker:
+    # The service's side of one stream: its process, shared progress values and restart bookkeeping
+
+    def __init__(self, context, name, source):
+        self.name = name
+        self.source = source
+
+        # Written by the worker process, read by the service
+        self.heartbeat = context.Value("d", 0.0, lock=False)
+        self.frame_count = context.Value("q", 0, lock=False)
+        # Position found flag, x, y, direction x, direction y
+        self.result = context.Array("d", 5)
+
+        self.process = None
+        self.state = STATE_STARTING
+        self.started_at = 0.0
+        self.restart_count = 0
+        # Failures since the stream last ran for a while, sets how long the next restart waits
+        self.failure_count = 0
+        self.restart_at = 0.0
+        self.last_error = None
+
+        # Frames per second over the last report interval
+        self.fps = 0.0
+        self.__last_frame_count = 0
+        self.__last_fps_time = None
+
+    def measureFps(self, now):
+        frame_count = self.frame_count.value
+        if self.__last_fps_time is not None and now > self.__last_fps_time:
+            self.fps = max(frame_count - self.__last_frame_count, 0) / (now - self.__last_fps_time)
+        self.__last_frame_count = frame_count
+        self.__last_fps_time = now
+
+    def getResult(self):
+        with self.result.get_lock():
+            found, x, y, direction_x, direction_y = self.result[:]
+        if found == 0:
+            return None, None
+        return (int(x), int(y)), (int(direction_x), int(direction_y))
+
+
+class TrackingService:
+    # Runs one tracker per video stream, each in its own worker process so all cores are used
+    # A stream whose process crashes or stops delivering frames is restarted on its own, the others keep running
+
+    def __init__(self, sources, tracker_name="sparse_happy_dax", resize=None, loop=False, realtime=False,
+                 stall_timeout=5.0, startup_timeout=20.0, max_restart_delay=30.0):
+        # sources maps a stream name to anything cv2.VideoCapture can open, a camera URL or a video file
+        if tracker_name not in TRACKERS:
+            raise ValueError(f"Unknown tracker {tracker_name}")
+        self.__tracker_name = tracker_name
+        self.__resize = resize
+        self.__loop = loop
+        self.__realtime = realtime
+
+        # Seconds without a new frame before a running stream counts as stalled
+        self.__stall_timeout = stall_timeout
+        # Opening a camera can take a while, a stream gets this long to deliver its first frame
+        self.__startup_timeout = startup_timeout
+        # Restarts back off exponentially up to this many seconds, so a camera that is down isn't hammered
+        self.__max_restart_delay = max_restart_delay
+
+        # Spawned workers start clean, forking a process that already runs capture threads can deadlock
+        self.__context = multiprocessing.get_context("spawn")
+        self.__stop_event = self.__context.Event()
+        self.__workers = [StreamWorker(self.__context, name, source) for name, source in sources.items()]
+
+        # Split the cores between the streams
+        self.__thread_count = max((os.cpu_count() or 1) // max(self.__workers.__len__(), 1), 1)
+
+    def start(self):
+        for worker in self.__workers:
+            self.__startWorker(worker)
+
+    def __startWorker(self, worker):
+        now = time.monotonic()
+        worker.heartbeat.value = now
+        worker.started_at = now
+        worker.state = STATE_STARTING
+        worker.process = self.__context.Process(
+            target=runStream, name=f"stream-{worker.name}", daemon=True,
+            args=(worker.source, self.__tracker_name, self.__resize, self.__loop, self.__realtime, self.__thread_count,
+                  worker.heartbeat, worker.frame_count, worker.result, self.__stop_event))
+        worker.process.start()
+
+    def __stopWorker(self, worker):
+        # Ask nicely first, a worker stuck inside OpenCV won't notice so it gets killed after a grace period
+        if worker.process is None:
+            return
+        if worker.process.is_alive():
+            worker.process.terminate()
+            worker.process.join(2.0)
+            if worker.process.is_alive():
+                worker.process.kill()
+                worker.process.join()
+
+    def __scheduleRestart(self, worker, error, now):
+        self.__stopWorker(worker)
+        worker.last_error = error
+        worker.state = STATE_RESTARTING
+        worker.restart_count += 1
+
+        # A stream that ran fine for a while starts over from the shortest delay
+        if now - worker.started_at > self.__max_restart_delay:
+            worker.failure_count = 0
+        worker.failure_count += 1
+        worker.restart_at = now + min(2 ** (worker.failure_count - 1), self.__max_restart_delay)
+
+    def poll(self):
+        # Checks every stream once, call regularly. Returns False once every stream has finished
+        now = time.monotonic()
+        for worker in self.__workers:
+            if worker.state == STATE_FINISHED:
+                continue
+
+            if worker.state == STATE_RESTARTING:
+                if now >= worker.restart_at:
+                    self.__startWorker(worker)
+                continue
+
+            exit_code = worker.process.exitcode
+            if exit_code is not None:
+                if exit_code == EXIT_FINISHED:
+                    worker.state = STATE_FINISHED
+                    worker.fps = 0.0
+                else:
+                    self.__scheduleRestart(worker, f"exited with code {exit_code}", now)
+                continue
+
+            if worker.frame_count.value > 0 and worker.heartbeat.value > worker.started_at:
+                worker.state = STATE_RUNNING
+
+            timeout = self.__stall_timeout if worker.state == STATE_RUNNING else self.__startup_timeout
+            frame_age = now - worker.heartbeat.value
+            if frame_age > timeout:
+                self.__scheduleRestart(worker, f"no frame for {frame_age:.1f}s", now)
+
+        return any(worker.state != STATE_FINISHED for worker in self.__workers)
+
+    def getHealth(self):
+        # Per stream state, fps since the last call, restarts and the latest tracking result
+        now = time.monotonic()
+        health = {}
+        for worker in self.__workers:
+            worker.measureFps(now)
+            position, direction = worker.getResult()
+            health[worker.name] = {
+                "source": worker.source,
+                "state": worker.state,
+                "fps": round(worker.fps, 1),
+                "frames": worker.frame_count.value,
+                "seconds_since_frame": round(now - worker.heartbeat.value, 2),
+                "restarts": worker.restart_count,
+                "last_error": worker.last_error,
+                "position": position,
+                "direction": direction,
+            }
+        return health
+
+    def getResult(self, name):
+        # Latest (position, direction) of a stream, (None, None) until it has found something
+        for worker in self.__workers:
+            if worker.name == name:
+                return worker.getResult()
+        raise KeyError(name)
+
+    def stop(self):
+        self.__stop_event.set()
+        for worker in self.__workers:
+            if worker.process is not None:
+                worker.process.join(2.0)
+            self.__stopWorker(worker)
+
+    def run(self, report_interval=2.0, poll_interval=0.25, status_file=None, duration=None):
+        # Runs until every stream has finished, duration seconds have passed or Ctrl+C is pressed
+        self.start()
+        started = time.monotonic()
+        next_report = started + report_interval
+        self.getHealth()
+        try:
+            while self.poll():
+                now = time.monotonic()
+                if duration is not None and now - started >= duration:
+                    break
+                if now >= next_report:
+                    next_report = now + report_interval
+                    self.report(status_file)
+                time.sleep(poll_interval)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+        self.report(status_file)
+
+    def report(self, status_file=None):
+        health = self.getHealth()
+        for name, stream in health.items():
+            line = f"{name:16} {stream['state']:10} {stream['fps']:7.1f} fps {stream['frames']:8} frames " \
+                   f"{stream['restarts']:3} restarts  position {stream['position']}"
+            if stream["last_error"] is not None and stream["state"] != STATE_RUNNING:
+                line += f"  ({stream['last_error']})"
+            print(line)
+
+        if status_file is not None:
+            # Write to a temporary file first so readers never see a half written file
+            temporary_path = status_file + ".tmp"
+            with open(temporary_path, "w") as health_file:
+                json.dump(health, health_file, indent=2)
+            os.replace(temporary_path, status_file)
+
+
+def parseSources(arguments):
+    # Each source is either name=source or just the source, which is then named after its position
+    sources = {}
+    for index, argument in enumerate(arguments):
+        name, separator, source = argument.partition("=")
+        if separator == "" or "://" in name:
+            name, source = f"stream{index}", argument
+        sources[name] = source
+    return sources
+
+
+if __name__ == '__main__':
+    # Run from the dax folder: python trackingservice.py front=http://192.168.0.47:8080/video back=../videoplayback.mp4
+    parser = argparse.ArgumentParser(description="Track several camera streams at once, one worker process per stream")
+    parser.add_argument("sources", nargs="+", help="name=url or name=video file, video files stand in for cameras")
+    parser.add_argument("--tracker", default="sparse_happy_dax", choices=TRACKERS)
+    parser.add_argument("--resize", type=int, nargs=2, default=None, metavar=("WIDTH", "HEIGHT"))
+    parser.add_argument("--loop", action="store_true", help="start video files over when they end")
+    parser.add_argument("--realtime", action="store_true", help="play video files at their own frame rate")
+    parser.add_argument("--stall-timeout", type=float, default=5.0, help="seconds without a frame before a stream is restarted")
+    parser.add_argument("--report-interval", type=float, default=2.0)
+    parser.add_argument("--status-file", default=None, help="JSON file the health report is also written to")
+    parser.add_argument("--duration", type=float, default=None, help="stop after this many seconds")
+    args = parser.parse_args()
+
+    service = TrackingService(parseSources(args.sources), args.tracker, tuple(args.resize) if args.resize else None,
+                              args.loop, args.realtime, args.stall_timeout)
+    service.run(args.report_interval, status_file=args.status_file, duration=args.duration)
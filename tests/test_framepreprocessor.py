@@ -0,0 +1,62 @@
+import os
+import sys
+import unittest
+import numpy as np
+
+# Run from the repository root: python -m pytest tests or python -m unittest discover tests
+repository_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(repository_root, 'dax'))
+sys.path.insert(0, os.path.join(repository_root, 'Optical Flow Final'))
+from sparsedense.framepreprocessor import FramePreprocessor
+# The Optical Flow Final copy, it only takes BGR frames
+from FramePreprocessor import FramePreprocessor as FinalFramePreprocessor
+
+
+class FramePreprocessorTest(unittest.TestCase):
+    # Arena mode only changes where the images are written, never what is in them
+
+    modes = (FramePreprocessor.MODE_COLOR, FramePreprocessor.MODE_GRAY, FramePreprocessor.MODE_PYRAMID)
+    # 15 blurs in every mode, 1 leaves nothing to blur
+    blur_sizes = (15, 1)
+
+    def setUp(self):
+        generator = np.random.default_rng(0)
+        self.frames = [generator.integers(0, 256, (90, 160, 3), dtype=np.uint8) for _ in range(3)]
+
+    def testArenaMatchesNewArrays(self):
+        for preprocessor_class in (FramePreprocessor, FinalFramePreprocessor):
+            for mode in self.modes:
+                for blur_size in self.blur_sizes:
+                    with self.subTest(preprocessor=preprocessor_class.__module__, mode=mode, blur_size=blur_size):
+                        self.assertArenaMatches(preprocessor_class, mode, blur_size)
+
+    def assertArenaMatches(self, preprocessor_class, mode, blur_size):
+        preprocessor = preprocessor_class(mode, blur_size=blur_size)
+        arena_preprocessor = preprocessor_class(mode, blur_size=blur_size, arena=True)
+        for frame in self.frames:
+            expected = preprocessor.process(frame)
+            image = arena_preprocessor.process(frame)
+            self.assertEqual(image.shape, expected.shape)
+            np.testing.assert_array_equal(image, expected)
+
+    def testArenaMatchesNewArraysForGrayFrames(self):
+        for mode in self.modes:
+            for blur_size in self.blur_sizes:
+                with self.subTest(mode=mode, blur_size=blur_size):
+                    preprocessor = FramePreprocessor(mode, blur_size=blur_size)
+                    arena_preprocessor = FramePreprocessor(mode, blur_size=blur_size, arena=True)
+                    for frame in self.frames:
+                        gray_frame = np.ascontiguousarray(frame[..., 0])
+                        np.testing.assert_array_equal(arena_preprocessor.process(gray_frame), preprocessor.process(gray_frame))
+
+    def testArenaImagesStayValidForOneMoreCall(self):
+        # The tracker still holds the previous frame's image while the next one is made
+        arena_preprocessor = FramePreprocessor(FramePreprocessor.MODE_COLOR, blur_size=1, arena=True)
+        first = arena_preprocessor.process(self.frames[0])
+        kept = first.copy()
+        arena_preprocessor.process(self.frames[1])
+        np.testing.assert_array_equal(first, kept)
+
+
+if __name__ == '__main__':
+    unittest.main()
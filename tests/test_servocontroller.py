@@ -0,0 +1,127 @@
+import os
+import sys
+import time
+import unittest
+
+# Run from the repository root: python -m pytest tests or python -m unittest discover tests
+# gpiozero comes from requirements-dev.txt, without it the tests are skipped
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dax'))
+from servocontroller import LatestValue, AngleTable, ServoController
+
+try:
+    from gpiozero import AngularServo, Device
+    from gpiozero.pins.mock import MockFactory, MockPWMPin
+except ImportError:
+    Device = None
+
+
+@unittest.skipIf(Device is None, "gpiozero is not installed")
+class ServoControllerTest(unittest.TestCase):
+    # Drives real gpiozero AngularServo objects on mock PWM pins, so the test runs without a Raspberry Pi
+
+    frame_size = (640, 480)
+
+    def setUp(self):
+        Device.pin_factory = MockFactory(pin_class=MockPWMPin)
+        self.pan_servo = AngularServo(12, min_angle=-90, max_angle=90)
+        self.tilt_servo = AngularServo(13, min_angle=-90, max_angle=90)
+        self.pan_servo.angle = 0
+        self.tilt_servo.angle = 0
+
+        self.positions = LatestValue()
+        self.angle_table = AngleTable.fromFieldOfView(self.frame_size)
+        self.servos = ServoController(self.pan_servo, self.tilt_servo, self.positions, self.angle_table,
+                                      max_speed=180.0, deadband=0.5)
+
+    def tearDown(self):
+        self.servos.stop()
+        self.pan_servo.close()
+        self.tilt_servo.close()
+        Device.pin_factory.reset()
+        Device.pin_factory = None
+
+    def stepUntilStill(self, now, tick_count=20):
+        # Runs ticks at the servos' 50 Hz PWM rate, returns the time after the last one
+        for _ in range(tick_count):
+            self.servos.step(now)
+            now += self.pan_servo.frame_width
+        return now
+
+    def testSlewsTowardsTarget(self):
+        # The right edge of the frame is half the horizontal field of view away, far more than one tick's step
+        now = time.monotonic()
+        self.positions.put((self.frame_size[0], self.frame_size[1] / 2), now)
+        target_pan, target_tilt = self.angle_table.lookup(self.frame_size[0], self.frame_size[1] / 2)
+        max_step = 180.0 * self.pan_servo.frame_width
+
+        self.assertTrue(self.servos.step(now))
+        pan, tilt = self.servos.getAngles()
+        self.assertAlmostEqual(pan, max_step, places=3)
+        self.assertAlmostEqual(tilt, target_tilt, places=3)
+        self.assertAlmostEqual(self.pan_servo.angle, pan, delta=1.0)
+        # The PWM pin's duty cycle moved off the center pulse width
+        self.assertNotAlmostEqual(Device.pin_factory.pin(12).state, Device.pin_factory.pin(13).state, places=4)
+
+        self.stepUntilStill(now + self.pan_servo.frame_width)
+        self.assertAlmostEqual(self.servos.getAngles()[0], target_pan, places=3)
+        self.assertAlmostEqual(self.pan_servo.angle, target_pan, delta=1.0)
+
+    def testSkipsUnchangedTicks(self):
+        now = time.monotonic()
+        self.positions.put((400, 300), now)
+        now = self.stepUntilStill(now)
+        sent_count = self.servos.getSentCount()
+        skipped_count = self.servos.getSkippedCount()
+        self.assertGreater(skipped_count, 0)
+
+        # Same target again, nothing is sent
+        self.positions.put((400, 300), now)
+        self.assertFalse(self.servos.step(now))
+        self.assertEqual(self.servos.getSentCount(), sent_count)
+        self.assertEqual(self.servos.getSkippedCount(), skipped_count + 1)
+
+        # A move smaller than the deadband is skipped as well
+        self.positions.put((401, 300), now)
+        self.assertFalse(self.servos.step(now))
+        self.assertEqual(self.servos.getSentCount(), sent_count)
+
+    def testHoldsWithoutTarget(self):
+        now = time.monotonic()
+        self.positions.put((), now)
+        self.assertFalse(self.servos.step(now))
+        self.assertIsNone(self.servos.getAngles())
+
+        # Positions older than max_age are not acted on
+        self.positions.put((400, 300), now - 1.0)
+        self.assertFalse(self.servos.step(now))
+        self.assertEqual(self.servos.getSentCount(), 0)
+
+    def testReportsRateAndAge(self):
+        self.assertIsNone(self.servos.getPositionAge())
+        self.assertEqual(self.servos.getCommandRate(), 0)
+
+        now = time.monotonic()
+        self.positions.put((self.frame_size[0], 0), now - 0.04)
+        for tick in range(5):
+            self.assertTrue(self.servos.step(now - 0.04 + 0.02 * tick))
+        self.assertEqual(self.servos.getCommandRate(), 5)
+        self.assertAlmostEqual(self.servos.getPositionAge(), 0.08, places=6)
+
+    def testThreadRunsAtPwmRate(self):
+        # Keep the target moving so every tick has something to send
+        self.servos.start()
+        start = time.monotonic()
+        while time.monotonic() - start < 0.5:
+            x = (time.monotonic() - start) * 2 * self.frame_size[0]
+            self.positions.put((x, self.frame_size[1] / 2))
+            time.sleep(0.005)
+        self.servos.stop()
+
+        # 50 Hz for half a second, with some slack for a busy machine
+        self.assertGreater(self.servos.getSentCount(), 15)
+        self.assertLessEqual(self.servos.getSentCount(), 26)
+        self.assertLess(self.servos.getPositionAge(), 0.05)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+import os
+import sys
+import tempfile
+import unittest
+import cv2 as cv
+import numpy as np
+
+# Run from the repository root: python -m pytest tests or python -m unittest discover tests
+repository_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, repository_root)
+sys.path.insert(0, os.path.join(repository_root, 'dax'))
+from sharedframering import SharedFrameRing, ProcessCapture
+from framescheduler import FrameScheduler
+from sparsedense.sparse_flow_vHappyDax import SparseHappyDax
+from benchmarks.synthetic_video import SyntheticVideo
+
+
+class SharedFrameRingTest(unittest.TestCase):
+    # Both ends in this process, the slots and semaphores behave the same as across processes
+
+    def setUp(self):
+        self.ring = SharedFrameRing(3)
+        self.ring.allocate((4, 6, 3))
+
+    def tearDown(self):
+        self.ring.release()
+
+    def testReadsInOrder(self):
+        for value in range(2):
+            self.assertTrue(self.ring.write(np.full((4, 6, 3), value, dtype=np.uint8), timestamp=value))
+        self.assertEqual(self.ring.getBufferedCount(), 2)
+
+        for value in range(2):
+            ret, frame = self.ring.read(timeout=0)
+            self.assertTrue(ret)
+            self.assertTrue((frame == value).all())
+            self.assertEqual(self.ring.getTimestamp(), value)
+        self.assertEqual(self.ring.getBufferedCount(), 0)
+
+    def testLatestSkipsToNewest(self):
+        for value in range(3):
+            self.ring.write(np.full((4, 6, 3), value, dtype=np.uint8))
+        ret, frame = self.ring.read(timeout=0, latest=True)
+        self.assertTrue(ret)
+        self.assertTrue((frame == 2).all())
+        self.assertEqual(self.ring.getSkippedCount(), 2)
+
+    def testDropsWhenReaderHoldsEverySlot(self):
+        for value in range(3):
+            self.assertTrue(self.ring.write(np.zeros((4, 6, 3), dtype=np.uint8), block=False))
+        self.assertFalse(self.ring.write(np.zeros((4, 6, 3), dtype=np.uint8), block=False))
+        self.assertEqual(self.ring.getDroppedCount(), 1)
+
+    def testCloseEndsReading(self):
+        self.ring.write(np.zeros((4, 6, 3), dtype=np.uint8))
+        self.ring.close()
+        self.assertTrue(self.ring.read(timeout=1)[0])
+        self.assertEqual(self.ring.read(timeout=1), (False, None))
+
+
+class ProcessCaptureTest(unittest.TestCase):
+    # A tracker reading its frames in place out of shared memory has to see exactly what a plain VideoCapture gives
+
+    frame_count = 40
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.video_path = os.path.join(cls.directory.name, "synthetic.mp4")
+        SyntheticVideo(320, 180, cls.frame_count, blob_radius=20, speed=4.0).write(cls.video_path)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directory.cleanup()
+
+    def trackPositions(self, video_cap):
+        tracker = SparseHappyDax()
+        positions = []
+        while True:
+            ret, frame = video_cap.read()
+            if ret is False or frame is None:
+                break
+            tracker.run(frame)
+            positions.append(tuple(tracker.getPosition()))
+        return positions
+
+    def testTrackerReadsFromRing(self):
+        plain_cap = cv.VideoCapture(self.video_path)
+        expected = self.trackPositions(plain_cap)
+        plain_cap.release()
+        video_cap = ProcessCapture(self.video_path, ProcessCapture.POLICY_LOSSLESS)
+        self.assertTrue(video_cap.isOpened())
+        self.assertEqual(video_cap.get(cv.CAP_PROP_FRAME_WIDTH), 320)
+
+        positions = self.trackPositions(video_cap)
+        self.assertEqual(positions.__len__(), self.frame_count)
+        self.assertEqual(positions, expected)
+        self.assertEqual(video_cap.getDroppedCount(), 0)
+        video_cap.release()
+
+    def testSchedulerReadsFromRing(self):
+        # Lossless with no lag limit, every frame a newer one is already waiting behind gets skipped
+        video_cap = ProcessCapture(self.video_path, ProcessCapture.POLICY_LOSSLESS)
+        scheduler = FrameScheduler(video_cap, SparseHappyDax(), max_lag=None)
+        read_count = 0
+        while scheduler.read()[0]:
+            read_count += 1
+            self.assertIsNotNone(scheduler.getTimestamp())
+        scheduler.release()
+
+        self.assertEqual(read_count, self.frame_count)
+        self.assertEqual(scheduler.getProcessedCount() + scheduler.getSkippedCount(), self.frame_count)
+        self.assertGreater(scheduler.getProcessedCount(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()